@@ -50,4 +50,7 @@ def main():
     qapp.exec_()
 
 if __name__ == '__main__':
+    #needed for worker processes in the frozen app
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
@@ -23,7 +23,7 @@
 
 from __future__ import absolute_import, division, print_function
 import sys,os,platform,time,traceback
-import pickle, gzip
+import pickle, gzip, zipfile, json
 from collections import OrderedDict
 from .qt import *
 import pandas as pd
@@ -103,12 +103,23 @@ class Application(QMainWindow):
         self.recent_urls = []
         self.scratch_items = {}
         self.openplugins = {}
+        self.running = False
+        #autosave state, see autosave
+        self.autosaving = False
+        self.saves = 0
+        self.session = '%s-%s' %(time.strftime('%Y%m%d%H%M%S'), os.getpid())
+        self.recovery = {'filename': None, 'index': 0, 'names': [], 'sheets': {}}
+        self.recovered = []
+        self.autosavetimer = QtCore.QTimer(self)
+        self.autosavetimer.timeout.connect(self.autosave)
 
         self.loadSettings()
         self.setTheme()
         self.setIconSize(QtCore.QSize(core.ICONSIZE, core.ICONSIZE))
         self.showRecentFiles()
         self.startLogging()
+        self.recoverypath = os.path.join(os.path.dirname(self.logfile), 'recovery')
+        self.setAutosave()
 
         if project_file != None:
             self.openProject(project_file)
@@ -120,6 +131,7 @@ class Application(QMainWindow):
             self.importExcel(excel_file)
         else:
             self.newProject()
+            QtCore.QTimer.singleShot(0, self.checkRecovery)
         self.threadpool = QtCore.QThreadPool()
         self.discoverPlugins()
         return
@@ -208,6 +220,8 @@ class Application(QMainWindow):
         if not name in self.sheets:
             return
         table = self.sheets[name]
+        if table.archive is not None:
+            self.loadSheet(table)
         #print (table.pf)
         #get plot options and update widgets
         self.updatePlotWidgets(table)
@@ -277,6 +291,11 @@ class Application(QMainWindow):
             import matplotlib as mpl
             mpl.rcParams['savefig.dpi'] = core.DPI
             core.ICONSIZE = int(s.value("iconsize"))
+            core.UNDOMEMORY = int(s.value("undomemory"))
+            core.CATEGORIZE = util.valueToBool(s.value("categorize"))
+            core.COMPRESSION = s.value("compression")
+            core.COMPRESSIONLEVEL = int(s.value("compressionlevel"))
+            core.AUTOSAVE = int(s.value("autosave"))
             r = s.value("recent_files")
             if r != '':
                 rct = r.split(',')
@@ -304,6 +323,11 @@ class Application(QMainWindow):
         self.settings.setValue('showplotter', core.SHOWPLOTTER)
         self.settings.setValue('plotstyle', core.PLOTSTYLE)
         self.settings.setValue('dpi', core.DPI)
+        self.settings.setValue('undomemory', core.UNDOMEMORY)
+        self.settings.setValue('categorize', core.CATEGORIZE)
+        self.settings.setValue('compression', core.COMPRESSION)
+        self.settings.setValue('compressionlevel', core.COMPRESSIONLEVEL)
+        self.settings.setValue('autosave', core.AUTOSAVE)
         self.settings.setValue('recent_files',','.join(self.recent_files))
         self.settings.setValue('recent_urls','^^'.join(self.recent_urls))
         if hasattr(self, 'scratchpad'):
@@ -321,6 +345,7 @@ class Application(QMainWindow):
         import matplotlib as mpl
         mpl.rcParams['savefig.dpi'] = core.DPI
         self.setTheme(self.theme)
+        self.setAutosave()
         return
 
     def setTheme(self, theme=None):
@@ -372,7 +397,7 @@ class Application(QMainWindow):
             else:
                 icon = QIcon.fromTheme(items[i]['icon'])
             btn = QAction(icon, i, self)
-            btn.triggered.connect(items[i]['action'])
+            btn.triggered.connect(dialogs.memoryGuard(self, items[i]['action']))
             #btn.setCheckable(True)
             toolbar.addAction(btn)
         return
@@ -398,8 +423,10 @@ class Application(QMainWindow):
         self.file_menu.addAction('Batch Import', self.importMultiple)
         self.file_menu.addAction('Import Pickle file', self.importPickle)
         self.file_menu.addAction('Import HDF5', self.importHDF)
+        self.file_menu.addAction('Import Parquet/Arrow', self.importColumnar)
+        self.file_menu.addAction('Open Memory Mapped', self.importMapped)
         self.file_menu.addAction('Import URL', self.importURL)
-        self.file_menu.addAction('Export As', self.exportAs)
+        self.file_menu.addAction('Export As', dialogs.memoryGuard(self, self.exportAs))
         icon = QIcon(os.path.join(iconpath,'application-exit.png'))
         self.file_menu.addAction(icon, '&Quit', self.fileQuit,
                 QtCore.Qt.CTRL + QtCore.Qt.Key_Q)
@@ -409,11 +436,13 @@ class Application(QMainWindow):
         self.menuBar().addMenu(self.edit_menu)
         self.undo_item = self.edit_menu.addAction('Undo', self.undo,
                 QtCore.Qt.CTRL + QtCore.Qt.Key_Z)
+        self.redo_item = self.edit_menu.addAction('Redo', self.redo,
+                QtCore.Qt.CTRL + QtCore.Qt.SHIFT + QtCore.Qt.Key_Z)
         #self.undo_item.setDisabled(True)
         icon = QIcon(os.path.join(iconpath,'copy.png'))
-        self.edit_menu.addAction(icon, 'Copy', self.copy)
+        self.edit_menu.addAction(icon, 'Copy', dialogs.memoryGuard(self, self.copy))
         icon = QIcon(os.path.join(iconpath,'paste.png'))
-        self.edit_menu.addAction(icon, 'Paste', self.paste)
+        self.edit_menu.addAction(icon, 'Paste', dialogs.memoryGuard(self, self.paste))
         icon = QIcon(os.path.join(iconpath,'paste.png'))
         self.edit_menu.addAction(icon, 'Paste as New Sheet', self.pasteNewSheet)
         icon = QIcon(os.path.join(iconpath,'findreplace.png'))
@@ -456,10 +485,10 @@ class Application(QMainWindow):
         self.sheet_menu.addAction('Rename', self.renameSheet)
         icon = QIcon(os.path.join(iconpath,'copy.png'))
         #self.sheet_menu.addAction(icon, 'Copy', self.copySheet)
-        self.sheet_menu.addAction(icon, 'Duplicate', self.duplicateSheet)
-        self.sheet_menu.addAction('Join', self.concatSheets)
+        self.sheet_menu.addAction(icon, 'Duplicate', dialogs.memoryGuard(self, self.duplicateSheet))
+        self.sheet_menu.addAction('Join', dialogs.memoryGuard(self, self.concatSheets))
         icon = QIcon(os.path.join(iconpath,'merge.png'))
-        self.sheet_menu.addAction(icon, 'Merge', self.mergeSheets)
+        self.sheet_menu.addAction(icon, 'Merge', dialogs.memoryGuard(self, self.mergeSheets))
         self.sheet_menu.addAction('Clear All', self.clearSheets)
 
         self.tools_menu = QMenu('Tools', self)
@@ -472,6 +501,8 @@ class Application(QMainWindow):
         icon = QIcon(os.path.join(iconpath,'table-duplicates.png'))
         self.tools_menu.addAction(icon, 'Find Duplicates', lambda: self._call('findDuplicates'))
         self.tools_menu.addAction('Convert Numeric', lambda: self._call('convertNumeric'))
+        self.tools_menu.addAction('Categorize Columns', lambda: self._call('categorize'))
+        self.tools_menu.addAction('Optimize Memory', lambda: self._call('optimizeMemory'))
         self.tools_menu.addAction('Format Column Names', lambda: self._call('convertColumnNames'))
         self.tools_menu.addAction('Time Series Resample', lambda: self._call('resample'))
         icon = QIcon(os.path.join(iconpath,'tabletotext.png'))
@@ -495,7 +526,7 @@ class Application(QMainWindow):
         icon = QIcon(os.path.join(iconpath,'scratchpad-plot.png'))
         self.scratch_menu.addAction(icon,'Plot to Scratchpad', lambda: self.plotToScratchpad())
         icon = QIcon(os.path.join(iconpath,'scratchpad-table.png'))
-        self.scratch_menu.addAction(icon,'Table to Scratchpad', lambda: self.tableToScratchpad())
+        self.scratch_menu.addAction(icon,'Table to Scratchpad', dialogs.memoryGuard(self, self.tableToScratchpad))
 
         self.plugin_menu = QMenu('Plugins', self)
         self.menuBar().addMenu(self.plugin_menu)
@@ -521,7 +552,10 @@ class Application(QMainWindow):
         """Call a table function from it's string name"""
 
         table = self.getCurrentTable()
-        getattr(table, func)(**args)
+        try:
+            getattr(table, func)(**args)
+        except MemoryError as e:
+            dialogs.showMessage(self, str(e))
         return
 
     def _check_snap(self):
@@ -586,6 +620,7 @@ class Application(QMainWindow):
         self.filename = None
         self.projopen = True
         self.scratch_items = {}
+        self.recovery['sheets'] = {}
         #load data if provided
         if data != None:
             for s in data.keys():
@@ -597,6 +632,8 @@ class Application(QMainWindow):
                 else:
                     meta=None
                 self.addSheet(s, df, meta)
+                if 'mapped' in data[s]:
+                    self.sheets[s].importMapped(data[s]['mapped'])
             if 'scratch_items' in data:
                 self.scratch_items = data['scratch_items']
             #set current sheet
@@ -631,18 +668,28 @@ class Application(QMainWindow):
         if ext != '.txpl':
             print ('does not appear to be a project file')
             return
-        if os.path.isfile(filename):
+        if util.recoverArchive(filename) == True:
+            print ('the last save of %s did not complete, restored' %filename)
+        if zipfile.is_zipfile(filename):
+            try:
+                self.openArchive(filename)
+            except Exception as e:
+                dialogs.showMessage(self, 'Could not open project: %s' %e)
+                return
+        elif os.path.isfile(filename):
+            #older projects are a single pickle
             try:
                 data = pickle.load(gzip.GzipFile(filename, 'r'))
             except Exception as e:
                 print ('Could not load pickle file')
                 msg = 'Could not load pickle file. Possibly this was saved with an older version of Python.'
                 dialogs.showMessage(self, msg)
+                return
+            self.newProject(data)
         else:
             print ('no such file')
             self.quit()
             return
-        self.newProject(data)
         self.filename = filename
 
         self.proj_label.setText(self.filename)
@@ -651,6 +698,63 @@ class Application(QMainWindow):
         self.addRecentFile(filename)
         return
 
+    def openArchive(self, filename):
+        """Open a project archive. Only the manifest is read, each sheet is
+        read when its tab is first selected."""
+
+        manifest = util.readManifest(filename)
+        #empty project
+        self.newProject({})
+        for entry in manifest['sheets']:
+            self.addSheet(entry['name'])
+            w = self.getCurrentTable()
+            w.archive = dict(entry, source=filename)
+        if 'scratch' in manifest:
+            self.scratch_items = util.readArchiveObject(filename, manifest['scratch'])
+        index = manifest.get('currentsheet', 0)
+        self.tabs.setCurrentIndex(index)
+        self.tabSelected(self.tabs.currentIndex())
+        return
+
+    def loadSheet(self, w):
+        """Read the data and meta data of a sheet from the project archive"""
+
+        entry = w.archive
+        if w.table.jobs.isRunning():
+            return
+        source = entry['source']
+
+        def func(progress_callback):
+            df = None
+            if entry['data'] is not None:
+                #recovery files can refer to data in the project file
+                df = util.readSheet(entry.get('datasource', source), entry['data'],
+                                    entry['format'])
+            meta = util.readArchiveObject(source, entry['meta'])
+            return df, meta
+
+        def loaded(result):
+            df, meta = result
+            stored = w.archive
+            w.archive = None
+            if 'mapped' in entry:
+                w.importMapped(entry['mapped'])
+            else:
+                w.table.model.df = df
+            w.refresh()
+            self.loadMeta(w, meta)
+            if 'showplotter' in meta and meta['showplotter'] == False:
+                w.pf.hide()
+            model = w.table.model
+            w.saved = (stored, model, model.version)
+            w.updateStatusBar()
+            if w is self.getCurrentTable():
+                self.updatePlotWidgets(w)
+
+        w.table.jobs.run(func, loaded, label='Loading %s' %entry['name'],
+                         threaded=True)
+        return
+
     def saveAsProject(self):
         """Save as a new project filename"""
 
@@ -689,13 +793,21 @@ class Application(QMainWindow):
         return
 
     def saveWithProgress(self, filename):
-        """Save with progress bar"""
+        """Save with progress bar. The sheets are snapshot here and written
+        by a worker, so they can be used while saving."""
 
         self.savedlg = dlg = dialogs.ProgressWidget(label='Saving to %s' %filename)
         dlg.show()
+        project = self.getSnapshot(filename)
         def func(progress_callback):
-            self.do_saveProject(self.filename)
-        self.run_threaded_process(func, self.processing_completed)
+            return self.writeProject(filename, project, progress_callback)
+        def saved(entries):
+            self.setSaved(project, entries, filename)
+        def completed():
+            self.releaseSnapshot(project)
+            self.processing_completed()
+        worker = self.run_threaded_process(func, completed)
+        worker.signals.result.connect(saved)
         return
 
     def run_threaded_process(self, process, on_complete):
@@ -704,14 +816,17 @@ class Application(QMainWindow):
         #if self.running == True:
         #    return
         worker = dialogs.Worker(fn=process)
-        self.threadpool.start(worker)
         worker.signals.finished.connect(on_complete)
-        #worker.signals.progress.connect(self.progress_fn)
+        worker.signals.progress.connect(self.progress_fn)
+        self.threadpool.start(worker)
         self.savedlg.progressbar.setRange(0,0)
         #self.worker = worker
-        return
+        return worker
 
     def progress_fn(self, msg):
+        """Show progress messages from a worker"""
+
+        self.savedlg.label.setText(msg)
         return
 
     def processing_completed(self):
@@ -723,31 +838,366 @@ class Application(QMainWindow):
         return
 
     def do_saveProject(self, filename, progress_callback=None):
-        """Does the actual saving. Save sheets inculding table dataframes
-           and meta data as dict to compressed pickle.
+        """Save the project now, see writeProject"""
+
+        project = self.getSnapshot(filename)
+        try:
+            entries = self.writeProject(filename, project, progress_callback)
+            self.setSaved(project, entries, filename)
+        finally:
+            self.releaseSnapshot(project)
+        return
+
+    def getSnapshot(self, filename, stored=None):
+        """
+        Take what is needed to write the project, so that it can be done in
+        another thread without using the sheets. Data is not copied, see
+        DataFrameTable.getSnapshot, call releaseSnapshot once written.
+        Args:
+            filename: archive to be written, sheets unchanged since they were
+            saved to it are not written again
+            stored: archive entries to use for the data of sheets instead,
+            keyed by sheet widget
         """
 
-        data={}
-        for i in self.sheets:
-            tablewidget = self.sheets[i]
-            table = tablewidget.table
-            data[i] = {}
-            #save dataframe with current column order
-            if table.filtered == True:
-                table.showAll()
-
-            df = table.model.df
-            cols = table.getColumnOrder()
-            if table.checkColumnsUnique() == True:
+        if stored is None:
+            stored = {}
+            for name in self.sheets:
+                w = self.sheets[name]
+                if self.isSaved(w, filename):
+                    stored[w] = w.archive or w.saved[0]
+        project = {'currentsheet': self.tabs.currentIndex(),
+                   'scratch': dict(self.scratch_items), 'sheets': []}
+        for name in self.sheets:
+            w = self.sheets[name]
+            sheet = {'name': name, 'widget': w, 'stored': stored.get(w),
+                     'version': None, 'meta': None}
+            project['sheets'].append(sheet)
+            if w.archive is not None:
+                if sheet['stored'] is None:
+                    sheet['stored'] = w.archive
+                continue
+            model = w.table.model
+            sheet['version'] = (model, model.version)
+            if sheet['stored'] is not None:
+                pass
+            elif model.mapped == True:
+                #keep the file name only
+                sheet['mapped'] = model.filename
+            else:
+                sheet['data'] = w.table.getSnapshot()
+                sheet['model'] = model
+            sheet['meta'] = pickle.dumps(self.saveMeta(w))
+        return project
+
+    def releaseSnapshot(self, project):
+        """Release the table data held by a project snapshot"""
+
+        for sheet in project['sheets']:
+            if 'model' in sheet:
+                sheet['model'].release()
+        return
+
+    def writeProject(self, filename, project, progress_callback=None):
+        """
+        Write a project snapshot, see getSnapshot. The project is a zip
+        archive with a json manifest, one arrow file per sheet and the sheet
+        meta data pickled alongside. If the archive exists only changed sheets
+        are written, otherwise it is rewritten, copying sheets that are stored
+        in other archives without reading them. Does not use the sheets.
+        Returns:
+            the manifest entry of each sheet
+        """
+
+        rate = util.Throughput()
+        if progress_callback is not None:
+            rate.callback = progress_callback.emit
+        entries = self.writeChanged(filename, project, rate)
+        if entries is not None:
+            return entries
+        tmpfile = filename + '.tmp'
+        zf = zipfile.ZipFile(tmpfile, 'w', zipfile.ZIP_STORED, allowZip64=True)
+        entries = []
+        for n, sheet in enumerate(project['sheets']):
+            entries.append(self.writeSheet(zf, sheet, n, rate=rate))
+        self.closeArchive(zf, project, entries, len(entries))
+        util.syncFile(tmpfile)
+        os.replace(tmpfile, filename)
+        return entries
+
+    def isSaved(self, tablewidget, filename):
+        """Check if the sheet data is unchanged since it was last saved to
+        or read from the archive filename"""
+
+        if tablewidget.archive is not None:
+            return tablewidget.archive['source'] == filename
+        if tablewidget.saved is None or tablewidget.table.filtered == True:
+            return False
+        entry, model, version = tablewidget.saved
+        return (entry['source'] == filename and model is tablewidget.table.model
+                and model.version == version)
+
+    def writeChanged(self, filename, project, rate=None):
+        """
+        Update an existing project archive in place, writing only sheets
+        changed since they were saved. New members and a new directory are
+        appended after the old directory, which stays valid until the save
+        is complete, see util.openAppend. Replaced members are dropped from
+        the zip directory, their space is reclaimed by a full save once it is
+        larger than the data kept.
+        Returns:
+            the manifest entries or None if a full save is needed instead
+        """
+
+        if not os.path.exists(filename):
+            return
+        util.recoverArchive(filename)
+        if not zipfile.is_zipfile(filename):
+            return
+        keep = set()
+        for sheet in project['sheets']:
+            stored = sheet['stored']
+            if stored is None or stored.get('link') == True:
+                continue
+            if (stored.get('datasource', stored['source']) == filename
+                and stored['data'] is not None):
+                keep.add(stored['data'])
+            if stored['source'] == filename and sheet['meta'] is None:
+                keep.add(stored['meta'])
+        if len(keep) == 0:
+            return
+        manifest = util.readManifest(filename)
+        with zipfile.ZipFile(filename) as zf:
+            kept = sum(i.compress_size for i in zf.infolist() if i.filename in keep)
+        if os.path.getsize(filename) - kept > kept:
+            return
+        zf = util.openAppend(filename, keep)
+        if zf is None:
+            return
+        n = manifest.get('next', len(manifest['sheets']))
+        entries = []
+        try:
+            for sheet in project['sheets']:
+                entries.append(self.writeSheet(zf, sheet, n, filename, rate))
+                n += 1
+            self.closeArchive(zf, project, entries, n)
+        except:
+            util.abortAppend(zf, filename)
+            raise
+        util.endAppend(filename)
+        return entries
+
+    def writeSheet(self, zf, sheet, n, keep=None, rate=None):
+        """
+        Write a sheet snapshot to an open project archive and return its
+        manifest entry. Stored data is left in place if it is in the archive
+        being updated, keep, referred to if it is a link and otherwise copied.
+        Bytes written are added to rate, a util.Throughput.
+        """
+
+        entry = {}
+        stored = sheet['stored']
+        if stored is not None:
+            for key in ['data', 'format', 'rows', 'columns', 'mapped']:
+                if key in stored:
+                    entry[key] = stored[key]
+            source = stored.get('datasource', stored['source'])
+            if stored.get('link') == True:
+                entry['datasource'] = source
+            elif source != keep and stored['data'] is not None:
+                #keep extensions such as .pickle.zst
+                ext = stored['data'][stored['data'].index('.'):]
+                entry['data'] = 'sheets/%s%s' %(n, ext)
+                util.copyMember(source, zf, stored['data'], entry['data'])
+                if rate is not None:
+                    rate.add(zf.getinfo(entry['data']).compress_size)
+        elif 'mapped' in sheet:
+            entry['mapped'] = sheet['mapped']
+            entry['data'] = None
+            entry['format'] = None
+        else:
+            #save dataframe in view order with current column order
+            df, rows, cols = sheet['data']
+            if rows is not None:
+                df = df.take(rows)
+            if cols is not None:
                 df = df[cols]
-            data[i]['table'] = df
-            data[i]['meta'] = self.saveMeta(tablewidget)
+            entry['data'], entry['format'] = util.writeSheet(df, zf, 'sheets/%s' %n,
+                                                core.COMPRESSION, core.COMPRESSIONLEVEL)
+            entry['rows'], entry['columns'] = df.shape
+            if rate is not None:
+                rate.add(zf.getinfo(entry['data']).compress_size)
+        if sheet['meta'] is not None:
+            entry['meta'] = 'meta/%s.pickle' %n
+            zf.writestr(entry['meta'], sheet['meta'])
+        elif stored['source'] == keep:
+            entry['meta'] = stored['meta']
+        else:
+            entry['meta'] = 'meta/%s.pickle' %n
+            util.copyMember(stored['source'], zf, stored['meta'], entry['meta'])
+        entry['name'] = sheet['name']
+        return entry
+
+    def closeArchive(self, zf, project, entries, n):
+        """Write the scratch items and manifest and close the archive"""
+
+        manifest = {'format': 'tablexplore', 'version': 2, 'next': n,
+                    'currentsheet': project['currentsheet'],
+                    'sheets': entries,
+                    'scratch': 'scratch.pickle'}
+        if 'project' in project:
+            manifest['project'] = project['project']
+        zf.writestr('scratch.pickle', pickle.dumps(project['scratch']))
+        zf.writestr('manifest.json', json.dumps(manifest, indent=1))
+        zf.close()
+        return
+
+    def setSaved(self, project, entries, filename):
+        """Record where each sheet is stored after saving to filename. The
+        recovery files are no longer needed."""
+
+        for sheet, entry in zip(project['sheets'], entries):
+            w = sheet['widget']
+            entry = dict(entry, source=filename)
+            if sheet['version'] is None:
+                if w.archive is not None:
+                    w.archive = entry
+            else:
+                model, version = sheet['version']
+                w.saved = (entry, model, version)
+        self.saves += 1
+        self.removeRecovery()
+        return
+
+    def setAutosave(self):
+        """Start or stop the autosave timer from the AUTOSAVE setting"""
 
-        data['scratch_items'] = self.scratch_items
-        data['meta'] = {}
-        data['meta']['currentsheet'] = self.tabs.currentIndex()
-        file = gzip.GzipFile(filename, 'w')
-        pickle.dump(data, file)
+        self.autosavetimer.stop()
+        if core.AUTOSAVE > 0:
+            self.autosavetimer.start(core.AUTOSAVE * 60000)
+        return
+
+    def autosave(self):
+        """
+        Save the sheets changed since the project was saved to a recovery
+        file in the background. Sheets are snapshot here without copying
+        data, unchanged sheets refer to the project file or are copied from
+        the last recovery file. Two recovery files are used in turn.
+        """
+
+        if self.running == True or self.autosaving == True:
+            return
+        last = self.recovery
+        names = list(self.sheets)
+        stored = {}
+        changed = names != last['names']
+        dirty = False
+        for name in names:
+            w = self.sheets[name]
+            if self.filename is not None and self.isSaved(w, self.filename):
+                stored[w] = dict(w.archive or w.saved[0], link=True)
+                continue
+            dirty = True
+            if w.archive is not None:
+                model = None
+            else:
+                model = w.table.model
+            marker = last['sheets'].get(w)
+            if (marker is not None and marker[1] is model and w.table.filtered == False
+                and (model is None or model.version == marker[2])):
+                stored[w] = marker[0]
+            else:
+                changed = True
+        if dirty == False or changed == False:
+            return
+        index = 1 - last['index']
+        if not os.path.exists(self.recoverypath):
+            os.makedirs(self.recoverypath)
+        filename = os.path.join(self.recoverypath,
+                                'recovery-%s-%s.txpl' %(self.session, index))
+        project = self.getSnapshot(filename, stored)
+        project['project'] = self.filename
+        saves = self.saves
+        self.autosaving = True
+
+        def func(progress_callback):
+            return self.writeProject(filename, project)
+
+        def saved(entries):
+            if self.saves != saves:
+                #the project was saved meanwhile
+                self.removeRecovery()
+                return
+            markers = {}
+            for sheet, entry in zip(project['sheets'], entries):
+                entry = dict(entry, source=filename)
+                if sheet['version'] is None:
+                    markers[sheet['widget']] = (entry, None, None)
+                else:
+                    markers[sheet['widget']] = (entry,) + sheet['version']
+            self.recovery = {'filename': filename, 'index': index,
+                             'names': names, 'sheets': markers}
+
+        def completed():
+            self.releaseSnapshot(project)
+            self.autosaving = False
+
+        worker = dialogs.Worker(fn=func)
+        worker.signals.result.connect(saved)
+        worker.signals.finished.connect(completed)
+        self.threadpool.start(worker)
+        return
+
+    def getRecoveryFiles(self, own=True):
+        """Recovery files of this session, or of other sessions if own is False"""
+
+        if not os.path.exists(self.recoverypath):
+            return []
+        prefix = 'recovery-%s-' %self.session
+        files = []
+        for f in os.listdir(self.recoverypath):
+            if not f.startswith('recovery-') or not f.endswith('.txpl'):
+                continue
+            if f.startswith(prefix) == own:
+                files.append(os.path.join(self.recoverypath, f))
+        return files
+
+    def removeRecovery(self):
+        """Remove the recovery files of this session"""
+
+        for f in self.getRecoveryFiles():
+            os.remove(f)
+        self.recovery = {'filename': None, 'index': 0, 'names': [], 'sheets': {}}
+        return
+
+    def checkRecovery(self):
+        """Offer to open the latest recovery file left by a session that did
+        not close properly"""
+
+        files = sorted(self.getRecoveryFiles(own=False), key=os.path.getmtime)
+        if len(files) == 0:
+            return
+        filename = files[-1]
+        t = time.strftime('%Y-%m-%d %H:%M', time.localtime(os.path.getmtime(filename)))
+        reply = QMessageBox.question(self, 'Recover unsaved work?',
+                                 'Tablexplore did not close properly. Recover '
+                                 'the unsaved work autosaved at %s?' %t,
+                                 QMessageBox.Yes | QMessageBox.No)
+        if reply == QMessageBox.Yes:
+            try:
+                project = util.readManifest(filename).get('project')
+                self.openArchive(filename)
+            except Exception as e:
+                dialogs.showMessage(self, 'Could not recover project: %s' %e)
+            else:
+                #sheets are read from the recovery file until saved
+                files.remove(filename)
+                self.recovered.append(filename)
+                self.filename = project
+                if project is not None:
+                    self.proj_label.setText(project)
+        for f in files:
+            os.remove(f)
         return
 
     def saveMeta(self, tablewidget):
@@ -758,21 +1208,15 @@ class Application(QMainWindow):
         pf = tablewidget.pf
         #pf.applyPlotoptions()
         table = tablewidget.table
-        #save plot options
-        meta['opts'] = {}
-        for name in pf.opts:
-            meta['opts'][name] = pf.opts[name].kwds
-            #print (pf.opts[name].kwds)
+        #save plot options and what was plotted, the figure is not kept
+        meta['plot'] = pf.getSpec()
 
         #save table selections
         meta['table'] = util.getAttributes(table)
-        meta['table']['selectedcols'] = table.getSelectedColumns()
-        meta['table']['selectedrows'] = table.getSelectedRows()
+        meta['table']['selectedranges'] = table.getSelectionRanges()
         meta['table']['scrollposition'] = table.getScrollPosition()
         meta['table']['filtered'] = False
         meta['table']['column_widths'] = table.getColumnWidths()
-        meta['plotviewer'] = util.getAttributes(pf)
-        #print (meta['plotviewer'])
         #is plotter shown
         if pf.isHidden():
             meta['showplotter'] = False
@@ -780,7 +1224,7 @@ class Application(QMainWindow):
             meta['showplotter'] = True
         #save child table if present
         if tablewidget.subtable != None:
-            meta['subtable'] = tablewidget.subtable.table.model.df
+            meta['subtable'] = tablewidget.subtable.table.model.take()
 
         return meta
 
@@ -795,11 +1239,13 @@ class Application(QMainWindow):
         else:
             subtable = None
         #load plot options
-        opts = table.pf.opts
-        for name in opts:
-            #if m in meta and meta[m] is not None:
-            #opts[name].updateWidgets(meta['opts'][name])
-            opts[name].kwds = meta['opts'][name]
+        if 'plot' in meta:
+            table.pf.setSpec(meta['plot'])
+        else:
+            opts = table.pf.opts
+            for name in opts:
+                opts[name].kwds = meta['opts'][name]
+        if table is self.getCurrentTable():
             self.updatePlotWidgets(table)
 
         #load table settings
@@ -809,8 +1255,8 @@ class Application(QMainWindow):
             #print (len(tablesettings['column_widths']))
             table.table.setColumnWidths(tablesettings['column_widths'])
         table.refresh()
-        #load plotviewer
-        if 'plotviewer' in meta:
+        #figure pickled by older versions
+        if 'plotviewer' in meta and 'fig' in meta['plotviewer']:
             #print (meta['plotviewer'])
             fig = meta['plotviewer']['fig']
             table.pf.setFigure(fig)
@@ -823,7 +1269,9 @@ class Application(QMainWindow):
             #util.setAttributes(table.child, childsettings)
 
         #redraw selections
-        if 'selectedrows' in tablesettings:
+        if 'selectedranges' in tablesettings:
+            table.table.setSelectionRanges(tablesettings['selectedranges'])
+        elif 'selectedrows' in tablesettings:
             rows = tablesettings['selectedrows']
             cols = tablesettings['selectedcols']
             table.table.setSelected(rows, cols)
@@ -873,29 +1321,45 @@ class Application(QMainWindow):
         if reply == QMessageBox.Yes:
             concat = True
 
-        tables = []
-        if concat == False:
-            for f in filenames:
-                lbl = os.path.splitext(os.path.basename(f))[0]
-                name = lbl
-                i=1
-                while name in self.sheets:
-                    name=lbl+'_%s' %i
-                    i+=1
-                    self.addSheet(name)
-                    w = self.getCurrentTable()
-                    w.importFile(f, dialog=False)
-                    QApplication.processEvents()
-        elif concat == True:
-            tables = []
-            for f in filenames:
-                df = pd.read_csv(f)
-                tables.append(df)
-            final = pd.concat(tables)
+        #files are read in parallel processes
+        def func(progress_callback):
+            def callback(i, n):
+                if worker.cancelled:
+                    raise dialogs.Cancelled()
+                progress_callback.emit(str(i))
+            return util.readFiles(filenames, callback=callback, concat=concat)
+        worker = dialogs.Worker(fn=func)
+        dlg = self.importdlg = dialogs.ProgressWidget(self, label='Importing %s files' %num_files,
+                                                      cancel=worker.cancel)
+        dlg.progressbar.setRange(0, num_files)
+        dlg.show()
+        worker.signals.progress.connect(lambda i: dlg.progressbar.setValue(int(i)))
+        worker.signals.result.connect(lambda result: self.addImported(filenames, result, concat))
+        worker.signals.error.connect(lambda err: dialogs.showMessage(self, str(err[1])))
+        worker.signals.finished.connect(dlg.close)
+        self.threadpool.start(worker)
+        return
+
+    def addImported(self, filenames, result, concat=False):
+        """Add sheets for imported files, or one sheet for the joined
+        table if concat is True"""
+
+        if concat == True:
             self.addSheet('imported')
             w = self.getCurrentTable()
-            w.table.model.df = final
-            w.refresh()
+            w.setImported(result)
+            return
+        frames = result
+        for f, df in zip(filenames, frames):
+            lbl = os.path.splitext(os.path.basename(f))[0]
+            name = lbl
+            i=1
+            while name in self.sheets:
+                name=lbl+'_%s' %i
+                i+=1
+            self.addSheet(name)
+            w = self.getCurrentTable()
+            w.setImported(df)
         return
 
     def importExcel(self, filename=None):
@@ -919,6 +1383,20 @@ class Application(QMainWindow):
         w.importHDF()
         return
 
+    def importColumnar(self):
+
+        self.addSheet()
+        w = self.getCurrentTable()
+        w.importColumnar()
+        return
+
+    def importMapped(self, filename=None):
+
+        self.addSheet()
+        w = self.getCurrentTable()
+        w.importMapped(filename)
+        return
+
     def importURL(self):
         """Import from URL"""
 
@@ -936,11 +1414,18 @@ class Application(QMainWindow):
         options = QFileDialog.Options()
         w = self.getCurrentTable()
         filename, _ = QFileDialog.getSaveFileName(self,"Export",
-                             "","csv files (*.csv);;xlsx files (*.xlsx);;xls Files (*.xls);;hdf files (*.hdf5);;All Files (*)",
+                             "","csv files (*.csv);;compressed csv files (*.csv.zst *.csv.lz4 *.csv.gz);;xlsx files (*.xlsx);;xls Files (*.xls);;hdf files (*.hdf5);;parquet files (*.parquet);;feather files (*.feather);;All Files (*)",
                              options=options)
         df = w.table.model.df
         ext = os.path.splitext(filename)[1]
-        if ext == '.csv':
+        if ext.lower() in util.COLUMNAR:
+            try:
+                util.writeColumnar(df, filename, core.COMPRESSION, core.COMPRESSIONLEVEL)
+            except Exception as e:
+                dialogs.showMessage(self, str(e))
+        elif ext.lower() in util.CODEC_EXTENSIONS:
+            w.exportCompressed(df, filename)
+        elif ext == '.csv':
             df.to_csv(filename)
         elif ext == '.hdf5':
             df.to_hdf(filename)
@@ -994,6 +1479,7 @@ class Application(QMainWindow):
             if reply == QMessageBox.No:
                 return False
         name = self.tabs.tabText(index)
+        self.sheets[name].close()
         del self.sheets[name]
         self.tabs.removeTab(index)
         return
@@ -1017,6 +1503,17 @@ class Application(QMainWindow):
             self.tabs.setTabText(index, new)
         return
 
+    def getSheetData(self, name):
+        """Dataframe of a sheet, read from the project archive if the
+        sheet has not been loaded"""
+
+        w = self.sheets[name]
+        entry = w.archive
+        if entry is not None and entry['data'] is not None:
+            return util.readSheet(entry.get('datasource', entry['source']),
+                                  entry['data'], entry['format'])
+        return w.table.model.df
+
     def duplicateSheet(self):
         """Make a copy of a sheet"""
 
@@ -1056,7 +1553,7 @@ class Application(QMainWindow):
         lblcol = kwds['add label column']
         new = []
         for n in names:
-            df = self.sheets[n].table.model.df
+            df = self.getSheetData(n)
             if lblcol == True:
                 df['label'] = n
             new.append(df)
@@ -1080,9 +1577,9 @@ class Application(QMainWindow):
         if not dlg.accepted:
             return
         kwds = dlg.values
-        table1 = self.sheets[kwds['sheet1']].table
-        table2 = self.sheets[kwds['sheet2']].table
-        dlg = dialogs.MergeDialog(self, df=table1.model.df, df2=table2.model.df, app=self)
+        df1 = self.getSheetData(kwds['sheet1'])
+        df2 = self.getSheetData(kwds['sheet2'])
+        dlg = dialogs.MergeDialog(self, df=df1, df2=df2, app=self)
         dlg.exec_()
         if not dlg.accepted:
             return
@@ -1157,7 +1654,12 @@ class Application(QMainWindow):
         self.saveSettings()
         if hasattr(self,'scratchpad'):
             self.scratchpad.close()
+        self.autosavetimer.stop()
         self.threadpool.waitForDone()
+        self.removeRecovery()
+        for f in self.recovered:
+            if os.path.exists(f):
+                os.remove(f)
         self.fileQuit()
         return
 
@@ -1239,6 +1741,13 @@ class Application(QMainWindow):
         w.refresh()
         return
 
+    def redo(self):
+
+        w = self.getCurrentTable()
+        w.table.redo()
+        w.refresh()
+        return
+
     '''def runLastAction(self):
         w = self.getCurrentTable()
         w.runLastAction()
@@ -1447,6 +1956,8 @@ class Application(QMainWindow):
 
 def main():
     import sys, os
+    import multiprocessing
+    multiprocessing.freeze_support()
 
     from argparse import ArgumentParser
     parser = ArgumentParser()
@@ -22,9 +22,11 @@
 
 import sys, os, io, platform
 import tempfile
+from collections import OrderedDict
 import numpy as np
 import pandas as pd
 from pandas.api.types import is_datetime64_any_dtype as is_datetime
+from pandas.api.types import is_float_dtype, is_numeric_dtype, is_object_dtype
 import string
 from .qt import *
 
@@ -39,6 +41,8 @@ cmapsfile = os.path.join(settingspath, 'cmaps.pkl')
 
 textalignment = None
 MODES = ['default','spreadsheet','locked']
+#tables with at least this many rows sort, filter and search in a thread
+THREADED_ROWS = 200000
 
 if 'Windows' in platform.platform():
     defaultfont = 'Arial'
@@ -57,7 +61,12 @@ defaults = {
             'PLOTSTYLE'  :'bmh',
             'DPI' : 100,
             'BGCOLOR' : '#F4F4F3',
-            'THEME': 'Fusion'
+            'THEME': 'Fusion',
+            'UNDOMEMORY': 500,
+            'CATEGORIZE': False,
+            'COMPRESSION': 'zstd',
+            'COMPRESSIONLEVEL': 0,
+            'AUTOSAVE': 5
 }
 #populate current class variable
 for k in defaults:
@@ -68,7 +77,7 @@ try:
 except AttributeError:
     def _fromUtf8(s):
         return s
-from . import dialogs, plotting, util
+from . import dialogs, plotting, util, search
 
 icons = {'load': 'open', 'save': 'export',
          'importexcel': 'excel',
@@ -107,9 +116,13 @@ class SubWidget(QDockWidget):
         self.table=table
         #self.setSizePolicy(QSizePolicy.Expanding , QSizePolicy.Expanding)
     def closeEvent(self, ce):
+        widget = self.widget()
+        if hasattr(widget, 'stop'):
+            #nothing left to apply once the table is reset
+            widget.stop()
         self.table.showAll()
         #self.table.filtered = False
-        self.table.model.highlighted = None
+        self.table.model.highlights.clear()
         self.table.refresh()
         #we should actually do this:
         #for i in xrange(self.layout.count()):
@@ -156,8 +169,14 @@ class DataFrameWidget(QWidget):
         self.subtable = None
         self.filterdock = None
         self.finddock = None
+        self.importer = None
+        #project archive entry while the sheet data has not been read
+        self.archive = None
+        #archive entry, model and version when the sheet was last saved
+        self.saved = None
         self.mode = 'default'
         self.table.model.dataChanged.connect(self.stateChanged)
+        self.table.model.memory.updated.connect(self.updateStatusBar)
         return
 
     #@Slot('QModelIndex','QModelIndex','int')
@@ -219,6 +238,7 @@ class DataFrameWidget(QWidget):
 
         if self.pyconsole != None:
             self.pyconsole.closeEvent()
+        self.table.undostack.clear()
         return
 
     def refresh(self):
@@ -231,9 +251,10 @@ class DataFrameWidget(QWidget):
 
         if not hasattr(self, 'size_label'):
             return
-        df = self.table.model.df
+        model = self.table.model
         meminfo = self.table.getMemory()
-        s = '{r} rows x {c} columns | {m}'.format(r=len(df), c=len(df.columns),m=meminfo)
+        s = '{r} rows x {c} columns | {m}'.format(r=model.rowCount(), c=model.columnCount(),
+                                                  m=meminfo)
         self.size_label.setText(s)
         return
 
@@ -261,13 +282,25 @@ class DataFrameWidget(QWidget):
         if dialog is True:
             dlg = dialogs.ImportDialog(self, filename)
             dlg.exec_()
-            if not dlg.accepted:
+            if not dlg.accepted or dlg.kwargs is None:
                 return
-            self.table.model.df = dlg.df
-            self.refresh()
+            kwargs = dlg.kwargs
         else:
-            self.table.model.df = pd.read_csv(filename)
-            self.refresh()
+            kwargs = {}
+        if self.importer is not None:
+            self.importer.cancel()
+        self.importer = CSVImporter(self, filename, **kwargs)
+        self.importer.start()
+        return
+
+    def setImported(self, df):
+        """Show an imported dataframe, text columns with few distinct values
+        are stored as categories if CATEGORIZE is set"""
+
+        if CATEGORIZE == True:
+            util.categorize(df)
+        self.table.model.df = df
+        self.refresh()
         return
 
     def importPickle(self):
@@ -294,6 +327,62 @@ class DataFrameWidget(QWidget):
             self.refresh()
         return
 
+    def importColumnar(self, filename=None):
+        """Import parquet, feather or arrow file. Only the selected columns
+        and rows matching the filter are read."""
+
+        if filename == None:
+            options = QFileDialog.Options()
+            filename, _ = QFileDialog.getOpenFileName(self,"Import Parquet/Arrow",
+                             "","parquet files (*.parquet *.pq);;feather/arrow files (*.feather *.arrow *.ipc);;All Files (*)",
+                             options=options)
+        if not filename:
+            return
+        try:
+            cols = util.getColumnarSchema(filename)
+        except Exception as e:
+            dialogs.showMessage(self, str(e))
+            return
+        opts = {'columns': {'type':'list','default':'','items':cols,
+                            'label':'Columns (none for all)'},
+                'filter': {'type':'entry','default':'','label':'Filter',
+                            'tooltip':"e.g. year >= 2020 and region == 'EU'"}}
+        dlg = dialogs.MultipleInputDialog(self, opts, title='Import Parquet/Arrow',
+                                          width=400, height=400)
+        dlg.exec_()
+        if not dlg.accepted:
+            return
+        columns = dlg.values['columns']
+        query = dlg.values['filter']
+
+        def func(progress_callback):
+            return util.readColumnar(filename, columns, query, callback=progress_callback)
+        self.table.jobs.run(func, self.setImported, label='Importing', threaded=True)
+        return
+
+    def importMapped(self, filename=None):
+        """Open an arrow/feather file memory mapped, for browsing tables
+        larger than memory"""
+
+        if filename == None:
+            options = QFileDialog.Options()
+            filename, _ = QFileDialog.getOpenFileName(self,"Open Memory Mapped",
+                             "","feather/arrow files (*.feather *.arrow *.ipc);;All Files (*)",
+                             options=options)
+        if not filename:
+            return
+        try:
+            model = ArrowTableModel(filename)
+        except Exception as e:
+            dialogs.showMessage(self, str(e))
+            return
+        self.table.setDataModel(model)
+        model.dataChanged.connect(self.stateChanged)
+        model.memory.updated.connect(self.updateStatusBar)
+        self.refresh()
+        self.updateStatusBar()
+        return
+
     def importHDF(self):
         """Import hdf5 file"""
 
@@ -331,19 +420,56 @@ class DataFrameWidget(QWidget):
         options = QFileDialog.Options()
         #options.setDefaultSuffix('csv')
         filename, _ = QFileDialog.getSaveFileName(self,"Export",
-                             "","csv files (*.csv);;xlsx files (*.xlsx);;xls Files (*.xls);;All Files (*)",
+                             "","csv files (*.csv);;compressed csv files (*.csv.zst *.csv.lz4 *.csv.gz);;xlsx files (*.xlsx);;xls Files (*.xls);;parquet files (*.parquet);;feather files (*.feather);;All Files (*)",
                              options=options)
         if not filename:
             return
         df = self.table.model.df
+        ext = os.path.splitext(filename)[1].lower()
+        if ext in util.COLUMNAR:
+            try:
+                util.writeColumnar(df, filename, COMPRESSION, COMPRESSIONLEVEL)
+            except Exception as e:
+                dialogs.showMessage(self, str(e))
+            return
+        elif ext in util.CODEC_EXTENSIONS:
+            self.exportCompressed(df, filename)
+            return
         df.to_csv(filename)
         return
 
+    def exportCompressed(self, df, filename):
+        """Export to a compressed csv file in the background. The text is
+        compressed in blocks on all cores and the rate shown as progress."""
+
+        def func(progress_callback):
+            rate = util.Throughput(progress_callback.emit)
+            def callback(nin, nout):
+                if worker.cancelled:
+                    raise dialogs.Cancelled()
+                rate.add(nin)
+            try:
+                util.writeCSV(df, filename, COMPRESSIONLEVEL, callback=callback)
+            except dialogs.Cancelled:
+                os.remove(filename)
+                raise
+
+        worker = dialogs.Worker(fn=func)
+        dlg = self.exportdlg = dialogs.ProgressWidget(self, label='Exporting %s' %os.path.basename(filename),
+                                                      cancel=worker.cancel)
+        dlg.progressbar.setRange(0, 0)
+        dlg.show()
+        worker.signals.progress.connect(dlg.label.setText)
+        worker.signals.error.connect(lambda err: dialogs.showMessage(self, str(err[1])))
+        worker.signals.finished.connect(dlg.close)
+        QtCore.QThreadPool.globalInstance().start(worker)
+        return
+
     def copy(self):
         """Copy to clipboard"""
 
         #check size of dataframe
-        m = self.table.model.df.memory_usage(deep=True).sum()
+        m, exact = self.table.model.getMemory()
         if m>1e8:
             answer = QMessageBox.question(self, 'Copy?',
                              'This data may be too large to copy. Are you sure?', QMessageBox.Yes, QMessageBox.No)
@@ -384,8 +510,7 @@ class DataFrameWidget(QWidget):
         if self.pf == None:
             self.createPlotViewer()
         self.pf.setVisible(True)
-        df = self.getSelectedDataFrame()
-        self.pf.replot(df)
+        self.pf.replot()
         return
 
     def createPlotViewer(self, parent=None):
@@ -577,7 +702,7 @@ class DataFrameWidget(QWidget):
         else:
             colnames = df.columns
         print (idx,colnames)
-        self.table.storeCurrent()
+        self.table.storeCurrent(columns=list(colnames))
         for c in colnames:
             x = df[c]
             if fillempty == 1 or convtype is int:
@@ -593,6 +718,40 @@ class DataFrameWidget(QWidget):
         self.refresh()
         return
 
+    def optimizeMemory(self):
+        """Convert columns to smaller dtypes where the values are unchanged
+        and show the memory saved per column"""
+
+        df = self.table.model.df
+        new, report = util.getOptimizedColumns(df)
+        if len(new) == 0:
+            QMessageBox.information(self, 'Optimize Memory', 'No columns to convert.')
+            return
+        total = df.memory_usage(deep=True).sum()
+        self.table.storeCurrent(columns=list(new.keys()))
+        for c in new:
+            df[c] = new[c]
+        self.refresh()
+        s = report.to_string(index=False)
+        s += '\n\nsaved %s of %s MB' %(round(report.saving.sum()/1048576,2),
+                                         round(total/1048576,2))
+        dialogs.TextDialog(self, s, 'Optimize Memory', width=600, height=400)
+        return
+
+    def categorize(self):
+        """Store low cardinality text columns as categories, which saves
+        memory and lets filters and grouping use the integer codes"""
+
+        df = self.table.model.df
+        cols = util.getCategoryColumns(df)
+        if len(cols) == 0:
+            QMessageBox.information(self, 'Categorize', 'No columns to convert.')
+            return
+        self.table.storeCurrent(columns=cols)
+        util.categorize(df, cols)
+        self.refresh()
+        return
+
     def convertTypes(self):
 
         dlg = dialogs.ConvertTypesDialog(self, self.table.model.df)
@@ -846,7 +1005,7 @@ class DataFrameWidget(QWidget):
         l=len(df)
         data = pd.date_range(start=start, end=end, freq=freq, periods=periods)[:l]
         #print (data)
-        self.table.storeCurrent()
+        self.table.storeCurrent(columns=[column])
         self.table.model.df[column] = data
         self.refresh()
         return
@@ -872,7 +1031,7 @@ class DataFrameWidget(QWidget):
             data = [util.gen_upper(namelen) for i in range(len(df))]
         else:
             data = [util.gen_word(namelen) for i in range(len(df))]
-        self.table.storeCurrent()
+        self.table.storeCurrent(columns=[column])
         self.table.model.df[column] = data
         self.refresh()
 
@@ -929,7 +1088,7 @@ class DataFrameWidget(QWidget):
             step = (high-low)/len(df)
             data = pd.Series(np.arange(low,high,step))
 
-        self.table.storeCurrent()
+        self.table.storeCurrent(columns=[column])
         self.table.model.df[column] = data
         self.refresh()
         return
@@ -1042,7 +1201,7 @@ class DataFrameWidget(QWidget):
         elif func == 'slice':
             x = df[col].str.slice(start,end)
         elif func == 'replace':
-            x = df[col].replace(pat, repl, regex=True)
+            x = util.replaceValues(df[col], pat, repl)
         elif func == 'concat':
             #x = df[col].str.cat(df[cols[1]].astype(str), sep=sep)
             x = df[cols].astype(str).apply(lambda row: concatsep.join(row.values.astype(str)), axis=1)
@@ -1244,14 +1403,32 @@ class DataFrameWidget(QWidget):
         """Change table edit mode"""
 
         index = self.sender().data()
-        mode = MODES[index]
-        if mode == 'default':
+        self.mode = MODES[index]
+        self.updateEditTriggers()
+        return
+
+    def updateEditTriggers(self):
+        """Set how cells are edited for the mode, not at all if read only"""
+
+        mode = self.mode
+        if self.table.readonly == True:
+            self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        elif mode == 'default':
             self.table.setEditTriggers(QAbstractItemView.DoubleClicked)
         elif mode == 'spreadsheet':
             self.table.setEditTriggers(QAbstractItemView.AllEditTriggers)
         else:
             self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
-        self.mode = mode
+        return
+
+    def setReadOnly(self, readonly=True):
+        """Stop the table being changed, e.g. while an import replaces
+        the rows shown"""
+
+        self.table.readonly = readonly
+        self.updateEditTriggers()
+        if hasattr(self, 'toolbar'):
+            self.toolbar.setEnabled(not readonly)
         return
 
     def runScript(self):
@@ -1309,23 +1486,105 @@ class HeaderView(QHeaderView):
         self.setSectionsClickable(True)
         self.setSelectionBehavior(QTableView.SelectColumns)
         self.setStretchLastSection(False)
+        #cached section heights
+        self.heights = {}
+        self.maxheight = None
+        self.sectionResized.connect(self.sectionChanged)
         return
 
+    def setModel(self, model):
+        """Set model and connect the signals that invalidate cached heights"""
+
+        old = self.model()
+        if old is not None:
+            try:
+                old.modelReset.disconnect(self.clearHeights)
+                old.layoutChanged.disconnect(self.clearHeights)
+                old.columnsInserted.disconnect(self.clearHeights)
+                old.columnsRemoved.disconnect(self.clearHeights)
+                old.headerDataChanged.disconnect(self.headerChanged)
+            except (TypeError, RuntimeError):
+                #not connected or already deleted
+                pass
+        super(HeaderView, self).setModel(model)
+        self.heights = {}
+        self.maxheight = None
+        if model is None:
+            return
+        model.modelReset.connect(self.clearHeights)
+        model.layoutChanged.connect(self.clearHeights)
+        model.columnsInserted.connect(self.clearHeights)
+        model.columnsRemoved.connect(self.clearHeights)
+        model.headerDataChanged.connect(self.headerChanged)
+        return
+
+    def clearHeights(self, *args):
+        """Clear cached heights, they are remeasured when next needed"""
+
+        self.heights = {}
+        self.maxheight = None
+        return
+
+    def changeEvent(self, event):
+
+        if event.type() == QtCore.QEvent.FontChange:
+            self.clearHeights()
+        super(HeaderView, self).changeEvent(event)
+        return
+
+    def headerChanged(self, orientation, first, last):
+        """Remeasure renamed sections"""
+
+        if orientation != self.orientation():
+            return
+        for i in range(first, last+1):
+            self.sectionChanged(i)
+        return
+
+    def sectionChanged(self, logicalIndex, *args):
+        """Update cached height of one section after a resize or rename"""
+
+        if self.maxheight is None:
+            return
+        old = self.heights.get(logicalIndex)
+        new = self.measureHeight(logicalIndex)
+        self.heights[logicalIndex] = new
+        if new >= self.maxheight:
+            self.maxheight = new
+        elif old == self.maxheight:
+            self.maxheight = max(self.heights.values())
+        return
+
+    def measureHeight(self, logicalIndex):
+        """Height of the wrapped header text for one section"""
+
+        text = self.model().headerData(logicalIndex, self.orientation(), QtCore.Qt.DisplayRole)
+        metrics = QFontMetrics(self.fontMetrics())
+        size = self.sectionSize(logicalIndex)
+        rect = QtCore.QRect(0, 0, size, self.MAX_HEIGHT)
+        return metrics.boundingRect(rect, self.defaultAlignment(), text).height()
+
+    def headerHeight(self):
+        """Tallest section height, all sections are measured once and cached"""
+
+        if self.maxheight is None:
+            self.heights = {i: self.measureHeight(i) for i in range(self.count())}
+            if len(self.heights) > 0:
+                self.maxheight = max(self.heights.values())
+            else:
+                self.maxheight = 0
+        return self.maxheight
+
     def sectionSizeFromContents(self, logicalIndex):
         """Get section size from contents"""
 
+        if self.model() is None:
+            return super(HeaderView, self).sectionSizeFromContents(logicalIndex)
         text = self.model().headerData(logicalIndex, self.orientation(), QtCore.Qt.DisplayRole)
         alignment = self.defaultAlignment()
         metrics = QFontMetrics(self.fontMetrics())
         width = metrics.boundingRect(QtCore.QRect(), alignment, text).width()
-
-        heights = []
-        for i in range(self.count()):
-            text = self.model().headerData(i, self.orientation(),QtCore.Qt.DisplayRole)
-            size = self.sectionSize(i)
-            rect = QtCore.QRect(0, 0, size, self.MAX_HEIGHT)
-            heights.append(metrics.boundingRect(rect, alignment, text).height())
-        height = sorted(heights)[-1] + 5
+        height = self.headerHeight() + 5
         return QtCore.QSize(width, height)
 
 class DataFrameTable(QTableView):
@@ -1363,6 +1622,7 @@ class DataFrameTable(QTableView):
         hh.sectionPressed.connect(self.columnClicked)
         #hh.sectionPressed.disconnect()
         hh.setSectionsMovable(True)
+        hh.sectionMoved.connect(self.columnMoved)
         hh.setSelectionBehavior(QTableView.SelectColumns)
         hh.setSelectionMode(QAbstractItemView.ExtendedSelection)
         hh.setDefaultAlignment(QtCore.Qt.AlignLeft|QtCore.Qt.Alignment(QtCore.Qt.TextWordWrap))
@@ -1387,12 +1647,19 @@ class DataFrameTable(QTableView):
         self.setModel(tm)
         tm.bg = bg
         self.model = tm
+        self.jobs = JobRunner(self)
+        #counting matches does not cancel a sort or filter
+        self.findjobs = JobRunner(self)
+        #no edits or menus, see DataFrameWidget.setReadOnly
+        self.readonly = False
         self.filtered = False
+        #unfiltered frame and its row order while a filter is shown
+        self.dataframe = None
+        self.dataorder = None
         self.setWordWrap(True)
 
-        df = self.model.df
         #disable column dragging for large tables
-        if len(df) > 1e5:
+        if self.model.rowCount() > 1e5:
             #print (len(df))
             #hh.setHighlightSections(False)
             hh.setSectionsClickable(False)
@@ -1402,12 +1669,7 @@ class DataFrameTable(QTableView):
         styledItemDelegate.setItemEditorFactory(ItemEditorFactory())
         self.setItemDelegate(styledItemDelegate)
 
-        #temp file for undo
-        file, self.undo_file = tempfile.mkstemp(suffix='.pkl')
-        try:
-            os.remove(self.undo_file)
-        except:
-            pass
+        self.undostack = UndoStack()
         return
 
     def updateFont(self):
@@ -1420,11 +1682,13 @@ class DataFrameTable(QTableView):
         self.verticalHeader().setFont(font)
         return
 
-    def refresh(self):
-        """Refresh table if dataframe is changed"""
+    def refresh(self, clear=True):
+        """Refresh table if dataframe is changed. Use clear=False if only
+        the rows shown have changed, so cached values are kept."""
 
-        self.updateFont()
         #self.horizontalHeader().setDefaultSectionSize(COLUMNWIDTH)
+        if clear == True:
+            self.model.clearCache()
         self.model.beginResetModel()
         index = self.model.index
         try:
@@ -1432,47 +1696,106 @@ class DataFrameTable(QTableView):
         except:
             self.model.dataChanged.emit(index(0,0),index(0,0))
         self.model.endResetModel()
+        #after the reset, setting the font lays out the headers again
+        self.updateFont()
         if hasattr(self.parent,'statusbar'):
             self.parent.updateStatusBar()
         return
 
+    def setDataModel(self, model):
+        """Replace the table model, e.g. with an ArrowTableModel"""
+
+        model.bg = self.model.bg
+        self.setModel(model)
+        self.model = model
+        self.dataframe = None
+        self.dataorder = None
+        self.filtered = False
+        if model.rowCount() > 1e5:
+            self.horizontalHeader().setSectionsClickable(False)
+        return
+
     def showAll(self):
         """Re-show unfiltered"""
 
-        if hasattr(self, 'dataframe') and self.dataframe is not None:
+        if self.dataframe is not None:
             self.model.df = self.dataframe
+            self.model.rows = self.dataorder
+        elif self.filtered == True:
+            #mapped tables are filtered by setting the rows only
+            self.model.rows = self.dataorder
+        self.dataframe = None
+        self.dataorder = None
         self.filtered = False
-        self.refresh()
+        self.refresh(clear=False)
         return
 
-    def storeCurrent(self):
-        """Store current version of the table before a major change is made"""
+    def getSnapshot(self):
+        """
+        The unfiltered frame, its view rows and the displayed column order,
+        for saving in another thread without calling showAll. See
+        DataFrameModel.snapshot, release the model once done.
+        """
+
+        model = self.model
+        df, rows = model.snapshot()
+        cols = self.getColumnOrder()
+        if self.filtered == True:
+            rows = self.dataorder
+            if self.dataframe is not None and self.dataframe is not model.base:
+                #the shown frame is a copy with some columns
+                df = self.dataframe.copy(deep=False)
+                cols = list(df.columns)
+        if len(set(df.columns)) != len(df.columns):
+            cols = None
+        return df, rows, cols
+
+    def storeCurrent(self, columns=None):
+        """Store current version of the table before a change is made.
+        Args:
+            columns: names of the columns the change will modify or add,
+            only these are copied. If None the whole frame is kept.
+        """
 
-        self.prevdf = self.model.df#.copy()
-        self.prevdf.to_pickle(self.undo_file)
-        #self.parent.updatesignal.speak.emit()
+        self.undostack.push(self.model.df, columns)
+        self.model.detach(columns)
+        #the change may edit object columns in place
+        self.model.memory.clear()
+        self.model.setModified()
         return
 
     def undo(self):
         """Undo last change to table"""
 
-        if os.path.exists(self.undo_file):
-            print ('undo-ing')
-            self.model.df = pd.read_pickle(self.undo_file)
+        df = self.undostack.undo(self.model.df)
+        if df is not None:
+            self.model.df = df
+            self.refresh()
+        return
+
+    def redo(self):
+        """Redo the last undone change"""
+
+        df = self.undostack.redo(self.model.df)
+        if df is not None:
+            self.model.df = df
             self.refresh()
-            os.remove(self.undo_file)
         return
 
     def getMemory(self):
-        """Get memory info as string"""
+        """Get memory info as string, marked \u2248 if estimated"""
 
-        m = self.model.df.memory_usage(deep=True).sum()
+        m, exact = self.model.getMemory()
         if m>1e5:
             m = round(m/1048576,2)
             units='MB'
         else:
             units='Bytes'
         s = "%s %s" %(m,units)
+        if exact == False:
+            s = '\u2248' + s
+        if self.model.mapped == True:
+            s += ' mapped'
         return s
 
     def memory_usage(self):
@@ -1496,54 +1819,98 @@ class DataFrameTable(QTableView):
         """Get column names from header in their displayed order"""
 
         hh = self.horizontalHeader()
-        df = self.model.df
+        columns = self.model.columns
         logidx = [hh.logicalIndex(i) for i in range(0,self.model.columnCount())]
-        cols = [df.columns[i] for i in logidx]
+        cols = [columns[i] for i in logidx]
         return cols
 
+    def columnMoved(self, logical, oldidx, newidx):
+        """Column dragged to a new position, the order is applied to the
+        data when saved so this counts as a change"""
+
+        self.model.setModified()
+        return
+
     def checkColumnsUnique(self):
         """Check if columns are all unique"""
 
-        df = self.model.df
-        return len(df.columns) == len(set(df.columns))
+        columns = self.model.columns
+        return len(columns) == len(set(columns))
+
+    def getSelectionRanges(self):
+        """Selected ranges as a list of (top, bottom, left, right) tuples"""
+
+        sel = self.selectionModel().selection()
+        return [(r.top(), r.bottom(), r.left(), r.right()) for r in sel]
+
+    def getSelectedIndexes(self, ranges=None):
+        """
+        Selected rows and columns from the selection ranges, without visiting
+        each selected cell. Each is returned as a slice if the selection spans
+        one contiguous block, otherwise as an array of unique positions in
+        selection order. ranges can be given instead of the current selection.
+        """
+
+        if ranges is None:
+            ranges = self.getSelectionRanges()
+        if len(ranges) == 0:
+            empty = np.array([], dtype=np.int64)
+            return empty, empty
+        def unique(spans, n):
+            spans = list(dict.fromkeys(spans))
+            if len(spans) == 1:
+                start, end = spans[0]
+                if start == 0 and end == n:
+                    return slice(None)
+                return slice(start, end)
+            idx = np.concatenate([np.arange(a, b) for a, b in spans])
+            return pd.unique(idx)
+        model = self.model
+        rows = unique([(r[0], r[1]+1) for r in ranges], model.rowCount())
+        cols = unique([(r[2], r[3]+1) for r in ranges], model.columnCount())
+        return rows, cols
 
     def getSelectedRows(self):
 
-        sm = self.selectionModel()
-        rows = [(i.row()) for i in sm.selectedIndexes()]
-        rows = list(dict.fromkeys(rows).keys())
-        return rows
+        rows, cols = self.getSelectedIndexes()
+        if isinstance(rows, slice):
+            rows = np.arange(self.model.rowCount())[rows]
+        return rows.tolist()
 
     def getSelectedColumns(self):
         """Get selected column indexes"""
 
-        sm = self.selectionModel()
-        cols = [(i.column()) for i in sm.selectedIndexes()]
-        cols = list(dict.fromkeys(cols).keys())
-        return cols
+        rows, cols = self.getSelectedIndexes()
+        if isinstance(cols, slice):
+            cols = np.arange(self.model.columnCount())[cols]
+        return cols.tolist()
 
-    def getSelectedDataFrame(self):
-        """Get selection as a dataframe"""
+    def getSelectedDataFrame(self, ranges=None):
+        """Get selection, or the given selection ranges, as a dataframe.
+        Whole column selections are not copied, so the result should not be
+        changed in place."""
 
-        df = self.model.df
-        sm = self.selectionModel()
-        rows = [(i.row()) for i in sm.selectedIndexes()]
-        cols = [(i.column()) for i in sm.selectedIndexes()]
-        #get unique rows/cols keeping order
-        rows = list(dict.fromkeys(rows).keys())
-        cols = list(dict.fromkeys(cols).keys())
-        data = df.iloc[rows,cols]
+        rows, cols = self.getSelectedIndexes(ranges)
+        data = self.model.take(rows, cols)
         #try to get numeric data for plotting
-        colnames = data.columns
-        #for c in colnames:
-        #try to get numeric values for plotting
+        converted = {}
         for c in range(len(data.columns)):
-            #print (data.iloc[:,c])
-            x = pd.to_numeric(data.iloc[:,c], errors='coerce').astype(float)
+            col = data.iloc[:,c]
+            if is_numeric_dtype(col):
+                continue
+            x = pd.to_numeric(col, errors='coerce').astype(float)
             if x.isnull().all():
                 continue
-            #data[c] = x
-            data.iloc[:,c] = x
+            converted[c] = x
+        if len(converted) > 0:
+            #replace converted columns on a shallow copy, by position in case
+            #of duplicate names
+            names = data.columns
+            data = data.copy(deep=False)
+            data.columns = range(len(names))
+            for c in converted:
+                data[c] = converted[c]
+            data.columns = names
         return data
 
     def setSelected(self, rows, cols):
@@ -1562,6 +1929,17 @@ class DataFrameTable(QTableView):
         self.selectionModel().select(selection, mode)
         return
 
+    def setSelectionRanges(self, ranges):
+        """Select a list of (top, bottom, left, right) ranges, see
+        getSelectionRanges"""
+
+        index = self.model.index
+        selection = QtCore.QItemSelection()
+        for top, bottom, left, right in ranges:
+            selection.select(index(top, left), index(bottom, right))
+        self.selectionModel().select(selection, QtCore.QItemSelectionModel.Select)
+        return
+
     def getScrollPosition(self):
         """Get current row/col position"""
 
@@ -1583,25 +1961,32 @@ class DataFrameTable(QTableView):
 
     def columnClicked(self, col):
 
-        hheader = self.horizontalHeader()
-        df = self.model.df
-        #print (df[:2])
-        #self.model.df = df.sort_values(df.columns[col])
+        #the frame is not used so a sorted view is not reordered
         return
 
     def selectColumn(self, event):
-        print (self.model.df)
+        return
 
     def sort(self, idx, ascending=True):
-        """Sort by selected columns"""
+        """Sort by selected columns, the first selected is the primary key"""
 
-        df = self.model.df
         sel = self.getSelectedColumns()
         if len(sel)>1:
-            for i in sel:
-                self.model.sort(i, ascending)
+            cols = sel
+        else:
+            cols = [idx]
+        model = self.model
+        if model.mapped == True:
+            df, rows = None, model.rows
+            release = None
         else:
-            self.model.sort(idx, ascending)
+            #edits made while sorting are not seen by the job
+            df, rows = model.snapshot()
+            release = model.release
+        def func(progress_callback):
+            return model.getSortOrder(cols, ascending, rows=rows,
+                                      callback=progress_callback, df=df)
+        self.jobs.run(func, model.setRows, label='Sorting', release=release)
         return
 
     def deleteCells(self, rows, cols, answer=None):
@@ -1612,9 +1997,13 @@ class DataFrameTable(QTableView):
                              'Are you sure?', QMessageBox.Yes, QMessageBox.No)
         if not answer:
             return
-        self.storeCurrent()
+        df = self.model.df
+        self.storeCurrent(columns=list(df.columns[cols]))
         #print (rows, cols)
-        self.model.df.iloc[rows,cols] = np.nan
+        df.iloc[rows,cols] = np.nan
+        self.model.clearCache()
+        self.model.memory.clear()
+        self.viewport().update()
         return
 
     def setRowColor(self, rowIndex, color):
@@ -1624,6 +2013,8 @@ class DataFrameTable(QTableView):
     def rowHeaderMenu(self, pos):
         """Row header popup menu"""
 
+        if self.readonly == True:
+            return
         vheader = self.verticalHeader()
         idx = vheader.logicalIndexAt(pos)
         menu = QMenu(self)
@@ -1634,24 +2025,30 @@ class DataFrameTable(QTableView):
         setTypeAction = menu.addAction("Set Type")
         deleteAction = menu.addAction("Delete Rows")
         action = menu.exec_(self.mapToGlobal(pos))
-        if action == resetIndexAction:
-            self.resetIndex()
-        elif action == sortIndexAction:
-            self.sortIndex()
-        elif action == sortIndexDescAction:
-            self.sortIndex(ascending=False)
-        elif action == setTypeAction:
-            self.setIndexType()
-        elif action == deleteAction:
-            self.deleteRows()
+        try:
+            if action == resetIndexAction:
+                self.resetIndex()
+            elif action == sortIndexAction:
+                self.sortIndex()
+            elif action == sortIndexDescAction:
+                self.sortIndex(ascending=False)
+            elif action == setTypeAction:
+                self.setIndexType()
+            elif action == deleteAction:
+                self.deleteRows()
+        except MemoryError as e:
+            #a memory mapped table too large to read
+            dialogs.showMessage(self, str(e))
         return
 
     def columnHeaderMenu(self, pos):
         """Column header right click popup menu"""
 
+        if self.readonly == True:
+            return
         hheader = self.horizontalHeader()
         idx = hheader.logicalIndexAt(pos)
-        column = self.model.df.columns[idx]
+        column = self.model.columns[idx]
         #model = self.model
         menu = QMenu(self)
 
@@ -1682,40 +2079,45 @@ class DataFrameTable(QTableView):
 
         #sortAction = menu.addAction("Sort By")
         action = menu.exec_(self.mapToGlobal(pos))
-        if action == sortAction:
-            self.sort(idx)
-        elif action == sortDescAction:
-            self.sort(idx, ascending=False)
-        elif action == deleteColumnAction:
-            self.deleteColumn(column)
-        elif action == renameColumnAction:
-            self.renameColumn(column)
-        elif action == addColumnAction:
-            self.addColumn()
-        elif action == setTypeAction:
-            self.setColumnType(column)
-        elif action == convertNumericAction:
-            self.parent.convertNumeric()
-        elif action == setIndexAction:
-            self.setIndex(column)
-        elif action == datetimeAction:
-            self.parent.convertDates(column)
-        elif action == filldataAction:
-            self.parent.fillData(column)
-        elif action == fillstringsAction:
-            self.parent.fillStrings(column)
-        elif action == filldatesAction:
-            self.parent.fillDates(column)
-        elif action == applyFunctionAction:
-            self.parent.applyColumnFunction(column)
-        elif action == transformResampleAction:
-            self.parent.applyTransformFunction(column)
-        elif action == stringOpAction:
-            self.parent.applyStringMethod(column)
+        try:
+            if action == sortAction:
+                self.sort(idx)
+            elif action == sortDescAction:
+                self.sort(idx, ascending=False)
+            elif action == deleteColumnAction:
+                self.deleteColumn(column)
+            elif action == renameColumnAction:
+                self.renameColumn(column)
+            elif action == addColumnAction:
+                self.addColumn()
+            elif action == setTypeAction:
+                self.setColumnType(column)
+            elif action == convertNumericAction:
+                self.parent.convertNumeric()
+            elif action == setIndexAction:
+                self.setIndex(column)
+            elif action == datetimeAction:
+                self.parent.convertDates(column)
+            elif action == filldataAction:
+                self.parent.fillData(column)
+            elif action == fillstringsAction:
+                self.parent.fillStrings(column)
+            elif action == filldatesAction:
+                self.parent.fillDates(column)
+            elif action == applyFunctionAction:
+                self.parent.applyColumnFunction(column)
+            elif action == transformResampleAction:
+                self.parent.applyTransformFunction(column)
+            elif action == stringOpAction:
+                self.parent.applyStringMethod(column)
+        except MemoryError as e:
+            dialogs.showMessage(self, str(e))
         return
 
     def keyPressEvent(self, event):
 
+        if self.readonly == True:
+            return
         rows = self.getSelectedRows()
         cols = self.getSelectedColumns()
         if event.key() == QtCore.Qt.Key_Delete:
@@ -1724,6 +2126,8 @@ class DataFrameTable(QTableView):
     def contextMenuEvent(self, event):
         """Reimplemented to create context menus for cells and empty space."""
 
+        if self.readonly == True:
+            return
         # Determine the logical indices of the cell where click occured
         hheader, vheader = self.horizontalHeader(), self.verticalHeader()
         position = event.globalPos()
@@ -1731,9 +2135,8 @@ class DataFrameTable(QTableView):
         column = hheader.logicalIndexAt(hheader.mapFromGlobal(position))
 
         # Map the logical row index to a real index for the source model
-        df = self.model.df
-        if len(df) > 1:
-            row = df.iloc[row]
+        if self.model.rowCount() > 1:
+            row = self.model.take([row]).iloc[0]
         else:
             row = None
         # Show a context menu for empty space at bottom of table...
@@ -1764,26 +2167,30 @@ class DataFrameTable(QTableView):
         memAction = menu.addAction("Memory Usage")
         action = menu.exec_(self.mapToGlobal(event.pos()))
 
-        if action == copyAction:
-            self.parent.copy()
-        elif action == importAction:
-            self.parent.importFile()
-        elif action == exportAction:
-            self.parent.exportTable()
-        elif action == plotAction:
-            self.parent.plot()
-        elif action == viewAction:
-            self.viewRow()
-        elif action == deleteRowsAction:
-            self.deleteRows()
-        elif action == addRowsAction:
-            self.addRows()
-        elif action == memAction:
-            self.memory_usage()
+        try:
+            if action == copyAction:
+                self.parent.copy()
+            elif action == importAction:
+                self.parent.importFile()
+            elif action == exportAction:
+                self.parent.exportTable()
+            elif action == plotAction:
+                self.parent.plot()
+            elif action == viewAction:
+                self.viewRow()
+            elif action == deleteRowsAction:
+                self.deleteRows()
+            elif action == addRowsAction:
+                self.addRows()
+            elif action == memAction:
+                self.memory_usage()
+        except MemoryError as e:
+            dialogs.showMessage(self, str(e))
 
     def resetIndex(self):
 
         self.model.df.reset_index(inplace=True)
+        self.model.setModified()
         self.refresh()
         return
 
@@ -1846,7 +2253,7 @@ class DataFrameTable(QTableView):
 
         idx = self.getSelectedColumns()
         if len(idx)>0:
-            cols = self.model.df.columns[idx]
+            cols = self.model.columns[idx]
         else:
             cols = [column]
         reply = QMessageBox.question(self, 'Delete Column(s)?',
@@ -1915,8 +2322,18 @@ class DataFrameTable(QTableView):
         name, ok = QInputDialog().getText(self, "Enter New Column Name",
                                              "Name:", QLineEdit.Normal, text=column)
         if ok and name:
-            self.model.df.rename(columns={column:name},inplace=True)
-            self.refresh()
+            model = self.model
+            df = model.base
+            df.rename(columns={column:name},inplace=True)
+            #filter masks are kept by column name
+            model.clearCache()
+            model.setModified()
+            if getattr(self.parent, 'filterdock', None) is not None:
+                self.parent.filterdialog.update()
+            #only the renamed headers need to be redrawn
+            idx = np.flatnonzero(df.columns == name)
+            if len(idx) > 0:
+                model.headerDataChanged.emit(QtCore.Qt.Horizontal, int(idx[0]), int(idx[-1]))
         return
 
     def setColumnType(self, column=None):
@@ -1924,7 +2341,7 @@ class DataFrameTable(QTableView):
 
         idx = self.getSelectedColumns()
         if len(idx)>0:
-            cols = self.model.df.columns[idx]
+            cols = self.model.columns[idx]
         else:
             cols = [column]
         types = ['float','int','object','datetime64[ns]']
@@ -1932,7 +2349,7 @@ class DataFrameTable(QTableView):
                                              "Type:", types, 0, False)
         if not ok:
             return
-        self.storeCurrent()
+        self.storeCurrent(columns=list(cols))
         df = self.model.df
         for c in cols:
             df[c] = df[c].astype(newtype)
@@ -1964,13 +2381,13 @@ class DataFrameTable(QTableView):
     def changeColumnWidths(self, factor=1.1):
         """Set column widths"""
 
-        for col in range(len(self.model.df.columns)):
+        for col in range(len(self.model.columns)):
             wi = self.columnWidth(col)
             self.setColumnWidth(col,int(wi*factor))
 
     def setColumnWidths(self, widths):
 
-        for col in range(len(self.model.df.columns)):
+        for col in range(len(self.model.columns)):
             try:
                 self.setColumnWidth(col,widths[col])
             except:
@@ -1979,33 +2396,890 @@ class DataFrameTable(QTableView):
     def getColumnWidths(self):
 
         widths=[]
-        for col in range(len(self.model.df.columns)):
+        for col in range(len(self.model.columns)):
             widths.append(self.columnWidth(col))
         return widths
 
+def formatValue(value, floatfmt):
+    """Format a single value for display"""
+
+    if type(value) is str:
+        return value
+    elif value is None:
+        return ''
+    elif type(value) in [float,np.float64]:
+        if np.isnan(value):
+            return ''
+        return floatfmt.format(value)
+    return str(value)
+
+def formatValues(s):
+    """Format a series of values for display in one pass.
+    Returns an object array of strings."""
+
+    dtype = s.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        cats = formatValues(pd.Series(s.cat.categories))
+        cats = np.append(cats, '')
+        return cats[s.cat.codes.values]
+    elif is_datetime(dtype):
+        try:
+            out = s.dt.strftime(TIMEFORMAT)
+        except:
+            out = s.astype(str)
+        return out.fillna('').values.astype(object)
+    elif is_float_dtype(dtype):
+        vals = s.to_numpy(dtype=float, na_value=np.nan)
+        out = np.char.mod('%.'+str(PRECISION)+'f', vals).astype(object)
+        out[np.isnan(vals)] = ''
+        return out
+    elif is_object_dtype(dtype):
+        floatfmt = '{0:.%sf}' %PRECISION
+        out = np.empty(len(s), dtype=object)
+        out[:] = [formatValue(v, floatfmt) for v in s.values]
+        return out
+    return s.astype(str).values.astype(object)
+
+class TableJob(dialogs.Worker):
+    """Worker for a table operation. The function is passed a progress
+    callback taking (done, total) and an optional status message, that
+    also stops the job once cancelled or the model has changed."""
+
+    def __init__(self, fn, *args, **kwargs):
+        super(TableJob, self).__init__(fn, *args, **kwargs)
+        self.kwargs['progress_callback'] = self.setProgress
+        self.model = None
+        self.version = None
+        self.on_result = None
+        self.on_message = None
+        self.release = None
+
+    def isStale(self):
+        """Check if the model was changed since the job started"""
+
+        return self.model is not None and self.model.version != self.version
+
+    def setProgress(self, i, n, msg=None):
+        if self.cancelled or self.isStale():
+            raise dialogs.Cancelled()
+        self.signals.progress.emit(str(int(100*i/max(n,1))))
+        if msg is not None:
+            self.signals.message.emit(msg)
+        return
+
+class JobRunner(QtCore.QObject):
+    """
+    Runs slow table operations such as sort, filter and find off the GUI
+    thread. The job function should only read the data it was given when
+    started, e.g. a model snapshot, or stop at the next progress call once
+    the model has changed. Its result is passed to on_result on the GUI
+    thread, unless the job was cancelled or the model changed while it ran.
+    One job runs at a time per runner, starting another cancels the previous
+    one. Small tables are done directly.
+    """
+    def __init__(self, table, threadpool=None):
+        super(JobRunner, self).__init__()
+        self.table = table
+        if threadpool is None:
+            threadpool = QtCore.QThreadPool.globalInstance()
+        self.threadpool = threadpool
+        self.job = None
+        #jobs still running, including cancelled ones
+        self.running = {}
+        self.progressdlg = None
+        return
+
+    def run(self, func, on_result, label='Working', threaded=None, showprogress=True,
+            on_message=None, release=None):
+        """Run func(progress_callback) and call on_result with what it returns.
+        on_message is called with status messages from the job. release is
+        called once func has returned, also if the job was cancelled, e.g.
+        to release a model snapshot read by the job."""
+
+        self.cancel()
+        model = self.table.model
+        job = TableJob(func)
+        if threaded is None:
+            threaded = model.rowCount() >= THREADED_ROWS
+        if threaded == False:
+            try:
+                result = job.fn(*job.args, **job.kwargs)
+            finally:
+                if release is not None:
+                    release()
+            on_result(result)
+            return
+        job.model = model
+        job.version = model.version
+        job.on_result = on_result
+        job.on_message = on_message
+        job.release = release
+        self.running[job.signals] = job
+        job.signals.result.connect(self.jobResult)
+        job.signals.progress.connect(self.jobProgress)
+        job.signals.message.connect(self.jobMessage)
+        job.signals.error.connect(self.jobError)
+        job.signals.finished.connect(self.jobFinished)
+        self.job = job
+        if showprogress == True:
+            self.progressdlg = dlg = dialogs.ProgressWidget(self.table, label=label,
+                                                            cancel=self.cancel)
+            dlg.progressbar.setRange(0,100)
+            dlg.show()
+        self.threadpool.start(job)
+        return
+
+    def isRunning(self):
+        return self.job is not None
+
+    def cancel(self):
+        """Cancel the current job"""
+
+        job = self.job
+        if job is None:
+            return
+        job.cancel()
+        self.job = None
+        self.closeProgress()
+        return
+
+    def closeProgress(self):
+
+        if self.progressdlg is not None:
+            dlg = self.progressdlg
+            self.progressdlg = None
+            dlg.close()
+        return
+
+    @Slot(object)
+    def jobResult(self, result):
+        """Apply the result if it is still current"""
+
+        job = self.job
+        if job is None or self.sender() is not job.signals:
+            return
+        if job.version != self.table.model.version:
+            #table was changed while the job was running
+            return
+        job.on_result(result)
+        return
+
+    @Slot(str)
+    def jobProgress(self, value):
+
+        if self.job is None or self.sender() is not self.job.signals:
+            return
+        if self.progressdlg is not None:
+            self.progressdlg.progressbar.setValue(int(value))
+        return
+
+    @Slot(str)
+    def jobMessage(self, msg):
+
+        if self.job is None or self.sender() is not self.job.signals:
+            return
+        if self.job.on_message is not None:
+            self.job.on_message(msg)
+        return
+
+    @Slot(tuple)
+    def jobError(self, err):
+
+        if self.job is None or self.sender() is not self.job.signals:
+            return
+        if self.job.isStale():
+            #the data was changed while it was read
+            return
+        dialogs.showMessage(self.table, str(err[1]))
+        return
+
+    @Slot()
+    def jobFinished(self):
+
+        job = self.running.pop(self.sender(), None)
+        if job is not None and job.release is not None:
+            job.release()
+        if self.job is None or self.sender() is not self.job.signals:
+            return
+        self.job = None
+        self.closeProgress()
+        return
+
+class CSVImporter(QtCore.QObject):
+    """
+    Reads a csv file in chunks on a worker thread. The first chunk is shown
+    as soon as it is read and the table is updated as more rows arrive, each
+    time the number of rows has doubled, so the chunks are joined only a few
+    times. The table is read only until the import is finished, since the
+    rows shown are replaced. Progress is measured in bytes read. Cancelling
+    stops the read and keeps the rows read so far.
+    """
+    chunkRead = Signal(object, int)
+
+    def __init__(self, widget, filename, chunksize=100000, threadpool=None, **kwargs):
+        super(CSVImporter, self).__init__()
+        self.widget = widget
+        self.filename = filename
+        self.chunksize = chunksize
+        if kwargs.get('engine') == 'pyarrow':
+            #pyarrow engine does not read in chunks
+            kwargs['engine'] = 'c'
+        self.kwargs = kwargs
+        if threadpool is None:
+            threadpool = QtCore.QThreadPool.globalInstance()
+        self.threadpool = threadpool
+        self.size = max(os.path.getsize(filename), 1)
+        self.chunks = []
+        self.rows = 0
+        self.shown = 0
+        self.worker = None
+        self.progressdlg = None
+        self.chunkRead.connect(self.addChunk)
+        return
+
+    def read(self, progress_callback):
+        """Read chunks and pass them to the GUI thread. Text columns of the
+        first chunk are read as text in the rest of the file, so a column
+        is not text in some chunks and numbers in others."""
+
+        worker = self.worker
+        kwargs = self.kwargs
+        with open(self.filename, 'rb') as f:
+            try:
+                chunk = pd.read_csv(f, nrows=self.chunksize, **kwargs)
+            except Exception:
+                #options may not suit the file, use the defaults
+                f.seek(0)
+                kwargs = {}
+                chunk = pd.read_csv(f, nrows=self.chunksize)
+            self.chunkRead.emit(chunk, f.tell())
+            if len(chunk) < self.chunksize:
+                return
+            dtype = {c: object for c in chunk.columns if chunk[c].dtype == object}
+            if isinstance(kwargs.get('dtype'), dict):
+                dtype.update(kwargs['dtype'])
+            elif kwargs.get('dtype') is not None:
+                dtype = kwargs['dtype']
+            #read from the start again, the first chunk is parsed twice
+            f.seek(0)
+            reader = pd.read_csv(f, chunksize=self.chunksize, **dict(kwargs, dtype=dtype))
+            next(reader)
+            while True:
+                if worker.cancelled:
+                    raise dialogs.Cancelled()
+                try:
+                    chunk = next(reader)
+                except StopIteration:
+                    break
+                self.chunkRead.emit(chunk, f.tell())
+        return
+
+    def start(self):
+        """Start reading"""
+
+        self.worker = worker = dialogs.Worker(self.read)
+        self.widget.setReadOnly(True)
+        worker.signals.error.connect(self.readError)
+        worker.signals.finished.connect(self.finished)
+        self.progressdlg = dlg = dialogs.ProgressWidget(self.widget, label='Importing',
+                                                        cancel=self.cancel)
+        dlg.progressbar.setRange(0,100)
+        dlg.show()
+        self.threadpool.start(worker)
+        return
+
+    def isRunning(self):
+        return self.worker is not None
+
+    def cancel(self):
+
+        if self.worker is not None:
+            self.worker.cancel()
+        return
+
+    @Slot(object, int)
+    def addChunk(self, chunk, pos):
+        """Keep a chunk, showing the rows so far if they have doubled"""
+
+        if self.worker is None:
+            return
+        self.chunks.append(chunk)
+        self.rows += len(chunk)
+        if self.progressdlg is not None:
+            self.progressdlg.progressbar.setValue(int(100*pos/self.size))
+            self.progressdlg.label.setText('Importing: %s rows' %self.rows)
+        if self.rows >= 2*self.shown:
+            self.show()
+        return
+
+    def show(self):
+
+        if len(self.chunks) > 1:
+            #chunks are numbered on from the previous one or keep index_col
+            self.chunks = [pd.concat(self.chunks)]
+        if len(self.chunks) == 0:
+            return
+        self.shown = self.rows
+        table = self.widget.table
+        table.model.df = self.chunks[0]
+        table.refresh()
+        return
+
+    @Slot(tuple)
+    def readError(self, err):
+
+        dialogs.showMessage(self.widget, str(err[1]))
+        return
+
+    @Slot()
+    def finished(self):
+        """Show all the rows read"""
+
+        self.worker = None
+        if self.progressdlg is not None:
+            self.progressdlg.close()
+            self.progressdlg = None
+        if self.widget.importer in (None, self):
+            #not replaced by another import
+            self.widget.setReadOnly(False)
+        if len(self.chunks) > 0:
+            df = pd.concat(self.chunks)
+            self.chunks = []
+            self.widget.setImported(df)
+        return
+
+class UndoStack(QtCore.QObject):
+    """
+    Multi-level undo and redo for a table. An entry holds copies of only the
+    columns an operation changes, or for structural changes a copy of
+    the whole frame. Once the entries held in memory go over the memory budget
+    (UNDOMEMORY, in MB) the oldest are pickled to temp files in the background.
+    """
+    def __init__(self, levels=20, budget=None, threadpool=None):
+        super(UndoStack, self).__init__()
+        self.levels = levels
+        self.budget = budget
+        if threadpool is None:
+            threadpool = QtCore.QThreadPool.globalInstance()
+        self.threadpool = threadpool
+        self.undostack = []
+        self.redostack = []
+        return
+
+    def snapshot(self, df, columns=None):
+        """Make an undo entry from the current frame"""
+
+        if columns is not None:
+            columns = list(dict.fromkeys(columns))
+            dups = df.columns[df.columns.duplicated()]
+            if len(set(columns) & set(dups)) > 0:
+                columns = None
+        if columns is None:
+            #a deep copy so later changes made in place are not shared
+            data = df.copy()
+            size = data.memory_usage(index=True, deep=False).sum()
+        else:
+            data = {}
+            size = 0
+            for c in columns:
+                if c in df.columns:
+                    data[c] = df[c].copy()
+                    size += data[c].memory_usage(index=False, deep=False)
+                else:
+                    #column added by the operation, removed on undo
+                    data[c] = None
+        return {'columns': columns, 'order': list(df.columns), 'data': data,
+                'size': int(size), 'file': None}
+
+    def push(self, df, columns=None):
+        """Store the current state before an operation. columns are the names
+        of the columns it will change or add, otherwise the whole frame is kept."""
+
+        self.removeEntries(self.redostack)
+        self.redostack = []
+        self.undostack.append(self.snapshot(df, columns))
+        if len(self.undostack) > self.levels:
+            self.removeEntries(self.undostack[:-self.levels])
+            self.undostack = self.undostack[-self.levels:]
+        self.spill()
+        return
+
+    def canUndo(self):
+        return len(self.undostack) > 0
+
+    def canRedo(self):
+        return len(self.redostack) > 0
+
+    def undo(self, df):
+        """Returns the previous frame or None if there is nothing to undo"""
+
+        if len(self.undostack) == 0:
+            return
+        entry = self.undostack.pop()
+        self.redostack.append(self.snapshot(df, entry['columns']))
+        return self.restore(df, entry)
+
+    def redo(self, df):
+        """Returns the frame before the last undo or None"""
+
+        if len(self.redostack) == 0:
+            return
+        entry = self.redostack.pop()
+        self.undostack.append(self.snapshot(df, entry['columns']))
+        return self.restore(df, entry)
+
+    def restore(self, df, entry):
+        """Apply an entry to the frame"""
+
+        data = self.loadEntry(entry)
+        self.removeEntries([entry])
+        if entry['columns'] is None:
+            return data
+        for c in entry['columns']:
+            old = data[c]
+            if old is None:
+                if c in df.columns:
+                    df.drop(columns=c, inplace=True)
+            elif len(old) == len(df) and old.index.equals(df.index):
+                df[c] = old.values
+            elif old.index.is_unique:
+                #rows were reordered since
+                df[c] = old.reindex(df.index).values
+            else:
+                df[c] = old.values
+        if set(entry['order']) == set(df.columns):
+            df = df[entry['order']]
+        return df
+
+    def loadEntry(self, entry):
+
+        if entry['data'] is None:
+            return pd.read_pickle(entry['file'])
+        return entry['data']
+
+    def memory(self):
+        """Bytes held in memory by undo and redo entries"""
+
+        return sum(e['size'] for e in self.undostack+self.redostack
+                   if e['data'] is not None)
+
+    def spill(self):
+        """Write the oldest in-memory entries to disk until under the budget"""
+
+        budget = self.budget
+        if budget is None:
+            budget = UNDOMEMORY * 1048576
+        used = sum(e['size'] for e in self.undostack+self.redostack
+                   if e['data'] is not None and e['file'] is None)
+        for entry in self.undostack:
+            if used <= budget:
+                break
+            if entry['data'] is None or entry['file'] is not None:
+                continue
+            fd, entry['file'] = tempfile.mkstemp(suffix='.pkl')
+            os.close(fd)
+            used -= entry['size']
+            def func(entry, progress_callback):
+                pd.to_pickle(entry['data'], entry['file'])
+                return entry
+            worker = dialogs.Worker(func, entry)
+            worker.signals.result.connect(self.spilled)
+            self.threadpool.start(worker)
+        return
+
+    @Slot(object)
+    def spilled(self, entry):
+        """Release the memory of an entry once it is on disk"""
+
+        if entry.get('removed'):
+            os.remove(entry['file'])
+            entry['file'] = None
+        else:
+            entry['data'] = None
+        return
+
+    def removeEntries(self, entries):
+        """Delete the files of entries no longer needed"""
+
+        for entry in entries:
+            if entry['file'] is None:
+                continue
+            if entry['data'] is None:
+                try:
+                    os.remove(entry['file'])
+                except OSError:
+                    pass
+                entry['file'] = None
+            else:
+                #still being written, spilled removes it
+                entry['removed'] = True
+        return
+
+    def clear(self):
+        """Remove all entries"""
+
+        self.removeEntries(self.undostack+self.redostack)
+        self.undostack = []
+        self.redostack = []
+        return
+
+class DisplayCache(object):
+    """
+    Bounded LRU cache of formatted cell text, keyed by (column, row block).
+    Each block is formatted in one go so that painting only costs python
+    work for blocks that have not been seen yet.
+    """
+    def __init__(self, blocksize=256, maxblocks=1000):
+        self.blocksize = blocksize
+        self.maxblocks = maxblocks
+        self.blocks = OrderedDict()
+        return
+
+    def get(self, i, j, func):
+        """Get text for cell i,j. func(j, start, end) should return the
+        values of column j for rows start to end."""
+
+        b, r = divmod(i, self.blocksize)
+        key = (j, b)
+        blocks = self.blocks
+        if key in blocks:
+            blocks.move_to_end(key)
+            return blocks[key][r]
+        start = b * self.blocksize
+        block = blocks[key] = formatValues(func(j, start, start+self.blocksize))
+        if len(blocks) > self.maxblocks:
+            blocks.popitem(last=False)
+        return block[r]
+
+    def clear(self, column=None):
+        """Clear all blocks or only those of one column"""
+
+        if column is None:
+            self.blocks.clear()
+            return
+        for key in [k for k in self.blocks if k[0] == column]:
+            del self.blocks[key]
+        return
+
+class HighlightIndex(object):
+    """
+    Sparse store of highlighted cells. Each named layer keeps a sorted array
+    of row positions per column so a lookup is a binary search and no
+    full size mask of the table is held. Layers added later are drawn on top.
+    """
+
+    colors = {'search':'lightblue', 'filter':'#d7edce', 'rules':'#ffd27f'}
+
+    def __init__(self):
+        self.layers = OrderedDict()
+        return
+
+    def setLayer(self, name, cells, color=None):
+        """Set a layer from a dict of column position -> row positions"""
+
+        if color is None:
+            color = self.colors.get(name, 'lightblue')
+        cols = {}
+        for j in cells:
+            rows = np.unique(np.asarray(cells[j], dtype=np.int64))
+            if len(rows) > 0:
+                cols[j] = rows
+        self.layers.pop(name, None)
+        self.layers[name] = {'color': color, 'cells': cols}
+        return
+
+    def setMask(self, name, mask, color=None):
+        """Set a layer from a 2D boolean array or DataFrame"""
+
+        mask = np.asarray(mask, dtype=bool)
+        cells = {j: np.flatnonzero(mask[:,j]) for j in range(mask.shape[1])}
+        self.setLayer(name, cells, color)
+        return
+
+    def removeLayer(self, name):
+        self.layers.pop(name, None)
+        return
+
+    def clear(self):
+        self.layers.clear()
+        return
+
+    def count(self, name=None):
+        """Number of highlighted cells in a layer or all layers"""
+
+        if name is None:
+            return sum([self.count(n) for n in self.layers])
+        if name not in self.layers:
+            return 0
+        return sum([len(r) for r in self.layers[name]['cells'].values()])
+
+    def remap(self, rows):
+        """Move highlighted rows after the frame is reordered or subset.
+        rows holds the old position of each new row."""
+
+        rows = np.asarray(rows)
+        if len(rows) == 0:
+            self.clear()
+            return
+        inv = np.full(rows.max()+1, -1, dtype=np.int64)
+        inv[rows] = np.arange(len(rows))
+        for name in self.layers:
+            cells = self.layers[name]['cells']
+            for j in list(cells):
+                old = cells[j]
+                new = inv[old[old < len(inv)]]
+                new = np.sort(new[new >= 0])
+                if len(new) == 0:
+                    del cells[j]
+                else:
+                    cells[j] = new
+        return
+
+    def getColor(self, i, j):
+        """Color of the top layer containing cell i,j or None"""
+
+        for name in reversed(self.layers):
+            layer = self.layers[name]
+            rows = layer['cells'].get(j)
+            if rows is None:
+                continue
+            k = np.searchsorted(rows, i)
+            if k < len(rows) and rows[k] == i:
+                return layer['color']
+        return None
+
+class MemoryTracker(QtCore.QObject):
+    """
+    Memory use of a frame for the status bar. Only object columns are slow
+    to measure, since every Python object is visited, so their byte counts
+    are cached and reused until the column array changes. Large object
+    columns are first estimated from a sample of rows and counted exactly
+    in the background, updated is emitted when that is done.
+    """
+    updated = Signal()
+
+    def __init__(self, sample=10000, threshold=200000, threadpool=None):
+        super(MemoryTracker, self).__init__()
+        self.sample = sample
+        self.threshold = threshold
+        if threadpool is None:
+            threadpool = QtCore.QThreadPool.globalInstance()
+        self.threadpool = threadpool
+        #bytes of each object column as (array token, bytes, exact)
+        self.sizes = {}
+        #times each column and all columns were cleared, part of the token
+        #since edits in place keep the same array
+        self.edits = {}
+        self.generation = 0
+        return
+
+    def clear(self, column=None):
+        """Remove cached sizes, of one column position if given. Call when
+        the frame is changed, counts still running for the old values are
+        then not used."""
+
+        if column is None:
+            self.sizes = {}
+            self.generation += 1
+        else:
+            self.sizes.pop(column, None)
+            self.edits[column] = self.edits.get(column, 0) + 1
+        return
+
+    def getToken(self, key, values):
+        """Identifies the array a column is stored in and its edits"""
+
+        return (values.__array_interface__['data'][0], values.strides, len(values),
+                self.edits.get(key, 0), self.generation)
+
+    def getObjectBytes(self, key, values):
+        """Bytes of an object array as (bytes, exact)"""
+
+        token = self.getToken(key, values)
+        entry = self.sizes.get(key)
+        if entry is not None and entry[0] == token:
+            return entry[1], entry[2]
+        n = len(values)
+        if n <= self.threshold:
+            b = pd.Series(values).memory_usage(index=False, deep=True)
+            self.sizes[key] = (token, b, True)
+            return b, True
+        idx = np.random.RandomState(0).randint(0, n, self.sample)
+        b = pd.Series(values[idx]).memory_usage(index=False, deep=True) * n // self.sample
+        self.sizes[key] = (token, b, False)
+        self.countExact(key, token, values)
+        return b, False
+
+    def countExact(self, key, token, values):
+        """Count the bytes of a column in the background"""
+
+        def func(progress_callback):
+            return key, token, pd.Series(values).memory_usage(index=False, deep=True)
+        worker = dialogs.Worker(func)
+        worker.signals.result.connect(self.counted)
+        self.threadpool.start(worker)
+        return
+
+    @Slot(object)
+    def counted(self, result):
+
+        key, token, b = result
+        entry = self.sizes.get(key)
+        if entry is None or entry[0] != token:
+            return
+        self.sizes[key] = (token, b, True)
+        self.updated.emit()
+        return
+
+    def getMemory(self, df):
+        """Bytes used by a frame and its index as (bytes, exact)"""
+
+        exact = True
+        index = df.index
+        if index.dtype == object:
+            total, exact = self.getObjectBytes('index', index.values)
+        else:
+            total = index.memory_usage(deep=True)
+        for j in range(len(df.columns)):
+            s = df.iloc[:,j]
+            if s.dtype == object and isinstance(s.values, np.ndarray):
+                b, e = self.getObjectBytes(j, s.values)
+                exact = exact and e
+            else:
+                b = s.memory_usage(index=False, deep=True)
+            total += b
+        return int(total), exact
+
 class DataFrameModel(QtCore.QAbstractTableModel):
     """
-    DataFrame Model class.
+    DataFrame Model class. Sorting does not reorder the dataframe, instead
+    the model keeps an array of row positions (rows) that maps view rows to
+    rows of the stored frame. The frame is only reordered when the df
+    attribute is accessed.
     """
+    #true if the data is read from a memory mapped file
+    mapped = False
+
     def __init__(self, dataframe=None, *args):
         super(DataFrameModel, self).__init__()
+        self.cache = DisplayCache()
+        self.highlights = HighlightIndex()
+        self.strings = search.StringSearch()
+        self.filters = search.FilterCache()
+        self.memory = MemoryTracker()
+        #incremented whenever the data or row order changes
+        self.version = 0
+        #snapshots held and names of columns copied since, see snapshot
+        self.holds = 0
+        self.detached = None
         if dataframe is None:
             self.df = util.getEmptyData()
         else:
             self.df = dataframe
         self.bg = '#F4F4F3'
-        self.highlighted = None
         return
 
+    @property
+    def df(self):
+        """The dataframe in view order"""
+
+        if self.rows is not None:
+            self.materialize()
+        return self._df
+
+    @df.setter
+    def df(self, df):
+        self._df = df
+        self.rows = None
+        if self.detached is not None:
+            self.detached = set()
+        self.cache.clear()
+        self.strings.clear()
+        self.memory.clear()
+        self.version += 1
+
+    @property
+    def base(self):
+        """The stored dataframe, not reordered to the current view"""
+
+        return self._df
+
+    @property
+    def columns(self):
+        """Column names"""
+
+        return self._df.columns
+
     def update(self, df):
         #print('Updating Model')
         self.df = df
 
+    def clearCache(self):
+        """Clear formatted and string values, call when the frame is changed
+        in place"""
+
+        self.cache.clear()
+        self.strings.clear()
+        self.filters.clear(self._df)
+        return
+
+    def materialize(self):
+        """Reorder the stored frame to match the current view"""
+
+        rows = self.rows
+        self._df = self._df.take(rows)
+        self.highlights.remap(rows)
+        self.strings.clear()
+        self.rows = None
+        self.version += 1
+        return
+
+    def mapRow(self, i):
+        """Stored frame position of view row i"""
+
+        if self.rows is None:
+            return i
+        return self.rows[i]
+
+    def mapRows(self, rows):
+        """Stored frame positions of a list, array or slice of view rows"""
+
+        if self.rows is None:
+            return rows
+        return self.rows[rows]
+
+    def take(self, rows=None, cols=None):
+        """Get part of the table by view row and column positions without
+        reordering the stored frame. None means all rows or columns."""
+
+        df = self._df
+        if isinstance(cols, slice) and cols == slice(None):
+            cols = None
+        if isinstance(rows, slice) and rows == slice(None):
+            rows = None
+        if rows is None and self.rows is None:
+            if cols is None:
+                return df
+            return df.iloc[:, cols]
+        if rows is None:
+            rows = slice(None)
+        rows = self.mapRows(rows)
+        if cols is None:
+            return df.iloc[rows]
+        return df.iloc[rows, cols]
+
     def rowCount(self, parent=QtCore.QModelIndex()):
-        return len(self.df.index)
+        if self.rows is not None:
+            return len(self.rows)
+        return len(self._df.index)
 
     def columnCount(self, parent=QtCore.QModelIndex()):
-        return len(self.df.columns.values)
+        return len(self._df.columns.values)
+
+    def getBlock(self, j, start, end):
+        """Values of column j for a range of view rows"""
+
+        return self._df.iloc[self.mapRows(slice(start, end)), j]
 
     def data(self, index, role=QtCore.Qt.DisplayRole):
         """Edit or display roles. Handles what happens when the Cells
@@ -2013,33 +3287,12 @@ class DataFrameModel(QtCore.QAbstractTableModel):
         https://www.pythonguis.com/tutorials/pyside-qtableview-modelviews-numpy-pandas/
         """
 
-        floatfmt = '{0:.%sf}' %PRECISION
         i = index.row()
         j = index.column()
-        #print (self.df.dtypes)
-        try:
-            coltype = self.df.dtypes[j]
-        except:
-            coltype = self.df[self.df.columns[j]].dtype
-        isdate = is_datetime(coltype)
         if role == QtCore.Qt.DisplayRole:
-            value = self.df.iloc[i, j]
-            if isdate and not value is pd.NaT:
-                try:
-                    return value.strftime(TIMEFORMAT)
-                except:
-                    return ''
-            elif type(value) != str:
-                if type(value) in [float,np.float64] and np.isnan(value):
-                    return ''
-                elif type(value) in [float,np.float64]:
-                    return floatfmt.format(value)
-                else:
-                    return (str(value))
-            else:
-                return '{0}'.format(value)
+            return self.cache.get(i, j, self.getBlock)
         elif (role == QtCore.Qt.EditRole):
-            value = self.df.iloc[i, j]
+            value = self._df.iloc[self.mapRow(i), j]
             #print (coltype)
             #print (value,type(value))
             if type(value) is str:
@@ -2055,23 +3308,21 @@ class DataFrameModel(QtCore.QAbstractTableModel):
                     return str(value)
 
         elif role == QtCore.Qt.BackgroundRole:
-            if self.highlighted is None:
-                return QColor(self.bg)
-            value = self.highlighted.iloc[i, j]
-            if value == True:
-                return QColor('lightblue')
-            else:
+            color = self.highlights.getColor(self.mapRow(i), j)
+            if color is None:
                 return QColor(self.bg)
+            return QColor(color)
 
     def headerData(self, col, orientation, role):
         """What's displayed in the headers"""
 
         if role == QtCore.Qt.DisplayRole:
+            df = self._df
             if orientation == QtCore.Qt.Horizontal:
-                return str(self.df.columns[col])
+                return str(df.columns[col])
             if orientation == QtCore.Qt.Vertical:
-                value = self.df.index[col]
-                if type( self.df.index) == pd.DatetimeIndex:
+                value = df.index[self.mapRow(col)]
+                if type(df.index) == pd.DatetimeIndex:
                     if not value is pd.NaT:
                         try:
                             return value.strftime(TIMEFORMAT)
@@ -2084,11 +3335,17 @@ class DataFrameModel(QtCore.QAbstractTableModel):
     def setData(self, index, value, role=QtCore.Qt.EditRole):
         """Set data upon edits"""
 
-        i = index.row()
+        i = self.mapRow(index.row())
         j = index.column()
-        curr = self.df.iloc[i,j]
+        curr = self._df.iloc[i,j]
         #print (curr, value)
-        self.df.iloc[i,j] = value
+        self.detach([self._df.columns[j]])
+        util.setCell(self._df, i, j, value)
+        self.cache.clear(j)
+        self.strings.clear(j)
+        self.memory.clear(j)
+        self.filters.clear(self._df, self._df.columns[j])
+        self.version += 1
         return True
 
     def flags(self, index):
@@ -2096,14 +3353,237 @@ class DataFrameModel(QtCore.QAbstractTableModel):
         return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsEditable
 
     def sort(self, idx, ascending=True):
-        """Sort table by given column number """
+        """Sort table by one or more column numbers. Only the view row order
+        is changed, the frame itself is not copied."""
+
+        if not isinstance(idx, (list, tuple)):
+            idx = [idx]
+        order = self.getSortOrder(idx, ascending, rows=self.rows)
+        self.setRows(order)
+        return
+
+    def getSortOrder(self, cols, ascending=True, rows=None, callback=None, df=None):
+        """Stored frame positions sorted by column positions, see
+        util.getSortOrder. df is a snapshot to sort instead of the stored
+        frame."""
+
+        if df is None:
+            df = self._df
+        return util.getSortOrder(df, cols, ascending, rows=rows, callback=callback)
+
+    def getMemory(self):
+        """Memory used by the table in bytes and whether it is exact"""
+
+        return self.memory.getMemory(self._df)
+
+    def setModified(self):
+        """Mark the data as changed, for edits made to the frame in place"""
+
+        self.version += 1
+        return
+
+    def snapshot(self):
+        """
+        The stored frame and row order for reading in another thread, e.g.
+        when saving. No data is copied, instead until release is called each
+        column is copied by detach the first time it is changed in place.
+        Returns:
+            a shallow copy of the stored frame and the view rows
+        """
+
+        self.holds += 1
+        self.detached = set()
+        return self._df.copy(deep=False), self.rows
+
+    def release(self):
+        """Release a snapshot once it has been read"""
+
+        self.holds = max(self.holds - 1, 0)
+        if self.holds == 0:
+            self.detached = None
+        return
+
+    def detach(self, columns=None):
+        """Copy columns shared with a snapshot before they are changed in
+        place. columns are names, None for all columns."""
+
+        if self.detached is None:
+            return
+        df = self._df
+        if columns is not None:
+            columns = set(columns)
+        for j, c in enumerate(df.columns):
+            if c in self.detached or (columns is not None and c not in columns):
+                continue
+            df.isetitem(j, df.iloc[:, j].copy())
+            self.detached.add(c)
+        return
+
+    def setRows(self, rows):
+        """Set the stored frame positions shown in the view, e.g. a sort order"""
 
         self.layoutAboutToBeChanged.emit()
-        col = self.df.columns[idx]
-        self.df = self.df.sort_values(col, ascending=ascending)
+        self.rows = rows
+        self.cache.clear()
+        self.version += 1
         self.layoutChanged.emit()
         return
 
+class ArrowTableModel(DataFrameModel):
+    """
+    Model for an arrow IPC/feather file that is memory mapped instead of
+    read, for tables larger than memory. Cells are converted from the mapped
+    buffers a block of rows at a time as they are painted, so only the rows
+    in view are held in memory. Sorting, filtering and finding use the arrow
+    table and only set the view rows, selections are read with take. Using
+    the frame itself, e.g. with df or base to edit the table, reads the table
+    into memory, after which this behaves as a DataFrameModel. See load.
+    """
+    def __init__(self, filename):
+
+        import pyarrow as pa
+        source = pa.memory_map(filename, 'r')
+        reader = pa.ipc.open_file(source)
+        if reader.num_record_batches > 0:
+            #compressed buffers would be decompressed into memory
+            before = pa.total_allocated_bytes()
+            batch = reader.get_batch(0)
+            if pa.total_allocated_bytes() > before:
+                raise ValueError('%s is compressed and cannot be memory mapped, '
+                                 'save it uncompressed' %filename)
+            del batch
+        table = reader.read_all()
+        cols = [i for i, n in enumerate(table.column_names)
+                if not n.startswith('__index_level_')]
+        table = table.select(cols)
+        super(ArrowTableModel, self).__init__(table.schema.empty_table().to_pandas())
+        self.filename = filename
+        self.table = table
+        return
+
+    @property
+    def mapped(self):
+        return self.table is not None
+
+    @property
+    def df(self):
+        """The dataframe in view order, read into memory if mapped"""
+
+        if self.table is not None:
+            self.load()
+        return DataFrameModel.df.fget(self)
+
+    @df.setter
+    def df(self, df):
+        self.table = None
+        DataFrameModel.df.fset(self, df)
+
+    @property
+    def base(self):
+        """The stored dataframe, read into memory if mapped"""
+
+        if self.table is not None:
+            self.load()
+        return self._df
+
+    def load(self):
+        """Read the mapped table into memory, keeping the view rows. Raises
+        MemoryError if the table is larger than the memory available."""
+
+        available = util.getAvailableMemory()
+        if available is not None and self.table.nbytes > available:
+            raise MemoryError('%s is too large to read into memory, %s bytes with '
+                              '%s available' %(self.filename, self.table.nbytes, available))
+        rows = self.rows
+        self.df = self.table.to_pandas()
+        self.rows = rows
+        return
+
+    def take(self, rows=None, cols=None):
+        """Get part of the table by view row and column positions, only
+        the requested part is read"""
+
+        if self.table is None:
+            return DataFrameModel.take(self, rows, cols)
+        t = self.table
+        if cols is not None:
+            t = t.select(np.atleast_1d(np.arange(t.num_columns)[cols]).tolist())
+        if rows is None and self.rows is None:
+            return t.to_pandas()
+        if rows is None:
+            rows = slice(None)
+        if isinstance(rows, slice):
+            pos = np.arange(*rows.indices(self.rowCount()))
+        else:
+            pos = np.atleast_1d(np.asarray(rows, dtype=np.int64))
+        pos = np.asarray(self.mapRows(pos))
+        df = t.take(pos).to_pandas()
+        df.index = pos
+        return df
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if self.table is None:
+            return DataFrameModel.rowCount(self, parent)
+        if self.rows is not None:
+            return len(self.rows)
+        return self.table.num_rows
+
+    def getBlock(self, j, start, end):
+        """Values of column j for a range of view rows"""
+
+        if self.table is None:
+            return DataFrameModel.getBlock(self, j, start, end)
+        x = self.table.column(j)
+        if self.rows is None:
+            x = x.slice(start, end-start)
+        else:
+            x = x.take(self.rows[start:end])
+        return x.to_pandas()
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+
+        if self.table is not None and role == QtCore.Qt.EditRole:
+            return
+        return DataFrameModel.data(self, index, role)
+
+    def headerData(self, col, orientation, role):
+
+        if (self.table is not None and role == QtCore.Qt.DisplayRole
+                and orientation == QtCore.Qt.Vertical):
+            return str(self.mapRow(col))
+        return DataFrameModel.headerData(self, col, orientation, role)
+
+    def setData(self, index, value, role=QtCore.Qt.EditRole):
+
+        if self.table is not None:
+            return False
+        return DataFrameModel.setData(self, index, value, role)
+
+    def flags(self, index):
+
+        if self.table is not None:
+            return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
+        return DataFrameModel.flags(self, index)
+
+    def getSortOrder(self, cols, ascending=True, rows=None, callback=None, df=None):
+
+        if self.table is None:
+            return DataFrameModel.getSortOrder(self, cols, ascending, rows, callback, df)
+        return util.getArrowSortOrder(self.table, cols, ascending, rows=rows,
+                                      callback=callback)
+
+    def getMask(self, query='', filters=[], ignorecase=True, callback=None):
+        """Filter mask of the mapped table, see search.getArrowMask"""
+
+        return search.getArrowMask(self.table, query, filters, ignorecase,
+                                   callback=callback)
+
+    def getMemory(self):
+
+        if self.table is None:
+            return DataFrameModel.getMemory(self)
+        return self.table.nbytes, True
+
 class SubTableWidget(DataFrameWidget):
     """Widget for sub table"""
     def __init__(self, parent=None, dataframe=None, **args):
@@ -25,13 +25,14 @@ import os, types, io
 import traceback
 import string, copy
 from collections import OrderedDict
+import numpy as np
 import pandas as pd
 try:
     import configparser
 except:
     import ConfigParser as configparser
 from .qt import *
-from . import util, core
+from . import util, core, search
 
 module_path = os.path.dirname(os.path.abspath(__file__))
 iconpath = os.path.join(module_path, 'icons')
@@ -50,6 +51,17 @@ def showMessage(parent, msg, type='error'):
     QMessageBox.information(parent, type, msg)
     return
 
+def memoryGuard(parent, func):
+    """Wrap a menu or toolbar action so that a MemoryError, e.g. from
+    reading a memory mapped table into memory, is shown as a message"""
+
+    def wrapper():
+        try:
+            return func()
+        except MemoryError as e:
+            showMessage(parent, str(e))
+    return wrapper
+
 def dialogFromOptions(parent, opts, sections=None,
                       wrap=2, section_wrap=4,
                       style=None):
@@ -283,7 +295,7 @@ def addToolBarItems(toolbar, parent, items):
             icon = QIcon.fromTheme(items[i]['icon'])
         btn = QAction(icon, i, parent)
         if 'action' in items[i]:
-            btn.triggered.connect(items[i]['action'])
+            btn.triggered.connect(memoryGuard(parent, items[i]['action']))
         if 'shortcut' in items[i]:
             btn.setShortcut(QKeySequence(items[i]['shortcut']))
         if 'checkable' in items[i]:
@@ -345,8 +357,9 @@ class ColorButton(QPushButton):
         return super(ColorButton, self).mousePressEvent(e)
 
 class ProgressWidget(QDialog):
-    """Progress widget class"""
-    def __init__(self, parent=None, label=''):
+    """Progress widget class. If cancel is given a button is added
+    that calls it."""
+    def __init__(self, parent=None, label='', cancel=None):
         super(ProgressWidget, self).__init__(parent)
         layout = QVBoxLayout(self)
         self.setWindowTitle(label)
@@ -365,9 +378,17 @@ class ProgressWidget(QDialog):
         self.progressbar = QProgressBar(self)
         layout.addWidget(self.progressbar)
         self.progressbar.setGeometry(30, 40, 400, 200)
-
+        if cancel is not None:
+            button = QPushButton('Cancel')
+            button.clicked.connect(cancel)
+            layout.addWidget(button)
+            self.setMaximumHeight(130)
         return
 
+class Cancelled(Exception):
+    """Raised inside a worker function to stop it after cancel is called"""
+    pass
+
 #https://www.learnpyqt.com/courses/concurrent-execution/multithreading-pyqt-applications-qthreadpool/
 class Worker(QtCore.QRunnable):
     """Worker thread for running background tasks."""
@@ -380,6 +401,13 @@ class Worker(QtCore.QRunnable):
         self.kwargs = kwargs
         self.signals = WorkerSignals()
         self.kwargs['progress_callback'] = self.signals.progress
+        self.cancelled = False
+
+    def cancel(self):
+        """Flag the worker as cancelled, the function should check this
+        and raise Cancelled. No result is emitted for a cancelled worker."""
+
+        self.cancelled = True
 
     @Slot()
     def run(self):
@@ -387,12 +415,15 @@ class Worker(QtCore.QRunnable):
             result = self.fn(
                 *self.args, **self.kwargs,
             )
+        except Cancelled:
+            pass
         except:
             traceback.print_exc()
             exctype, value = sys.exc_info()[:2]
             self.signals.error.emit((exctype, value, traceback.format_exc()))
         else:
-            self.signals.result.emit(result)
+            if not self.cancelled:
+                self.signals.result.emit(result)
         finally:
             self.signals.finished.emit()
 
@@ -406,11 +437,16 @@ class WorkerSignals(QtCore.QObject):
         `tuple` (exctype, value, traceback.format_exc() )
     result
         `object` data returned from processing, anything
+    progress
+        `str` progress value
+    message
+        `str` status text
     """
     finished = Signal()
     error = Signal(tuple)
     result = Signal(object)
     progress = Signal(str)
+    message = Signal(str)
 
 class PlainTextEditor(QPlainTextEdit):
     def __init__(self, parent=None, **kwargs):
@@ -498,6 +534,7 @@ class ImportDialog(QDialog):
         self.parent = parent
         self.filename = filename
         self.df = None
+        self.kwargs = None
         self.setGeometry(QtCore.QRect(250, 250, 900, 600))
         self.setGeometry(
                 QStyle.alignedRect(
@@ -659,7 +696,8 @@ class ImportDialog(QDialog):
         return
 
     def doImport(self):
-        """Do the import"""
+        """Set the read options, the file is read in the background
+        by the table once the dialog closes"""
 
         #self.update()
         #get types if changed?
@@ -669,10 +707,7 @@ class ImportDialog(QDialog):
         #dtmap = {'int32':int32,'float32':float64}
         #for i in dtypes:
         #    dtypes[i] = dtmap[i]
-        try:
-            self.df = pd.read_csv(self.filename, dtype=dtypes, **self.values)
-        except:
-            self.df = pd.read_csv(self.filename)
+        self.kwargs = dict(self.values, dtype=dtypes)
         self.close()
         return
 
@@ -915,7 +950,8 @@ class AggregateDialog(BasicDialog):
         for a in aggcols:
             aggdict[a] = funcs
 
-        res = self.df.groupby(grpcols).agg(aggdict).reset_index()
+        #only groups present in category columns
+        res = self.df.groupby(grpcols, observed=True).agg(aggdict).reset_index()
         self.table.model.df = res
         self.table.refresh()
         return
@@ -970,7 +1006,8 @@ class PivotDialog(BasicDialog):
         vals =[i.text() for i in self.valuesw.selectedItems()]
         idx = [i.text() for i in self.idxw.selectedItems()]
         aggfuncs = [i.text() for i in self.aggw.selectedItems()]
-        res = pd.pivot_table(self.df, index=idx, columns=cols, values=vals, aggfunc=aggfuncs)
+        res = pd.pivot_table(self.df, index=idx, columns=cols, values=vals, aggfunc=aggfuncs,
+                             observed=True)
         names = res.index.names
         #res = res.reset_index(col_level=2)
         #print (res)
@@ -1271,7 +1308,7 @@ class ManageColumnsDialog(BasicDialog):
         """Update list"""
 
         self.cols_w.clear()
-        self.cols_w.addItems(self.table.model.df.columns)
+        self.cols_w.addItems(self.table.model.columns)
         return
 
     def delete(self):
@@ -1336,7 +1373,7 @@ class ManageColumnsDialog(BasicDialog):
 
         self.table.undo()
         self.cols_w.clear()
-        self.cols_w.addItems(self.table.model.df.columns)
+        self.cols_w.addItems(self.table.model.columns)
 
 class PreferencesDialog(QDialog):
     """Preferences dialog from config parser options"""
@@ -1389,11 +1426,22 @@ class PreferencesDialog(QDialog):
                         'label':'Plot DPI'},
                 'ICONSIZE':{'type':'spinbox','default':options['ICONSIZE'],'range':(16,64), 'label':'Icon Size'},
                 'THEME':{'type':'combobox','default':options['THEME'],'items': themes,
-                        'label': 'Default Theme'}
+                        'label': 'Default Theme'},
+                'UNDOMEMORY':{'type':'spinbox','default':options['UNDOMEMORY'],'range':(0,100000),
+                        'interval':100,'label':'Undo memory (MB)'},
+                'CATEGORIZE': {'type':'checkbox','default':bool(options['CATEGORIZE']),
+                        'label':'Categorize on import'},
+                'COMPRESSION':{'type':'combobox','default':options['COMPRESSION'],
+                        'items':util.CODECS,'label':'Compression'},
+                'COMPRESSIONLEVEL':{'type':'spinbox','default':options['COMPRESSIONLEVEL'],'range':(0,22),
+                        'interval':1,'label':'Compression level (0 default)'},
+                'AUTOSAVE':{'type':'spinbox','default':options['AUTOSAVE'],'range':(0,120),
+                        'interval':1,'label':'Autosave minutes (0 off)'}
                 }
         sections = {'table':['ALIGNMENT','FONT','FONTSIZE',
-                        'TIMEFORMAT','PRECISION','BGCOLOR'],
-                    'view':['ICONSIZE','PLOTSTYLE','DPI','THEME','SHOWPLOTTER']
+                        'TIMEFORMAT','PRECISION','BGCOLOR','UNDOMEMORY','CATEGORIZE'],
+                    'view':['ICONSIZE','PLOTSTYLE','DPI','THEME','SHOWPLOTTER'],
+                    'files':['COMPRESSION','COMPRESSIONLEVEL','AUTOSAVE']
                     }
 
         dialog, self.widgets = dialogFromOptions(self, self.opts, sections)
@@ -1433,6 +1481,11 @@ class PreferencesDialog(QDialog):
         core.PLOTSTYLE = kwds['PLOTSTYLE']
         core.DPI = kwds['DPI']
         core.ICONSIZE = kwds['ICONSIZE']
+        core.UNDOMEMORY = kwds['UNDOMEMORY']
+        core.CATEGORIZE = kwds['CATEGORIZE']
+        core.COMPRESSION = kwds['COMPRESSION']
+        core.COMPRESSIONLEVEL = kwds['COMPRESSIONLEVEL']
+        core.AUTOSAVE = kwds['AUTOSAVE']
         self.parent.theme = kwds['THEME']
         self.parent.refresh()
         self.parent.applySettings()
@@ -1475,27 +1528,33 @@ class FindReplaceDialog(QWidget):
         self.resize(400,200)
         self.case = True
         self.current = 0 #coords of found cells
+        self.coords = []
+        self.search_changed = True
+        #lazy search position for find next
+        self.cursor = None
+        self.lastfound = None
         self.createWidgets()
-        self.setMaximumHeight(180)
+        self.setMaximumHeight(200)
         return
 
     def createWidgets(self):
         """Create widgets"""
 
-        df = self.table.model.df
-        cols = list(df.columns)
         self.layout = QVBoxLayout(self)
         self.setLayout(self.layout)
         self.query_w = QLineEdit()
         self.layout.addWidget(QLabel('Query String'))
         self.layout.addWidget(self.query_w )
         self.query_w.returnPressed.connect(self.findAll)
+        self.query_w.textChanged.connect(self.queryChanged)
         self.replace_w = QLineEdit()
         self.layout.addWidget(QLabel('Replace With'))
         self.layout.addWidget(self.replace_w )
 
         tb = self.createToolBar(self)
         self.layout.addWidget(tb)
+        self.count_w = QLabel('')
+        self.layout.addWidget(self.count_w)
         self.adjustSize()
         return
 
@@ -1515,83 +1574,125 @@ class FindReplaceDialog(QWidget):
         """Apply"""
 
         self.find()
-        self.table.refresh()
+        return
+
+    def queryChanged(self, text=None):
+
+        self.search_changed = True
+        self.cursor = None
         return
 
     def findNext(self):
-        """Show next cell of search results"""
+        """Go to the next matching cell after the current one. The table is
+        searched lazily from the current cell and stops at the first match,
+        all matches are counted in the background."""
 
         table = self.table
+        model = table.model
         s = self.query_w.text()
-        if len(self.coords)==0  or self.search_changed == True:
-            self.find()
-        if len(self.coords)==0:
+        if s == '':
             return
-        idx = self.current
-        i,j = self.coords[idx]
-        index = table.model.index(i,j)
-        #table.scrollTo(index, QAbstractItemView.EnsureVisible)
-        table.selectRow(i)
-        table.refresh()
-        self.current+=1
-        if self.current>=len(self.coords):
-            self.current=0
+        current = table.currentIndex()
+        pos = (current.row(), current.column())
+        if self.cursor is None or self.search_changed == True or \
+            self.cursor_version != model.version or pos != self.lastfound:
+            start = (max(pos[0], 0), pos[1]+1)
+            self.cursor = model.strings.iterFind(self.getData(), s, self.case,
+                                                 start, rows=model.rows)
+            self.cursor_version = model.version
+            if self.search_changed == True:
+                self.find(showprogress=False)
+        try:
+            i,j = next(self.cursor)
+        except StopIteration:
+            #searched all the way round, start again from here
+            start = (max(pos[0], 0), pos[1]+1)
+            self.cursor = model.strings.iterFind(self.getData(), s, self.case,
+                                                 start, rows=model.rows)
+            try:
+                i,j = next(self.cursor)
+            except StopIteration:
+                self.cursor = None
+                return
+        self.lastfound = (i,j)
+        index = model.index(i,j)
+        table.setCurrentIndex(index)
+        table.scrollTo(index)
         return
 
     def togglecase(self):
 
         sender = self.sender()
         self.case = sender.isChecked()
+        self.queryChanged()
         return
 
-    def find(self):
-        """Do string search. Creates a masked dataframe for results and then stores each cell
-        coordinate in a list."""
+    def getData(self):
+        """What is searched, the stored frame or a mapped arrow table so
+        that it is not read into memory"""
+
+        model = self.table.model
+        if model.mapped == True:
+            return model.table
+        return model.base
+
+    def find(self, showprogress=True):
+        """Do string search. Runs in the background for large tables. The found
+        cells are set as the search highlight layer and their view coordinates
+        stored in an array."""
 
         table = self.table
-        df = table.model.df
-        df = df.astype('object').astype('str')
+        model = table.model
+        df = self.getData()
+        rows = model.rows
+        version = model.strings.version
         s = self.query_w.text()
+        case = self.case
         self.search_changed = False
-        self.clear()
+        model.highlights.removeLayer('search')
+        self.coords = []
+        self.count_w.setText('')
         if s == '':
+            table.viewport().update()
             return
-        found = pd.DataFrame()
-        for col in df:
-            found[col] = df[col].str.contains(s, na=False, case=self.case)
-        #set the masked dataframe so that highlighted cells are shown on redraw
-        table.model.highlighted = found
-        i=0
-        self.coords = []
-        for r,row in found.iterrows():
-            j=0
-            for col,val in row.iteritems():
-                if val is True:
-                    #print (r,col,val, i, j)
-                    self.coords.append((i,j))
-                j+=1
-            i+=1
-        self.current = 0
-        #print (self.coords)
+
+        def func(progress_callback):
+            return model.strings.findCells(df, s, case, callback=progress_callback,
+                                           version=version)
+
+        def showResult(cells):
+            #set the search layer so that highlighted cells are shown on redraw
+            model.highlights.setLayer('search', cells)
+            self.coords = search.getViewCells(cells, rows)
+            self.current = 0
+            self.count_w.setText('%s found' %len(self.coords))
+            table.viewport().update()
+
+        table.findjobs.run(func, showResult, label='Finding', showprogress=showprogress)
         return
 
     def replace(self):
-        """Replace all instances of search text"""
+        """Replace all instances of search text. Only the columns changed
+        are kept for undo."""
 
         table = self.table
-        table.storeCurrent()
         df = table.model.df
         s=self.query_w.text()
         r=self.replace_w.text()
         case = self.case
-        table.model.df = df.replace(s,r,regex=True)
+        new = util.replaceColumns(df, s, r)
+        if len(new) == 0:
+            return
+        table.storeCurrent(columns=list(df.columns[list(new)]))
+        for j in new:
+            df.isetitem(j, new[j])
         table.refresh()
         self.search_changed = True
         return
 
     def clear(self):
 
-        self.table.model.highlighted = None
+        self.table.model.highlights.removeLayer('search')
         self.table.refresh()
 
     def onClose(self):
@@ -1610,9 +1711,15 @@ class FilterDialog(QWidget):
         self.app = app
         self.setWindowTitle(title)
         self.resize(400,200)
-        self.createWidgets()
         self.filters = []
+        self.filtrows = None
         self.ignorecase = True
+        #wait for typing to pause before filtering
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(400)
+        self.timer.timeout.connect(self.liveApply)
+        self.createWidgets()
         #self.setMinimumHeight(200)
         #self.show()
         return
@@ -1634,14 +1741,14 @@ class FilterDialog(QWidget):
     def createWidgets(self):
         """Create widgets"""
 
-        df = self.table.model.df
-        cols = list(df.columns)
+        cols = list(self.table.model.columns)
         self.layout = QVBoxLayout(self)
         self.setLayout(self.layout)
         self.query_w = QLineEdit()
         self.layout.addWidget(QLabel('String filter'))
         self.layout.addWidget(self.query_w )
         self.query_w.returnPressed.connect(self.apply)
+        self.query_w.textChanged.connect(self.schedule)
         w = self.column_w = QListWidget()
         w.setSelectionMode(QAbstractItemView.MultiSelection)
         #w.setFixedHeight(60)
@@ -1650,6 +1757,8 @@ class FilterDialog(QWidget):
         self.layout.addWidget(self.column_w)
         tb = self.createToolBar(self)
         self.layout.addWidget(tb)
+        self.count_w = QLabel('')
+        self.layout.addWidget(self.count_w)
         self.adjustSize()
         return
 
@@ -1657,25 +1766,25 @@ class FilterDialog(QWidget):
         """Reset the table"""
 
         table = self.table
-        if table.filtered == True and hasattr(table, 'dataframe'):
-            table.model.df = table.dataframe
-            table.filtered = False
-            table.refresh()
+        if table.filtered == True:
+            table.showAll()
         return
 
     def update(self):
         """Update the column widgets if table has changed"""
 
-        df = self.table.model.df
-        cols = list(df.columns)
+        cols = list(self.table.model.columns)
         self.column_w.clear()
         self.column_w.addItems(cols)
+        for f in self.filters:
+            f.updateColumns(cols)
         return
 
     def togglecase(self):
 
         sender = self.sender()
         self.ignorecase = sender.isChecked()
+        self.schedule()
         return
 
     def copyResult(self):
@@ -1683,100 +1792,184 @@ class FilterDialog(QWidget):
         table = self.table
         if table.filtered == False:
             return
-        df = table.model.df
+        df = table.model.take()
         self.app.addSheet(None, df)
         return
 
     def addFilter(self):
         """Add a filter using widgets"""
 
-        df = self.table.model.df
         fb = FilterBar(self, self.table)
         self.layout.insertWidget(4,fb)
         self.filters.append(fb)
         return
 
-    def apply(self):
-        """Apply filters"""
+    def schedule(self, *args):
+        """Filter as the user types, once the keys have paused"""
 
-        table = self.table
-        if table.filtered == True and hasattr(table, 'dataframe'):
-            table.model.df = table.dataframe
-        df = table.model.df
-        mask = None
+        self.timer.start()
+        return
+
+    def liveApply(self):
+        """Apply while typing. Clearing the query with no filters shows the
+        whole table again."""
+
+        if self.query_w.text() == '' and len(self.filters) == 0:
+            table = self.table
+            table.jobs.cancel()
+            if table.filtered == True:
+                table.showAll()
+            self.filtrows = None
+            self.count_w.setText('%s rows' %table.model.rowCount())
+            return
+        self.apply(live=True)
+
+    def stop(self):
+        """Stop pending and running filters"""
+
+        self.timer.stop()
+        self.table.jobs.cancel()
+        return
 
+    def apply(self, live=False):
+        """Apply filters. Runs in the background for large tables. Masks are
+        cached by the model filter engine and the table shows the matching
+        rows of the original frame by position, without copying it.
+        A live apply, while typing, shows the number of rows left after
+        each filter and ignores incomplete queries."""
+
+        table = self.table
+        model = table.model
+        if model.mapped == True:
+            self.applyMapped(live)
+            return
+        if table.filtered == True and table.dataframe is not None:
+            df = table.dataframe
+            order = table.dataorder
+        else:
+            df = model.base
+            order = model.rows
         s = self.query_w.text()
         cols = [i.text() for i in self.column_w.selectedItems()]
-        if len(cols)>0:
-            df = df[cols]
-        if s!='':
+        filters = [f.getFilter() for f in self.filters]
+        ignorecase = self.ignorecase
+        engine = model.filters
+
+        def func(progress_callback):
+            def callback(i, n, count):
+                progress_callback(i, n, '%s rows' %count)
             try:
-                mask = df.eval(s)
-            except:
-                mask = df.eval(s, engine='python')
-
-        #add widget based filters
-        if len(self.filters)>0:
-            mask = self.applyWidgetFilters(df, mask)
-        #apply mask
-        if mask is not None:
-            df = df[mask]
-        self.filtdf = df
-        table.dataframe = table.model.df.copy()
-        table.filtered = True
-        table.model.df = df
-        table.model.layoutChanged.emit()
-        table.refresh()
+                mask = engine.apply(df, s, filters, ignorecase, callback=callback)
+            except Cancelled:
+                raise
+            except Exception:
+                if live == True:
+                    return False
+                raise
+            #keep the current row order
+            if mask is None:
+                return order
+            if order is None:
+                return np.flatnonzero(mask)
+            return order[mask[order]]
+
+        def showResult(rows):
+            if rows is False:
+                self.count_w.setText('invalid filter')
+                return
+            self.filtrows = rows
+            if rows is None:
+                self.count_w.setText('%s rows' %len(df))
+            else:
+                self.count_w.setText('%s rows' %len(rows))
+            table.dataframe = df
+            table.dataorder = order
+            table.filtered = True
+            if len(cols)>0:
+                model.df = df[cols]
+            else:
+                model.df = df
+            model.rows = rows
+            table.refresh(clear=False)
+
+        threaded = len(df) >= core.THREADED_ROWS
+        if live == True and threaded == True:
+            self.count_w.setText('filtering..')
+        table.jobs.run(func, showResult, label='Filtering', threaded=threaded,
+                       showprogress=not live, on_message=self.count_w.setText)
         return
 
-    def applyWidgetFilters(self, df, mask=None):
-        """Apply the widget based filters, returns a boolean mask"""
+    def applyMapped(self, live=False):
+        """Apply filters to a memory mapped table. The mask is computed from
+        the mapped file a batch at a time and only the view rows are set.
+        Display columns are not used since the table is not copied."""
 
-        if mask is None:
-            mask = df.index==df.index
+        table = self.table
+        model = table.model
+        if table.filtered == True:
+            order = table.dataorder
+        else:
+            order = model.rows
+        n = model.table.num_rows
+        s = self.query_w.text()
+        filters = [f.getFilter() for f in self.filters]
+        ignorecase = self.ignorecase
 
-        for f in self.filters:
-            col, val, op, b = f.getFilter()
+        def func(progress_callback):
+            def callback(i, n, count):
+                progress_callback(i, n, '%s rows' %count)
             try:
-                val = float(val)
-            except:
-                pass
-            #print (col, val, op, b)
-            print (self.ignorecase)
-            if self.ignorecase == True:
-                strval = "(?i)"+str(val).lower()
-            else:
-                strval = str(val)
-
-            if op == 'contains':
-                m = df[col].astype(str).str.contains(strval)
-            elif op == 'equals':
-                m = df[col]==val
-            elif op == 'not equals':
-                m = df[col]!=val
-            elif op == '>':
-                m = df[col]>val
-            elif op == '<':
-                m = df[col]<val
-            elif op == 'is empty':
-                m = df[col].isnull()
-            elif op == 'not empty':
-                m = ~df[col].isnull()
-            elif op == 'excludes':
-                m = -df[col].str.contains(strval)
-            elif op == 'starts with':
-                m = df[col].str.startswith(strval)
-            elif op == 'ends with':
-                m = df[col].str.endswith(strval)
-            elif op == 'has length':
-                m = df[col].str.len()>val
-            elif op == 'is number':
-                m = df[col].astype('object').str.isnumeric()
-            elif op == 'is lowercase':
-                m = df[col].astype('object').str.islower()
-            elif op == 'is uppercase':
-                m = df[col].astype('object').str.isupper()
+                mask = model.getMask(s, filters, ignorecase, callback=callback)
+            except Cancelled:
+                raise
+            except Exception:
+                if live == True:
+                    return False
+                raise
+            if mask is None:
+                return order
+            if order is None:
+                return np.flatnonzero(mask)
+            return order[mask[order]]
+
+        def showResult(rows):
+            if rows is False:
+                self.count_w.setText('invalid filter')
+                return
+            self.filtrows = rows
+            if rows is None:
+                self.count_w.setText('%s rows' %n)
             else:
+                self.count_w.setText('%s rows' %len(rows))
+            table.dataframe = None
+            table.dataorder = order
+            table.filtered = True
+            model.setRows(rows)
+            table.refresh(clear=False)
+
+        threaded = n >= core.THREADED_ROWS
+        if live == True and threaded == True:
+            self.count_w.setText('filtering..')
+        table.jobs.run(func, showResult, label='Filtering', threaded=threaded,
+                       showprogress=not live, on_message=self.count_w.setText)
+        return
+
+    def applyWidgetFilters(self, df, mask=None, filters=None):
+        """Apply the widget based filters, returns a boolean mask.
+        filters is a list of values from FilterBar.getFilter, taken from
+        the widgets if not given."""
+
+        if mask is None:
+            mask = df.index==df.index
+        if filters is None:
+            filters = [f.getFilter() for f in self.filters]
+        engine = self.table.model.filters
+        engine.setFrame(df)
+
+        for col, val, op, b in filters:
+            val = search.getFilterValue(val)
+            m = engine.getMask(df, col, op, val, self.ignorecase)
+            if m is None:
                 continue
             if b == 'AND':
                 mask = mask & m
@@ -1797,17 +1990,25 @@ class FilterDialog(QWidget):
         table = self.table
         if table.filtered == False:
             return
-        idx = list(self.filtdf.index)
         df = table.dataframe
+        if df is None:
+            #mapped table
+            df = table.model.base
+        keep = np.ones(len(df), dtype=bool)
+        if self.filtrows is not None:
+            keep[self.filtrows] = False
+        else:
+            keep[:] = False
         table.dataframe = None
+        table.dataorder = None
         table.filtered = False
-        table.model.df = df.loc[~df.index.isin(idx)]
-        table.model.layoutChanged.emit()
+        table.model.df = df[keep]
         table.refresh()
         return
 
     def onClose(self):
 
+        self.stop()
         self.table.showAll()
         self.close()
 
@@ -1826,8 +2027,7 @@ class FilterBar(QWidget):
         operators = ['contains','excludes','equals','not equals','>','<','is empty','not empty',
                      'starts with','ends with','has length','is number','is lowercase','is uppercase']
         booleanops = ['AND','OR','NOT']
-        df = self.table.model.df
-        cols = list(df.columns)
+        cols = list(self.table.model.columns)
         l = self.layout = QHBoxLayout(self)
         self.setLayout(self.layout)
         w = self.boolean_w = QComboBox()
@@ -1844,7 +2044,10 @@ class FilterBar(QWidget):
 
         self.term_w = QLineEdit()
         self.term_w.returnPressed.connect(self.parent.apply)
+        self.term_w.textChanged.connect(self.parent.schedule)
         l.addWidget(self.term_w )
+        for w in [self.boolean_w, self.column_w, self.operator_w]:
+            w.currentIndexChanged.connect(self.parent.schedule)
         icon = QIcon(os.path.join(iconpath,'remove.png'))
         btn = QPushButton()
         btn.setIcon(icon)
@@ -1853,6 +2056,18 @@ class FilterBar(QWidget):
         l.addWidget(btn)
         return
 
+    def updateColumns(self, cols):
+        """Replace the column choices, keeping the selected position"""
+
+        w = self.column_w
+        i = w.currentIndex()
+        w.blockSignals(True)
+        w.clear()
+        w.addItems(cols)
+        w.setCurrentIndex(min(i, len(cols)-1))
+        w.blockSignals(False)
+        return
+
     def getFilter(self):
         """Get filter values for this instance"""
 
@@ -1864,4 +2079,5 @@ class FilterBar(QWidget):
 
     def onClose(self, ce):
         self.parent.filters.remove(self)
+        self.parent.schedule()
         self.close()
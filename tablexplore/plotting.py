@@ -146,6 +146,63 @@ class PlotViewer(QWidget):
         sizepolicy = QSizePolicy()
         self.setSizePolicy(QSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding))
         self.style = None
+        #selection ranges of the current plot and a spec waiting to be plotted
+        self.ranges = None
+        self.spec = None
+        return
+
+    def showEvent(self, event):
+        """Plot a restored spec once the plotter is first shown"""
+
+        super(PlotViewer, self).showEvent(event)
+        if self.spec is not None:
+            QtCore.QTimer.singleShot(0, self.plotSpec)
+        return
+
+    def getSpec(self):
+        """The plot kind, options and selection ranges plotted, saved with
+        projects instead of the figure"""
+
+        spec = {'kind': self.opts['general'].kwds.get('kind'),
+                'opts': {name: self.opts[name].kwds for name in self.opts},
+                'ranges': self.ranges}
+        return spec
+
+    def setSpec(self, spec):
+        """Restore the options from a spec. The plot is made when the plotter
+        is next shown, see plotSpec"""
+
+        for name in spec['opts']:
+            if name in self.opts:
+                self.opts[name].kwds = spec['opts'][name]
+        if spec['ranges'] is not None:
+            self.spec = spec
+            if self.isVisible():
+                QtCore.QTimer.singleShot(0, self.plotSpec)
+        return
+
+    def plotSpec(self):
+        """Plot the selection ranges of a restored spec"""
+
+        spec = self.spec
+        if spec is None or self.table is None:
+            return
+        for name in self.opts:
+            if not hasattr(self.opts[name], 'widgets'):
+                #no option widgets yet, plot when next shown
+                return
+        self.spec = None
+        model = self.table.model
+        nrows, ncols = model.rowCount(), model.columnCount()
+        ranges = [(t, min(b, nrows-1), l, min(r, ncols-1))
+                  for t, b, l, r in spec['ranges'] if t < nrows and l < ncols]
+        if len(ranges) == 0:
+            return
+        #the widgets must hold the restored options before they are applied
+        for name in self.opts:
+            self.opts[name].updateWidgets()
+        self.replot(self.table.getSelectedDataFrame(ranges))
+        self.ranges = ranges
         return
 
     def addPlotWidget(self):
@@ -336,9 +393,12 @@ class PlotViewer(QWidget):
         """Replot with given dataframe"""
 
         self.clear()
+        self.spec = None
         if data is None:
-            self.data = self.table.getSelectedDataFrame()
+            self.ranges = self.table.getSelectionRanges()
+            self.data = self.table.getSelectedDataFrame(self.ranges)
         else:
+            self.ranges = None
             self.data = data
 
         self.applyPlotoptions()
@@ -395,7 +455,8 @@ class PlotViewer(QWidget):
 
         if self.table is None:
             return
-        df = self.table.model.df
+        #only the columns are needed
+        df = self.table.model.take(rows=[])
         self.opts['general'].update(df)
         #self.opts['series'].update(df)
         return
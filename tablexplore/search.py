@@ -0,0 +1,842 @@
+#!/usr/bin/env python
+"""
+    Implements table search methods for tablexplore
+    Created October 2026
+    Copyright (C) Damien Farrell
+
+    This program is free software; you can redistribute it and/or
+    modify it under the terms of the GNU General Public License
+    as published by the Free Software Foundation; either version 3
+    of the License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program; if not, write to the Free Software
+    Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+
+from __future__ import absolute_import, division, print_function
+import os, re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from . import util
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+#regular expression special characters
+SPECIAL = set('.^$*+?{}[]\\|()')
+
+def isPlain(s):
+    """Check if a query has no regular expression syntax"""
+
+    return len(SPECIAL.intersection(s)) == 0 and '\n' not in s
+
+class StringColumn(object):
+    """
+    String view of one column. If pyarrow is installed the strings are kept
+    in an Arrow array and searched with its compute kernels, which release
+    the GIL. Otherwise the cell strings are joined with newlines into a single
+    text so that plain queries are found with one regular expression scan,
+    offsets maps positions in the text back to rows. For a category column
+    only the categories are searched and rows are matched by their codes.
+    """
+    def __init__(self, s):
+        self.codes = None
+        self.array = None
+        self.text = None
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            cats = s.cat.categories.astype('object').astype('str').tolist()
+            #missing values are an empty string
+            self.categories = StringColumn(pd.Series(cats+[''], dtype=object))
+            codes = s.cat.codes.values.astype(np.int64)
+            codes[codes < 0] = len(cats)
+            self.codes = codes
+            return
+        values = s.astype('object').astype('str').values
+        self.values = values
+        if pa is not None:
+            self.array = pa.array(values, type=pa.string())
+        return
+
+    def __len__(self):
+        if self.codes is not None:
+            return len(self.codes)
+        return len(self.values)
+
+    def getText(self):
+        """Joined text and row offsets, made when first needed"""
+
+        if self.text is None:
+            lengths = np.fromiter((len(i) for i in self.values), dtype=np.int64,
+                                  count=len(self.values))
+            self.offsets = np.zeros(len(self.values)+1, dtype=np.int64)
+            np.cumsum(lengths+1, out=self.offsets[1:])
+            self.text = '\n'.join(self.values)
+        return self.text, self.offsets
+
+    def find(self, s, case=True, rows=None):
+        """Boolean array of rows containing s. rows is an optional
+        array of positions to search."""
+
+        if self.codes is not None:
+            found = self.categories.find(s, case)
+            if rows is None:
+                return found[self.codes]
+            return found[self.codes[rows]]
+        if self.array is not None:
+            array = self.array
+            if rows is not None:
+                array = array.take(pa.array(rows))
+            try:
+                if isPlain(s):
+                    x = pc.match_substring(array, s, ignore_case=not case)
+                else:
+                    x = pc.match_substring_regex(array, s, ignore_case=not case)
+                return x.to_numpy(zero_copy_only=False)
+            except pa.ArrowInvalid:
+                #regular expression not supported by arrow
+                pass
+        flags = 0
+        if case == False:
+            flags = re.IGNORECASE
+        if rows is not None:
+            if isPlain(s):
+                s = re.escape(s)
+            search = re.compile(s, flags).search
+            return np.fromiter((search(v) is not None for v in self.values[rows]),
+                               dtype=bool, count=len(rows))
+        if isPlain(s):
+            text, offsets = self.getText()
+            #consume the rest of the cell so there is one match per row
+            pattern = re.compile(re.escape(s)+'.*', flags)
+            starts = np.fromiter((m.start() for m in pattern.finditer(text)),
+                                 dtype=np.int64)
+            found = np.zeros(len(self.values), dtype=bool)
+            found[np.searchsorted(offsets, starts, side='right') - 1] = True
+            return found
+        search = re.compile(s, flags).search
+        return np.fromiter((search(v) is not None for v in self.values),
+                           dtype=bool, count=len(self.values))
+
+def getColumnValues(data, j, rows=None):
+    """Column position j of a dataframe or arrow table as a series, only the
+    rows at the positions given if rows is set. Only that part of an arrow
+    table is read."""
+
+    if isinstance(data, pd.DataFrame):
+        if rows is None:
+            return data.iloc[:,j]
+        return data.iloc[rows,j]
+    x = data.column(j)
+    if rows is not None:
+        x = x.take(pa.array(rows))
+    return x.to_pandas()
+
+class StringSearch(object):
+    """
+    Finds text in a dataframe. A string view of each column is made the first
+    time it is searched and kept until cleared, so later searches only scan
+    the cached text. Columns are searched in parallel. A search started before
+    the cache was last cleared does not store the columns it makes, see
+    version. The data may also be an arrow table, e.g. a memory mapped one,
+    whose string views are not kept so that it is read a column at a time.
+    """
+    def __init__(self, threads=None):
+        if threads is None:
+            threads = os.cpu_count() or 1
+        self.threads = threads
+        self.columns = {}
+        #incremented whenever the cache is cleared
+        self.version = 0
+        self.lock = threading.Lock()
+        return
+
+    def clear(self, column=None):
+        """Remove cached columns, call when the frame is changed"""
+
+        with self.lock:
+            if column is None:
+                self.columns = {}
+            else:
+                self.columns.pop(column, None)
+            self.version += 1
+        return
+
+    def getColumn(self, df, j, version=None):
+        """Cached string view of column position j. Made from df if not
+        cached, and only stored if the cache was not cleared since version."""
+
+        if not isinstance(df, pd.DataFrame):
+            return StringColumn(getColumnValues(df, j))
+        col = self.columns.get(j)
+        if col is None or len(col) != len(df):
+            col = StringColumn(df.iloc[:,j])
+            with self.lock:
+                if version is None or version == self.version:
+                    self.columns[j] = col
+        return col
+
+    def find(self, df, s, case=True, callback=None, version=None):
+        """
+        Search all columns for a string or regular expression.
+        Args:
+            df: dataframe or arrow table
+            s: query
+            case: case sensitive
+            callback: called with (done, total) as each column finishes
+            version: the cache version when df was taken, needed if df may be
+            changed while searching in another thread
+        Returns:
+            a boolean array the shape of df
+        """
+
+        found = np.zeros((len(df), len(df.columns)), dtype=bool)
+        for j, rows in self.findCells(df, s, case, callback, version).items():
+            found[rows, j] = True
+        return found
+
+    def findCells(self, df, s, case=True, callback=None, version=None):
+        """
+        Search all columns as for find, keeping only the positions of the
+        matching cells, so no mask the size of the table is made, e.g. for a
+        large memory mapped table.
+        Returns:
+            a dict of column position -> row positions of matching cells
+        """
+
+        if version is None:
+            version = self.version
+        n = len(df.columns)
+        cells = {}
+        def func(j):
+            return np.flatnonzero(self.getColumn(df, j, version).find(s, case))
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            for j, rows in enumerate(executor.map(func, range(n))):
+                if len(rows) > 0:
+                    cells[j] = rows
+                if callback is not None:
+                    callback(j+1, n)
+        return cells
+
+    def findBlock(self, df, j, rows, s, case=True):
+        """Search part of column j, rows is an array of positions.
+        Uses the cached string view if there is one."""
+
+        col = self.columns.get(j)
+        if col is not None and len(col) == len(df):
+            return col.find(s, case, rows)
+        return StringColumn(getColumnValues(df, j, rows)).find(s, case)
+
+    def iterFind(self, df, s, case=True, start=(0,0), rows=None, blocksize=20000):
+        """
+        Generator of (row, column) coordinates of matching cells in row
+        order, beginning at the start cell and wrapping around once. Rows are
+        searched a block at a time so only the part of the table up to the
+        next match is scanned.
+        Args:
+            df: dataframe or arrow table
+            s: query
+            start: (row, column) of first cell to check
+            rows: frame positions of each view row if the view is reordered
+        """
+
+        if rows is None:
+            n = len(df)
+        else:
+            n = len(rows)
+        m = len(df.columns)
+        if n == 0 or m == 0:
+            return
+        i0, j0 = start
+        i0 = min(max(i0, 0), n-1)
+        for wrapped, (first, last) in enumerate([(i0, n), (0, i0+1)]):
+            for b in range(first, last, blocksize):
+                view = np.arange(b, min(b+blocksize, last))
+                if rows is None:
+                    pos = view
+                else:
+                    pos = rows[view]
+                found = np.zeros((len(view), m), dtype=bool)
+                for j in range(m):
+                    found[:,j] = self.findBlock(df, j, pos, s, case)
+                for i, j in np.argwhere(found):
+                    i = int(view[i])
+                    j = int(j)
+                    #start row is split between the first and wrapped passes
+                    if i == i0 and not wrapped and j < j0:
+                        continue
+                    if i == i0 and wrapped and j >= j0:
+                        continue
+                    yield i, j
+        return
+
+def getViewCells(cells, rows=None):
+    """
+    View coordinates of cells found by StringSearch.findCells, in row order.
+    Args:
+        cells: dict of column position -> frame row positions
+        rows: frame positions of each view row if the view is reordered
+    Returns:
+        an array of (row, column) pairs
+    """
+
+    inv = None
+    if rows is not None:
+        size = max([len(rows)] + [int(r[-1])+1 for r in cells.values()])
+        inv = np.full(size, -1, dtype=np.int64)
+        inv[rows] = np.arange(len(rows))
+    i, j = [], []
+    for col, pos in cells.items():
+        if inv is not None:
+            pos = inv[pos]
+            pos = pos[pos >= 0]
+        i.append(pos)
+        j.append(np.full(len(pos), col, dtype=np.int64))
+    if len(i) == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+    i = np.concatenate(i)
+    j = np.concatenate(j)
+    order = np.lexsort((j, i))
+    return np.column_stack((i[order], j[order]))
+
+#filter operators answered by the column text index
+TEXTOPS = ['contains', 'excludes', 'starts with', 'ends with']
+
+class TextIndex(object):
+    """
+    Text index of one column for the string filter operators. The column is
+    factorized so each distinct value is converted to a string and case
+    folded only once, kept as Arrow arrays if pyarrow is installed. Sorted
+    values answer 'starts with' by binary search. Once the column has been
+    searched a few times a trigram index of the distinct values is built, so
+    later 'contains' queries only check values holding every trigram of the
+    query.
+    """
+    def __init__(self, s, repeats=2, maxvalues=1000000):
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            codes, uniques = s.cat.codes.values, s.cat.categories
+        else:
+            codes, uniques = pd.factorize(s)
+        self.codes = codes
+        self.values = np.array([str(u) for u in uniques], dtype=object)
+        self.lower = np.array([v.lower() for v in self.values], dtype=object)
+        self.arrays = {}
+        self.order = {}
+        self.grams = None
+        self.queries = 0
+        self.repeats = repeats
+        self.maxvalues = maxvalues
+        return
+
+    def __len__(self):
+        return len(self.codes)
+
+    def getValues(self, case=True):
+        """Distinct values as strings, lower case if case is False"""
+
+        if case == True:
+            return self.values
+        return self.lower
+
+    def getArray(self, case=True):
+        """Distinct values as an Arrow string array"""
+
+        if case not in self.arrays:
+            self.arrays[case] = pa.array(self.getValues(case), type=pa.string())
+        return self.arrays[case]
+
+    def getOrder(self, case=True):
+        """Sorted distinct values and their positions"""
+
+        if case not in self.order:
+            values = self.getValues(case)
+            order = np.argsort(values, kind='stable')
+            self.order[case] = (values[order], order)
+        return self.order[case]
+
+    def buildTrigrams(self):
+        """Map each trigram of the lower case values to the values holding it"""
+
+        grams = {}
+        for i, v in enumerate(self.lower):
+            for g in set(v[k:k+3] for k in range(len(v)-2)):
+                l = grams.get(g)
+                if l is None:
+                    grams[g] = [i]
+                else:
+                    l.append(i)
+        self.grams = {g: np.array(l, dtype=np.int64) for g, l in grams.items()}
+        return
+
+    def candidates(self, s):
+        """Positions of values that can contain s, None if all can"""
+
+        if len(s) < 3:
+            return
+        if self.grams is None:
+            if self.queries < self.repeats or len(self.values) > self.maxvalues:
+                return
+            self.buildTrigrams()
+        s = s.lower()
+        postings = []
+        for k in range(len(s)-2):
+            p = self.grams.get(s[k:k+3])
+            if p is None:
+                return np.zeros(0, dtype=np.int64)
+            postings.append(p)
+        postings.sort(key=len)
+        found = postings[0]
+        for p in postings[1:]:
+            found = np.intersect1d(found, p, assume_unique=True)
+        return found
+
+    def search(self, kind, s, case=True, pos=None):
+        """Boolean array over the distinct values, or those at pos"""
+
+        if pa is not None:
+            array = self.getArray(True)
+            if pos is not None:
+                array = array.take(pa.array(pos))
+            try:
+                if kind == 'contains' and isPlain(s):
+                    x = pc.match_substring(array, s, ignore_case=not case)
+                elif kind == 'contains':
+                    x = pc.match_substring_regex(array, s, ignore_case=not case)
+                else:
+                    x = pc.ends_with(array, s, ignore_case=not case)
+                return x.to_numpy(zero_copy_only=False)
+            except pa.ArrowInvalid:
+                #regular expression not supported by arrow
+                pass
+        values = self.getValues(case)
+        if pos is not None:
+            values = values[pos]
+        if case == False:
+            s = s.lower()
+        if kind == 'contains':
+            if isPlain(s):
+                search = lambda v: s in v
+            else:
+                flags = 0 if case else re.IGNORECASE
+                search = re.compile(s, flags).search
+        else:
+            search = lambda v: v.endswith(s)
+        return np.fromiter((bool(search(v)) for v in values), dtype=bool,
+                           count=len(values))
+
+    def match(self, op, val, case=True):
+        """Boolean row mask for one of the TEXTOPS operators"""
+
+        s = str(val)
+        if case == False:
+            s = s.lower()
+        n = len(self.values)
+        hits = np.zeros(n, dtype=bool)
+        if op == 'starts with':
+            values, order = self.getOrder(case)
+            lo = np.searchsorted(values, s, side='left')
+            hi = np.searchsorted(values, s+'\U0010ffff', side='left')
+            hits[order[lo:hi]] = True
+        elif op in ['contains', 'excludes']:
+            pos = None
+            if isPlain(s):
+                pos = self.candidates(s)
+            self.queries += 1
+            if pos is None:
+                hits = self.search('contains', s, case)
+            elif len(pos) > 0:
+                hits[pos] = self.search('contains', s, case, pos)
+        elif op == 'ends with':
+            hits = self.search('ends with', s, case)
+        #missing values are last in the lookup and never match
+        lookup = np.zeros(n+1, dtype=bool)
+        lookup[:n] = hits
+        mask = lookup[self.codes]
+        if op == 'excludes':
+            mask = ~mask
+        return mask
+
+def getFilterValue(val):
+    """Filter values are numbers where possible"""
+
+    try:
+        return float(val)
+    except:
+        return val
+
+def getCategoryCode(categories, val):
+    """Code of a value in the categories, -2 if not present so that it
+    never matches a row"""
+
+    try:
+        return categories.get_loc(val)
+    except (KeyError, TypeError):
+        return -2
+
+def filterColumn(x, op, val, ignorecase=True):
+    """
+    Boolean mask for one widget filter.
+    Args:
+        x: column values as a series
+        op: operator name e.g. 'contains', '>'
+        val: filter value
+    Returns:
+        boolean numpy array or None if the operator is unknown
+    """
+
+    if ignorecase == True:
+        strval = "(?i)"+str(val).lower()
+    else:
+        strval = str(val)
+
+    if op in ['equals', 'not equals'] and isinstance(x.dtype, pd.CategoricalDtype):
+        #compare the integer codes
+        code = getCategoryCode(x.cat.categories, val)
+        if op == 'equals':
+            return x.cat.codes.values == code
+        return x.cat.codes.values != code
+    if isinstance(x.dtype, pd.CategoricalDtype):
+        #unordered categories cannot be compared, use the values
+        x = x.astype(object)
+    if op == 'contains':
+        m = x.astype(str).str.contains(strval)
+    elif op == 'equals':
+        m = x==val
+    elif op == 'not equals':
+        m = x!=val
+    elif op == '>':
+        m = x>val
+    elif op == '<':
+        m = x<val
+    elif op == 'is empty':
+        m = x.isnull()
+    elif op == 'not empty':
+        m = ~x.isnull()
+    elif op == 'excludes':
+        m = ~(x.str.contains(strval).fillna(False).astype(bool))
+    elif op in ['starts with', 'ends with']:
+        if ignorecase == True:
+            x = x.str.lower()
+        if op == 'starts with':
+            m = x.str.startswith(str(val).lower() if ignorecase else str(val))
+        else:
+            m = x.str.endswith(str(val).lower() if ignorecase else str(val))
+    elif op == 'has length':
+        m = x.str.len()>val
+    elif op == 'is number':
+        m = x.astype('object').str.isnumeric()
+    elif op == 'is lowercase':
+        m = x.astype('object').str.islower()
+    elif op == 'is uppercase':
+        m = x.astype('object').str.isupper()
+    else:
+        return
+    return np.asarray(m.fillna(False), dtype=bool)
+
+def getArrowExpression(field, op, val, ignorecase=True):
+    """
+    Arrow dataset expression for one widget filter, the equivalent of
+    filterColumn for memory mapped tables.
+    Args:
+        field: pyarrow schema field of the column
+        op: operator name
+        val: filter value as entered
+    Returns:
+        expression or None if the operator is not supported
+    """
+
+    import pyarrow.dataset as ds
+    x = ds.field(field.name)
+    if pa.types.is_integer(field.type) or pa.types.is_floating(field.type):
+        val = getFilterValue(val)
+    if op in ['contains', 'excludes', 'starts with', 'ends with']:
+        x = x.cast(pa.string())
+        s = str(val)
+        if op == 'starts with':
+            return pc.starts_with(x, s, ignore_case=ignorecase)
+        elif op == 'ends with':
+            return pc.ends_with(x, s, ignore_case=ignorecase)
+        if isPlain(s):
+            m = pc.match_substring(x, s, ignore_case=ignorecase)
+        else:
+            m = pc.match_substring_regex(x, s, ignore_case=ignorecase)
+        if op == 'excludes':
+            return ~pc.coalesce(m, False)
+        return m
+    elif op == 'equals':
+        return x == val
+    elif op == 'not equals':
+        return x != val
+    elif op == '>':
+        return x > val
+    elif op == '<':
+        return x < val
+    elif op == 'is empty':
+        return x.is_null()
+    elif op == 'not empty':
+        return ~x.is_null()
+    elif op == 'has length':
+        return pc.utf8_length(x.cast(pa.string())) > val
+    return
+
+def getArrowMask(table, query='', filters=[], ignorecase=True, callback=None):
+    """
+    Combined mask of a query and widget filters for an arrow table, as for
+    FilterCache.apply. The expression is evaluated one record batch at a
+    time so a memory mapped table is never read into memory as a whole.
+    Args:
+        query: conditions as accepted by util.getArrowFilter
+        filters: list of (column, value, operator, boolean) tuples
+        callback: called with (done, total, rows left) for each batch
+    Returns:
+        boolean array or None if there are no filters
+    """
+
+    import pyarrow.dataset as ds
+    expr = None
+    if query != '':
+        expr = util.getArrowFilter(query)
+    for col, val, op, b in filters:
+        e = getArrowExpression(table.schema.field(col), op, val, ignorecase)
+        if e is None:
+            raise ValueError('%s is not supported for this table' %op)
+        e = pc.coalesce(e, False)
+        if expr is None:
+            expr = ds.scalar(True)
+        if b == 'OR':
+            expr = expr | e
+        elif b == 'NOT':
+            expr = pc.xor(expr, e)
+        else:
+            expr = expr & e
+    if expr is None:
+        return
+    n = table.num_rows
+    mask = np.zeros(n, dtype=bool)
+    done = count = 0
+    dataset = ds.dataset(table)
+    for batch in dataset.to_batches(columns={'mask': expr}, use_threads=True):
+        m = batch.column(0).fill_null(False).to_numpy(zero_copy_only=False)
+        mask[done:done+len(m)] = m
+        done += len(m)
+        count += int(m.sum())
+        if callback is not None:
+            callback(done, n, count)
+    return mask
+
+def isNarrower(op, old, new, ignorecase=True):
+    """True if rows matching the filter with value new are always a subset
+    of those matching old"""
+
+    if old == new:
+        return False
+    if op in ['contains', 'starts with', 'ends with']:
+        old = str(old)
+        new = str(new)
+        if ignorecase == True:
+            old = old.lower()
+            new = new.lower()
+        if not isPlain(old) or not isPlain(new):
+            return False
+        if op == 'contains':
+            return old in new
+        elif op == 'starts with':
+            return new.startswith(old)
+        return new.endswith(old)
+    if not isinstance(old, float) or not isinstance(new, float):
+        return False
+    if op in ['>', 'has length']:
+        return new > old
+    elif op == '<':
+        return new < old
+    return False
+
+class FilterCache(object):
+    """
+    Boolean masks of filters on one frame. Each predicate mask is kept keyed
+    by (version, column, operator, value), as is the combined mask of each
+    leading set of filters. Adding an AND filter then only evaluates the new
+    one over the rows still selected, and a narrower value for the same
+    column and operator (e.g. a longer 'contains' string) is evaluated only
+    over the rows the previous value kept. String operators use a TextIndex
+    of the column, kept until the column is changed.
+    """
+    def __init__(self, maxsize=32):
+        self.frame = None
+        self.version = 0
+        self.maxsize = maxsize
+        self.masks = OrderedDict()
+        self.text = {}
+        return
+
+    def setFrame(self, df):
+        """Use df, masks of any other frame are dropped"""
+
+        if df is not self.frame:
+            self.frame = df
+            self.text = {}
+            self.clear()
+        return
+
+    def clear(self, df=None, column=None):
+        """Clear masks, if df is given only when it is the cached frame.
+        The text index of column is also removed, or all if column is None."""
+
+        if df is not None and df is not self.frame:
+            return
+        self.version += 1
+        self.masks = OrderedDict()
+        if column is None:
+            self.text = {}
+        else:
+            self.text.pop(column, None)
+        return
+
+    def getIndex(self, df, col):
+        """Cached text index of a column"""
+
+        index = self.text.get(col)
+        if index is None or len(index) != len(df):
+            index = TextIndex(df[col])
+            self.text[col] = index
+        return index
+
+    def get(self, key):
+
+        mask = self.masks.get(key)
+        if mask is not None:
+            self.masks.move_to_end(key)
+        return mask
+
+    def store(self, key, mask):
+
+        self.masks[key] = mask
+        self.masks.move_to_end(key)
+        while len(self.masks) > self.maxsize:
+            self.masks.popitem(last=False)
+        return
+
+    def findNarrower(self, kind, prefix, col, op, val, ignorecase):
+        """A cached mask for the same filter with a broader value"""
+
+        for key in reversed(self.masks):
+            if key[:3] != (kind, self.version, ignorecase) or key[3] != prefix:
+                continue
+            c, v, o = key[4][:3]
+            if len(key[4]) > 3 and key[4][3] != 'AND':
+                continue
+            if c == col and o == op and isNarrower(op, v, val, ignorecase):
+                return self.masks[key]
+        return
+
+    def getMask(self, df, col, op, val, ignorecase=True, rows=None):
+        """Mask of one filter over the whole frame. rows are positions already
+        known to be the only ones that can match."""
+
+        key = ('mask', self.version, ignorecase, (), (col, val, op))
+        mask = self.get(key)
+        if mask is not None:
+            if rows is None:
+                return mask
+            return mask[rows]
+        if op in TEXTOPS:
+            #the index checks each distinct value once so use the whole column
+            mask = self.getIndex(df, col).match(op, val, ignorecase==False)
+            self.store(key, mask)
+            if rows is None:
+                return mask
+            return mask[rows]
+        full = rows is None
+        if full:
+            broad = self.findNarrower('mask', (), col, op, val, ignorecase)
+            if broad is not None:
+                rows = np.flatnonzero(broad)
+        if rows is None:
+            mask = filterColumn(df[col], op, val, ignorecase)
+        else:
+            mask = filterColumn(df[col].iloc[rows], op, val, ignorecase)
+        if mask is None:
+            return
+        if full:
+            if rows is not None:
+                new = np.zeros(len(df), dtype=bool)
+                new[rows] = mask
+                mask = new
+            self.store(key, mask)
+        return mask
+
+    def apply(self, df, query='', filters=[], ignorecase=True, callback=None):
+        """
+        Combined mask of a query string and widget filters.
+        Args:
+            df: dataframe
+            query: expression for df.eval
+            filters: list of (column, value, operator, boolean) tuples
+            callback: called with (done, total, rows left) as each filter
+            is applied
+        Returns:
+            boolean array or None if there are no filters
+        """
+
+        self.setFrame(df)
+        n = len(df)
+        mask = None
+        if query != '':
+            key = ('query', self.version, query)
+            mask = self.get(key)
+            if mask is None:
+                try:
+                    mask = df.eval(query)
+                except:
+                    mask = df.eval(query, engine='python')
+                mask = np.asarray(mask, dtype=bool)
+                self.store(key, mask)
+        total = len(filters)+1
+        if callback is not None:
+            callback(1, total, n if mask is None else int(mask.sum()))
+        prefix = (query,)
+        for i, (col, val, op, b) in enumerate(filters):
+            val = getFilterValue(val)
+            f = (col, val, op, b)
+            if mask is None:
+                mask = np.ones(n, dtype=bool)
+            key = ('combined', self.version, ignorecase, prefix, f)
+            new = self.get(key)
+            if new is None and b == 'AND':
+                #only rows still selected need to be checked
+                broad = self.findNarrower('combined', prefix, col, op, val, ignorecase)
+                if broad is not None:
+                    rows = np.flatnonzero(broad)
+                else:
+                    rows = np.flatnonzero(mask)
+                if len(rows) == n:
+                    m = self.getMask(df, col, op, val, ignorecase)
+                else:
+                    m = self.getMask(df, col, op, val, ignorecase, rows)
+                if m is not None:
+                    new = np.zeros(n, dtype=bool)
+                    new[rows] = m
+            elif new is None:
+                m = self.getMask(df, col, op, val, ignorecase)
+                if m is not None:
+                    if b == 'OR':
+                        new = mask | m
+                    elif b == 'NOT':
+                        new = mask ^ m
+            if new is not None:
+                self.store(key, new)
+                mask = new
+            prefix = prefix + (f,)
+            if callback is not None:
+                callback(i+2, total, int(mask.sum()))
+        return mask
@@ -21,7 +21,11 @@
 
 from __future__ import absolute_import, division, print_function
 import math, time
-import os, types
+import os, types, threading
+import warnings, re, ast, io
+import zipfile, json, pickle, struct, shutil
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 import random
 import string, copy
 import numpy as np
@@ -86,6 +90,963 @@ def check_multiindex(index):
     else:
         return 0
 
+def getSortKey(s, ascending=True):
+    """Integer or float key for one column that sorts like the values,
+    missing values always last"""
+
+    values = s.values
+    if isinstance(values, np.ndarray) and values.dtype.kind in 'biu':
+        #as floats, integers above 2**53 would lose precision
+        key = values.view(np.uint8) if values.dtype.kind == 'b' else values
+        if not ascending:
+            key = ~key
+        return key
+    if isinstance(values, np.ndarray) and values.dtype.kind == 'f':
+        key = values.astype(float)
+        if not ascending:
+            key = -key
+        key[np.isnan(key)] = np.inf
+        return key
+    try:
+        codes, uniques = pd.factorize(s, sort=True)
+    except TypeError:
+        #mixed types, order the unique values by their string form
+        codes, uniques = pd.factorize(s)
+        ranks = np.argsort(np.argsort(np.array([str(u) for u in uniques]), kind='stable'))
+        codes = np.where(codes >= 0, ranks[codes], -1)
+    codes = np.asarray(codes, dtype=np.int64)
+    if not ascending:
+        codes = np.where(codes >= 0, len(uniques) - 1 - codes, codes)
+    codes[codes < 0] = len(uniques)
+    return codes
+
+def getSortOrder(df, cols, ascending=True, rows=None, callback=None):
+    """Row positions that sort a dataframe by one or more column positions
+    using a single lexsort. If rows is given only those rows are sorted
+    and their positions returned. The dataframe is not copied.
+    callback is called with (done, total) after each key column."""
+
+    if not isinstance(ascending, (list, tuple)):
+        ascending = [ascending] * len(cols)
+    keys = []
+    for c, a in zip(cols, ascending):
+        s = df.iloc[:, c]
+        if rows is not None:
+            s = s.iloc[rows]
+        keys.append(getSortKey(s, a))
+        if callback is not None:
+            callback(len(keys), len(cols)+1)
+    order = np.lexsort(keys[::-1])
+    if rows is not None:
+        return np.asarray(rows)[order]
+    return order
+
+def getArrowSortOrder(table, cols, ascending=True, rows=None, callback=None):
+    """Row positions that sort an arrow table by column positions, as for
+    getSortOrder. Only the key columns are read, so a memory mapped table
+    is not loaded."""
+
+    import pyarrow.compute as pc
+    if not isinstance(ascending, (list, tuple)):
+        ascending = [ascending] * len(cols)
+    names = ['k%s' %i for i in range(len(cols))]
+    keys = table.select(list(cols)).rename_columns(names)
+    if rows is not None:
+        keys = keys.take(rows)
+    if callback is not None:
+        callback(1, 2)
+    order = pc.sort_indices(keys, sort_keys=[(n, 'ascending' if a else 'descending')
+                                             for n, a in zip(names, ascending)])
+    order = order.to_numpy().astype(np.int64)
+    if rows is not None:
+        return np.asarray(rows)[order]
+    return order
+
+def getCategoryColumns(df, maxfraction=0.5, sample=100000):
+    """Names of text columns with few distinct values for their length,
+    that would be smaller and faster stored as categories. Large columns
+    are first checked on a sample of rows."""
+
+    n = len(df)
+    cols = []
+    if n == 0:
+        return cols
+    for c in df.columns[~df.columns.duplicated()]:
+        s = df[c]
+        if s.dtype != object:
+            continue
+        try:
+            if n > sample and s.sample(sample, random_state=1).nunique() > maxfraction*sample:
+                continue
+            if s.nunique() <= maxfraction*n:
+                cols.append(c)
+        except TypeError:
+            #unhashable values
+            continue
+    return cols
+
+def categorize(df, columns=None, maxfraction=0.5):
+    """Convert low cardinality text columns to category in place.
+    Returns the names of the converted columns."""
+
+    if columns is None:
+        columns = getCategoryColumns(df, maxfraction)
+    for c in columns:
+        df[c] = df[c].astype('category')
+    return columns
+
+def setCell(df, i, j, value):
+    """Set a value by position in place. A new value is added to the
+    categories of a category column, other columns that cannot hold the
+    value, e.g. Arrow strings, are converted to object first."""
+
+    x = df.iloc[:, j]
+    if isinstance(x.dtype, pd.CategoricalDtype):
+        if not pd.isna(value) and value not in x.cat.categories:
+            df.isetitem(j, x.cat.add_categories([value]))
+    try:
+        df.iloc[i, j] = value
+    except (TypeError, ValueError):
+        df.isetitem(j, x.astype(object))
+        df.iloc[i, j] = value
+    return
+
+def replaceValues(x, pat, repl):
+    """Regular expression replace in a column. Category columns are
+    replaced in their categories and stay categories."""
+
+    if not isinstance(x.dtype, pd.CategoricalDtype):
+        return x.replace(pat, repl, regex=True)
+    cats = x.cat.categories
+    new = cats.to_series().replace(pat, repl, regex=True).values
+    if new.dtype == cats.dtype and (new == cats.values).all():
+        return x
+    #replaced values may be the same so the categories are rebuilt
+    return x.map(dict(zip(cats, new))).astype('category')
+
+def replaceColumns(df, pat, repl):
+    """Regular expression replace in all columns of a frame, see
+    replaceValues. Returns a dict of column position -> new column for only
+    the columns that are changed."""
+
+    new = {}
+    for j in range(len(df.columns)):
+        x = df.iloc[:, j]
+        y = replaceValues(x, pat, repl)
+        if y is not x and not y.equals(x):
+            new[j] = y
+    return new
+
+def replaceFrame(df, pat, repl):
+    """Regular expression replace in all columns of a frame, see replaceValues"""
+
+    df = df.copy(deep=False)
+    for j, x in replaceColumns(df, pat, repl).items():
+        df.isetitem(j, x)
+    return df
+
+def optimizeColumn(s, maxfraction=0.5):
+    """Smaller dtype for a column if it can hold the same values. Integers
+    are downcast, floats become float32 only where no precision is lost and
+    text becomes category or, if pyarrow is installed, Arrow strings.
+    Returns the converted column or None."""
+
+    kind = s.dtype.kind
+    values = s.values
+    if isinstance(values, np.ndarray) and kind in 'iu':
+        x = pd.to_numeric(s, downcast='unsigned' if kind == 'u' else 'integer')
+    elif isinstance(values, np.ndarray) and kind == 'f' and values.itemsize > 4:
+        f = values.astype(np.float32)
+        with np.errstate(over='ignore', invalid='ignore'):
+            same = np.array_equal(f.astype(values.dtype), values, equal_nan=True)
+        if not same:
+            return
+        x = pd.Series(f, index=s.index, name=s.name)
+    elif s.dtype == object:
+        if len(getCategoryColumns(s.to_frame(), maxfraction)) > 0:
+            x = s.astype('category')
+        elif pd.api.types.infer_dtype(s, skipna=True) == 'string':
+            try:
+                x = s.astype('string[pyarrow]')
+            except ImportError:
+                return
+        else:
+            return
+    else:
+        return
+    if x.dtype == s.dtype:
+        return
+    return x
+
+def getOptimizedColumns(df, maxfraction=0.5):
+    """
+    Find the columns of a dataframe that can be stored in less memory.
+    Returns:
+        a dict of converted columns by name and a dataframe reporting the
+        memory of each before and after
+    """
+
+    new = {}
+    report = []
+    for c in df.columns[~df.columns.duplicated()]:
+        s = df[c]
+        x = optimizeColumn(s, maxfraction)
+        if x is None:
+            continue
+        before = s.memory_usage(index=False, deep=True)
+        after = x.memory_usage(index=False, deep=True)
+        if after >= before:
+            continue
+        new[c] = x
+        report.append([c, str(s.dtype), str(x.dtype), before, after])
+    report = pd.DataFrame(report, columns=['column','from','to','before','after'])
+    report['saving'] = report.before - report.after
+    return new, report
+
+def packFrame(df):
+    """Serialize a dataframe as an Arrow IPC stream, which is much faster to
+    pass between processes than a pickled frame with text columns. Returns
+    the frame unchanged if pyarrow is missing or cannot convert it."""
+
+    try:
+        import pyarrow as pa
+        table = pa.Table.from_pandas(df)
+    except Exception:
+        return df
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def unpackFrame(data):
+    """Dataframe from packFrame"""
+
+    if isinstance(data, pd.DataFrame):
+        return data
+    import pyarrow as pa
+    table = pa.ipc.open_stream(pa.py_buffer(data)).read_all()
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+def readPacked(filename, kwargs={}):
+    """Read a csv file in a worker process and pack it for the parent"""
+
+    return packFrame(pd.read_csv(filename, **kwargs))
+
+def countRows(filename, blocksize=1<<20):
+    """Upper bound on the data rows of a csv file from its line count"""
+
+    lines = 0
+    last = b'\n'
+    with open(filename, 'rb') as f:
+        while True:
+            block = f.read(blocksize)
+            if not block:
+                break
+            lines += block.count(b'\n')
+            last = block[-1:]
+    if last != b'\n':
+        lines += 1
+    return max(lines-1, 0)
+
+def mergeTypes(a, b):
+    """Common dtype of two column dtypes, numbers are promoted and any
+    other mismatch is object"""
+
+    if a == b:
+        return a
+    if a.kind in 'iuf' and b.kind in 'iuf':
+        return np.result_type(a, b)
+    return np.dtype(object)
+
+def getSchema(filenames, nrows=1000, **kwargs):
+    """
+    Column names and dtypes shared by csv files, from the first rows of each.
+    Columns are in order of first appearance. Columns missing from some files
+    are made float or object so they can hold missing values.
+    """
+
+    schema = OrderedDict()
+    counts = {}
+    for f in filenames:
+        df = pd.read_csv(f, nrows=nrows, **kwargs)
+        for c in df.columns:
+            dtype = df[c].dtype
+            if not isinstance(dtype, np.dtype):
+                dtype = np.dtype(object)
+            if c in schema:
+                schema[c] = mergeTypes(schema[c], dtype)
+            else:
+                schema[c] = dtype
+            counts[c] = counts.get(c, 0) + 1
+    for c in schema:
+        if counts[c] < len(filenames):
+            schema[c] = missingType(schema[c])
+    return schema
+
+def missingType(dtype):
+    """dtype able to hold missing values"""
+
+    if dtype.kind in 'iu':
+        return np.dtype(float)
+    elif dtype.kind == 'b':
+        return np.dtype(object)
+    return dtype
+
+class FrameBuilder(object):
+    """
+    Joins dataframes into preallocated column arrays so that the parts and a
+    joined copy are never all held at once. Each part is cast to the column
+    types as it is added. A column is only widened (integer to float, or to
+    object) when a part has values that its type cannot hold.
+    """
+    def __init__(self, schema, rows=0):
+        self.size = max(rows, 1)
+        self.rows = 0
+        self.buffers = OrderedDict()
+        for c in schema:
+            self.buffers[c] = np.empty(self.size, dtype=schema[c])
+        return
+
+    def widen(self, c, dtype):
+        """Change the type of a column buffer"""
+
+        buf = self.buffers[c]
+        new = np.empty(self.size, dtype=dtype)
+        if dtype == object and buf.dtype.kind == 'M':
+            new[:self.rows] = pd.Series(buf[:self.rows]).astype(object).values
+        else:
+            new[:self.rows] = buf[:self.rows]
+        self.buffers[c] = new
+        return
+
+    def grow(self, rows):
+        """Make room for more rows"""
+
+        size = max(rows, int(self.size*1.5))
+        for c, buf in self.buffers.items():
+            new = np.empty(size, dtype=buf.dtype)
+            new[:self.rows] = buf[:self.rows]
+            self.buffers[c] = new
+        self.size = size
+        return
+
+    def castValues(self, s, dtype):
+        """Values of a series as dtype, None if they do not fit"""
+
+        kind = dtype.kind
+        if kind == 'O':
+            return s.astype(object).values
+        values = s.values
+        if not isinstance(values, np.ndarray):
+            return
+        k = values.dtype.kind
+        if kind == 'f' and k in 'iufb':
+            return values.astype(dtype)
+        elif kind in 'iu' and k in 'iu':
+            return values.astype(dtype)
+        elif kind == 'b' and k == 'b':
+            return values
+        elif kind == 'M' and k == 'M':
+            return values.astype(dtype)
+        return
+
+    def append(self, df):
+        """Add the rows of a dataframe, new columns are added as needed"""
+
+        m = len(df)
+        start, end = self.rows, self.rows + m
+        if end > self.size:
+            self.grow(end)
+        for c in df.columns:
+            if c not in self.buffers:
+                dtype = df[c].dtype
+                if not isinstance(dtype, np.dtype):
+                    dtype = np.dtype(object)
+                if start > 0:
+                    dtype = missingType(dtype)
+                self.buffers[c] = np.empty(self.size, dtype=dtype)
+                self.fillMissing(c, 0, start)
+        for c, buf in self.buffers.items():
+            if c not in df.columns:
+                self.fillMissing(c, start, end)
+                continue
+            s = df[c]
+            values = self.castValues(s, buf.dtype)
+            if values is None:
+                if buf.dtype.kind in 'iu' and s.dtype.kind == 'f':
+                    self.widen(c, np.dtype(float))
+                else:
+                    self.widen(c, np.dtype(object))
+                values = self.castValues(s, self.buffers[c].dtype)
+            self.buffers[c][start:end] = values
+        self.rows = end
+        return
+
+    def fillMissing(self, c, start, end):
+
+        if start == end:
+            return
+        buf = self.buffers[c]
+        if buf.dtype.kind in 'iub':
+            self.widen(c, missingType(buf.dtype))
+            buf = self.buffers[c]
+        if buf.dtype.kind == 'M':
+            buf[start:end] = np.datetime64('NaT')
+        else:
+            buf[start:end] = np.nan
+        return
+
+    def getFrame(self):
+        """The joined dataframe. Each buffer is released once it is
+        copied into the frame."""
+
+        df = pd.DataFrame(index=pd.RangeIndex(self.rows))
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', pd.errors.PerformanceWarning)
+            for c in list(self.buffers):
+                df[c] = self.buffers.pop(c)[:self.rows]
+        return df
+
+def readFiles(filenames, processes=None, callback=None, concat=False, **kwargs):
+    """
+    Read csv files in parallel worker processes. Frames are taken in file
+    order with a few files read ahead, so if concat is True only those are
+    held while the joined table is built.
+    Args:
+        filenames: list of files
+        processes: number of processes, all cores if None
+        callback: called with (done, total) as each file is read, raising
+        an exception from it stops the remaining reads
+        concat: join the files into one dataframe with a common schema
+        kwargs: passed to read_csv
+    Returns:
+        list of dataframes in the order of filenames, or one dataframe
+    """
+
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+    n = len(filenames)
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = max(min(processes, n), 1)
+    frames = [None] * n
+    if concat == True:
+        schema = getSchema(filenames, **kwargs)
+        builder = FrameBuilder(schema, sum(countRows(f) for f in filenames))
+    futures = []
+    #start fresh interpreters, forking copies the Qt threads of the app
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context) as executor:
+        try:
+            for i in range(n):
+                while len(futures) < min(n, i + 2*processes):
+                    f = filenames[len(futures)]
+                    futures.append(executor.submit(readPacked, f, kwargs))
+                df = unpackFrame(futures[i].result())
+                futures[i] = None
+                if concat == True:
+                    builder.append(df)
+                else:
+                    frames[i] = df
+                del df
+                if callback is not None:
+                    callback(i+1, n)
+        except BaseException:
+            for future in futures:
+                if future is not None:
+                    future.cancel()
+            raise
+    if concat == True:
+        return builder.getFrame()
+    return frames
+
+def getAvailableMemory():
+    """Bytes of memory available to the process without swapping, None if
+    not known on this platform"""
+
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return
+
+#columnar file formats read with pyarrow
+COLUMNAR = {'.parquet':'parquet', '.pq':'parquet', '.feather':'ipc',
+            '.arrow':'ipc', '.ipc':'ipc'}
+
+def getColumnarFormat(filename):
+    """Arrow dataset format of a file from its extension"""
+
+    ext = os.path.splitext(filename)[1].lower()
+    return COLUMNAR.get(ext, 'parquet')
+
+def splitConditions(text):
+    """Split conditions on 'and', except inside quoted strings, backticks
+    or brackets, e.g. "region == 'Bosnia and Herzegovina' and x > 1" """
+
+    parts = []
+    start = depth = 0
+    token = r"""'(?:\\.|[^'\\])*'|"(?:\\.|[^"\\])*"|`[^`]*`|[\[\(]|[\]\)]|\s+and\s+"""
+    for m in re.finditer(token, text):
+        t = m.group()
+        if t in ('[', '('):
+            depth += 1
+        elif t in (']', ')'):
+            depth = max(depth - 1, 0)
+        elif t.strip() == 'and' and depth == 0:
+            parts.append(text[start:m.start()])
+            start = m.end()
+    parts.append(text[start:])
+    return parts
+
+def getArrowFilter(text):
+    """
+    Arrow dataset expression from conditions joined by 'and', e.g.
+    "year >= 2020 and region == 'EU'" or "code in [1,2]". Values are python
+    literals, anything else is taken as a string.
+    """
+
+    import pyarrow.dataset as ds
+    expr = None
+    for part in splitConditions(text.strip()):
+        m = re.match(r'^\s*(`[^`]+`|[^\s=!<>]+)\s*(==|!=|>=|<=|>|<|\s+in\s+)\s*(.+?)\s*$', part)
+        if m is None:
+            raise ValueError('could not read filter: %s' %part)
+        col, op, val = m.groups()
+        col = col.strip('`')
+        op = op.strip()
+        try:
+            val = ast.literal_eval(val)
+        except (ValueError, SyntaxError):
+            pass
+        f = ds.field(col)
+        if op == 'in':
+            e = f.isin(list(val))
+        elif op == '==':
+            e = f == val
+        elif op == '!=':
+            e = f != val
+        elif op == '>=':
+            e = f >= val
+        elif op == '<=':
+            e = f <= val
+        elif op == '>':
+            e = f > val
+        else:
+            e = f < val
+        if expr is None:
+            expr = e
+        else:
+            expr = expr & e
+    return expr
+
+def getColumnarSchema(filename):
+    """Column names of a parquet or arrow file, without reading the data"""
+
+    import pyarrow.dataset as ds
+    dataset = ds.dataset(filename, format=getColumnarFormat(filename))
+    return [n for n in dataset.schema.names if not n.startswith('__index_level_')]
+
+def readColumnar(filename, columns=None, filter=None, callback=None):
+    """
+    Read a parquet, feather or arrow IPC file with pyarrow using all cores.
+    Args:
+        columns: list of columns to read, all if None
+        filter: expression string for getArrowFilter. For parquet, row
+        groups whose statistics cannot match are skipped
+        callback: called with (rows done, total rows) for each batch
+    Returns:
+        dataframe
+    """
+
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    dataset = ds.dataset(filename, format=getColumnarFormat(filename))
+    if filter is not None and filter.strip() != '':
+        filter = getArrowFilter(filter)
+    else:
+        filter = None
+    if columns is not None and len(columns) == 0:
+        columns = None
+    if columns is not None:
+        #keep a stored index
+        meta = dataset.schema.pandas_metadata or {}
+        columns = list(columns) + [c for c in meta.get('index_columns', [])
+                                   if isinstance(c, str) and c not in columns]
+    scanner = dataset.scanner(columns=columns, filter=filter, use_threads=True)
+    total = dataset.count_rows()
+    batches = []
+    done = 0
+    for batch in scanner.to_batches():
+        batches.append(batch)
+        done += batch.num_rows
+        if callback is not None:
+            callback(done, total)
+    table = pa.Table.from_batches(batches, schema=scanner.projected_schema)
+    del batches
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+def writeColumnar(df, filename, compression='zstd', level=None, row_group_size=1000000):
+    """
+    Write a dataframe as parquet, or as feather/arrow IPC depending on the
+    file extension. Arrow IPC buffers are compressed on several threads.
+    Parquet is written in row groups with statistics so that filtered reads
+    can skip them.
+    """
+
+    import pyarrow as pa
+    table = pa.Table.from_pandas(df)
+    level = getCompressionLevel(compression, level)
+    if getColumnarFormat(filename) == 'ipc':
+        import pyarrow.feather as feather
+        feather.write_feather(table, filename, compression=compression,
+                              compression_level=level)
+    else:
+        import pyarrow.parquet as pq
+        if compression == 'uncompressed':
+            compression = 'none'
+        pq.write_table(table, filename, compression=compression,
+                       compression_level=level, row_group_size=row_group_size)
+    return
+
+#codecs for project files and exports, provided by pyarrow
+CODECS = ['zstd', 'lz4', 'uncompressed']
+#compressed file extensions and their codecs
+CODEC_EXTENSIONS = {'.zst':'zstd', '.lz4':'lz4', '.gz':'gzip'}
+
+def checkCodec(codec):
+    """Raise an error if a codec is not in the installed pyarrow build"""
+
+    if codec in [None, 'uncompressed']:
+        return
+    import pyarrow as pa
+    if not pa.Codec.is_available(codec):
+        raise ValueError('%s compression is not available in this pyarrow build, '
+                         'install pyarrow from pip or conda-forge or use another '
+                         'codec' %codec)
+    return
+
+def getCompressionLevel(codec, level=None):
+    """Level within the range of the codec, None for the codec default"""
+
+    if not level or codec not in ['zstd', 'lz4', 'gzip']:
+        return
+    import pyarrow as pa
+    return min(max(int(level), pa.Codec.minimum_compression_level(codec)),
+               pa.Codec.maximum_compression_level(codec))
+
+class CompressedWriter(io.RawIOBase):
+    """
+    Binary file object that compresses what is written to it in blocks on
+    a pool of threads and writes the blocks to fileobj in order. Each block
+    is a complete zstd, lz4 or gzip frame, concatenated frames are read back
+    as one stream by the usual tools.
+    Args:
+        fileobj: binary file object, not closed by close()
+        codec: 'zstd', 'lz4' or 'gzip'
+        level: compression level, codec default if None
+        blocksize: uncompressed bytes per block
+        threads: number of threads, all cores if None
+        callback: called with (bytes in, bytes out) as each block is written
+    """
+    def __init__(self, fileobj, codec='zstd', level=None, blocksize=1<<22,
+                 threads=None, callback=None):
+        super(CompressedWriter, self).__init__()
+        checkCodec(codec)
+        self.fileobj = fileobj
+        self.codec = codec
+        self.level = getCompressionLevel(codec, level)
+        #codecs such as gzip keep a stream and are used by one thread each
+        self.codecs = threading.local()
+        self.blocksize = blocksize
+        if threads is None:
+            threads = os.cpu_count() or 1
+        self.pool = ThreadPoolExecutor(threads)
+        #blocks being compressed, bounded so memory stays small
+        self.pending = deque()
+        self.maxpending = 2 * threads
+        self.buffer = bytearray()
+        self.callback = callback
+        return
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer += data
+        bs = self.blocksize
+        while len(self.buffer) >= bs:
+            self.submit(bytes(self.buffer[:bs]))
+            del self.buffer[:bs]
+        return len(data)
+
+    def compress(self, block):
+        """Compress a block with the codec of the calling thread"""
+
+        codec = getattr(self.codecs, 'codec', None)
+        if codec is None:
+            import pyarrow as pa
+            codec = self.codecs.codec = pa.Codec(self.codec, compression_level=self.level)
+        return codec.compress(block, asbytes=True)
+
+    def submit(self, block):
+        self.pending.append((len(block), self.pool.submit(self.compress, block)))
+        while len(self.pending) > self.maxpending:
+            self.writeBlock()
+        return
+
+    def writeBlock(self):
+        """Write the oldest compressed block"""
+
+        n, future = self.pending.popleft()
+        out = future.result()
+        self.fileobj.write(out)
+        if self.callback is not None:
+            self.callback(n, len(out))
+        return
+
+    def close(self):
+        if self.closed:
+            return
+        if len(self.buffer) > 0:
+            self.submit(bytes(self.buffer))
+            self.buffer = bytearray()
+        while len(self.pending) > 0:
+            self.writeBlock()
+        self.pool.shutdown()
+        super(CompressedWriter, self).close()
+        return
+
+class Throughput(object):
+    """Counts bytes processed and formats the rate for progress messages"""
+    def __init__(self, callback=None):
+        self.start = time.time()
+        self.bytes = 0
+        self.callback = callback
+        return
+
+    def add(self, n):
+        self.bytes += n
+        if self.callback is not None:
+            self.callback(self.getMessage())
+        return
+
+    def getMessage(self):
+        mb = self.bytes/1048576
+        t = max(time.time()-self.start, 1e-6)
+        return '%.1f MB, %.1f MB/s' %(mb, mb/t)
+
+def writeCSV(df, filename, level=None, callback=None):
+    """
+    Write a dataframe to csv. If the file name ends in .zst, .lz4 or .gz
+    the text is compressed in blocks on all cores.
+    Args:
+        level: compression level, codec default if None
+        callback: called with (bytes in, bytes out) for each block
+    """
+
+    ext = os.path.splitext(filename)[1].lower()
+    if ext not in CODEC_EXTENSIONS:
+        df.to_csv(filename)
+        return
+    with open(filename, 'wb') as f:
+        writer = CompressedWriter(f, CODEC_EXTENSIONS[ext], level, callback=callback)
+        text = io.TextIOWrapper(writer, encoding='utf-8', newline='')
+        df.to_csv(text, chunksize=100000)
+        text.close()
+    return
+
+def getSheetTable(df):
+    """Arrow table for storing a sheet in a project archive, None if the
+    frame would not survive the round trip, e.g. mixed type columns or
+    non string column names"""
+
+    try:
+        import pyarrow as pa
+        if not all(type(c) is str for c in df.columns) or df.columns.duplicated().any():
+            return
+        return pa.Table.from_pandas(df)
+    except Exception:
+        return
+
+def writeSheet(df, zf, name, compression='zstd', level=None):
+    """
+    Write a sheet to a zip archive. Frames are stored as arrow IPC files
+    with their buffers compressed on several threads, or pickled and block
+    compressed if they cannot be converted. The member itself is not
+    compressed by zip so it can be memory mapped when read.
+    Args:
+        df: dataframe
+        zf: open ZipFile
+        name: member name without extension
+        compression: one of CODECS
+    Returns:
+        the member name and format
+    """
+
+    checkCodec(compression)
+    table = getSheetTable(df)
+    if table is None:
+        ext = {'zstd':'.zst', 'lz4':'.lz4'}.get(compression)
+        name = name + '.pickle' + (ext or '')
+        with zf.open(name, 'w', force_zip64=True) as f:
+            if ext is None:
+                pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+            else:
+                with CompressedWriter(f, compression, level) as writer:
+                    pickle.dump(df, writer, protocol=pickle.HIGHEST_PROTOCOL)
+        return name, 'pickle'
+    import pyarrow.feather as feather
+    name = name + '.arrow'
+    with zf.open(name, 'w', force_zip64=True) as f:
+        feather.write_feather(table, f, compression=compression,
+                              compression_level=getCompressionLevel(compression, level))
+    return name, 'arrow'
+
+def getMemberBuffer(filename, name):
+    """Contents of a zip archive member as an arrow buffer. Stored members
+    are memory mapped rather than read."""
+
+    import pyarrow as pa
+    with zipfile.ZipFile(filename) as zf:
+        info = zf.getinfo(name)
+        if info.compress_type != zipfile.ZIP_STORED:
+            return pa.py_buffer(zf.read(name))
+    source = pa.memory_map(filename, 'r')
+    #skip the local file header
+    header = source.read_at(30, info.header_offset)
+    namelen, extralen = struct.unpack('<HH', header[26:30])
+    start = info.header_offset + 30 + namelen + extralen
+    source.seek(start)
+    return source.read_buffer(info.file_size)
+
+def readSheet(filename, name, format='arrow'):
+    """Read a sheet written by writeSheet from a project archive"""
+
+    buf = getMemberBuffer(filename, name)
+    if format == 'pickle':
+        ext = os.path.splitext(name)[1]
+        if ext in CODEC_EXTENSIONS:
+            import pyarrow as pa
+            stream = pa.input_stream(buf, compression=CODEC_EXTENSIONS[ext])
+            return pickle.load(io.BufferedReader(stream))
+        return pickle.loads(buf)
+    import pyarrow as pa
+    table = pa.ipc.open_file(buf).read_all()
+    del buf
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+def readArchiveObject(filename, name):
+    """Unpickle a member of a project archive"""
+
+    with zipfile.ZipFile(filename) as zf:
+        return pickle.loads(zf.read(name))
+
+def readManifest(filename):
+    """Manifest of a project archive as a dict"""
+
+    with zipfile.ZipFile(filename) as zf:
+        return json.loads(zf.read('manifest.json'))
+
+def copyMember(src, zf, name, newname):
+    """Copy a member from the archive file src into the open ZipFile zf
+    without decoding it"""
+
+    with zipfile.ZipFile(src) as zin:
+        with zin.open(name) as fin, zf.open(newname, 'w', force_zip64=True) as fout:
+            shutil.copyfileobj(fin, fout, 1<<22)
+    return
+
+def syncFile(filename):
+    """Flush a file to disk"""
+
+    with open(filename, 'rb+') as f:
+        os.fsync(f.fileno())
+    return
+
+def beginAppend(filename):
+    """
+    Start appending to a zip archive after its directory, which is left as
+    it is until the append is complete. The current size is recorded in a
+    journal file so that recoverArchive can undo an append that was
+    interrupted, e.g. by a crash or a full disk.
+    Returns:
+        the offset to write from
+    """
+
+    size = os.path.getsize(filename)
+    with open(filename + '.journal', 'w') as f:
+        json.dump({'size': size}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    return size
+
+def endAppend(filename):
+    """Mark an append started by beginAppend as complete"""
+
+    syncFile(filename)
+    os.remove(filename + '.journal')
+    return
+
+def recoverArchive(filename):
+    """Undo an append to an archive that did not complete, see beginAppend.
+    Returns True if the archive was restored."""
+
+    journal = filename + '.journal'
+    if not os.path.exists(journal):
+        return False
+    try:
+        with open(journal) as f:
+            size = json.load(f)['size']
+    except (ValueError, KeyError):
+        #the journal is written before anything is appended
+        size = None
+    if size is not None and os.path.getsize(filename) > size:
+        with open(filename, 'rb+') as f:
+            f.truncate(size)
+            os.fsync(f.fileno())
+    os.remove(journal)
+    return True
+
+def openAppend(filename, keep):
+    """
+    Open a zip archive to append members after its directory, see
+    beginAppend. Only the members named in keep are listed in the new
+    directory written when the file is closed. zipfile has no public way to
+    remove members, so its directory is replaced here and None is returned
+    if that is not possible with this version of zipfile.
+    Returns:
+        an open ZipFile or None
+    """
+
+    zf = zipfile.ZipFile(filename, 'a', zipfile.ZIP_STORED, allowZip64=True)
+    if (not isinstance(getattr(zf, 'filelist', None), list)
+        or not isinstance(getattr(zf, 'NameToInfo', None), dict)
+        or not isinstance(getattr(zf, 'start_dir', None), int)):
+        zf.close()
+        return
+    zf.filelist = [i for i in zf.filelist if i.filename in keep]
+    zf.NameToInfo = {i.filename: i for i in zf.filelist}
+    zf.start_dir = beginAppend(filename)
+    return zf
+
+def abortAppend(zf, filename):
+    """Close an archive opened with openAppend and remove everything
+    appended to it"""
+
+    try:
+        zf.close()
+    except Exception:
+        pass
+    recoverArchive(filename)
+    return
+
 def getAttributes(obj):
     """Get non hidden and built-in type object attributes that can be persisted"""
 
@@ -0,0 +1,52 @@
+import os
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import pytest
+
+@pytest.fixture(scope='session')
+def qapp():
+    from tablexplore.qt import QApplication
+    app = QApplication.instance()
+    if app is None:
+        app = QApplication([])
+    return app
+
+def wait(app, cond, timeout=30):
+    """Process events until cond is true"""
+
+    import time
+    t = time.time()
+    while not cond() and time.time() - t < timeout:
+        app.processEvents()
+        time.sleep(.01)
+    return cond()
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    """Keep settings and recovery files of the app in a temp directory"""
+
+    path = tmp_path / 'config'
+    monkeypatch.setenv('XDG_CONFIG_HOME', str(path))
+    return path
+
+@pytest.fixture
+def newapp(qapp, config):
+    """Returns a function making main windows, closed after the test"""
+
+    from tablexplore.qt import QtCore
+    from tablexplore.app import Application
+    apps = []
+    def make():
+        #creating widgets while a worker thread is busy can abort offscreen
+        QtCore.QThreadPool.globalInstance().waitForDone()
+        for a in apps:
+            a.threadpool.waitForDone()
+        a = Application()
+        apps.append(a)
+        return a
+    yield make
+    QtCore.QThreadPool.globalInstance().waitForDone()
+    for a in apps:
+        a.autosavetimer.stop()
+        a.threadpool.waitForDone()
+        a.removeRecovery()
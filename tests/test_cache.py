@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+from tablexplore import core
+from tablexplore.core import DataFrameModel, DisplayCache
+
+def test_display_cache():
+    calls = []
+    def func(j, start, end):
+        calls.append((j, start))
+        return pd.Series(np.arange(start, end) * (j+1))
+    cache = DisplayCache(blocksize=10, maxblocks=2)
+    assert cache.get(3, 0, func) == '3'
+    assert cache.get(5, 0, func) == '5'
+    assert cache.get(12, 1, func) == '24'
+    assert calls == [(0, 0), (1, 10)]
+    #the least recently used block is dropped
+    cache.get(7, 0, func)
+    cache.get(25, 0, func)
+    assert list(cache.blocks) == [(0, 0), (0, 2)]
+    cache.clear(0)
+    assert list(cache.blocks) == []
+
+def test_display_after_edit():
+    model = DataFrameModel(pd.DataFrame({'a': [1.5, 2.5], 'b': ['x', 'y']}))
+    index = model.index(1, 1)
+    assert model.data(index) == 'y'
+    model.setData(index, 'z')
+    assert model.data(index) == 'z'
+
+def test_delete_cells(qapp):
+    w = core.DataFrameWidget(dataframe=pd.DataFrame({'a': ['x', 'y', 'x']}))
+    table = w.table
+    model = table.model
+    assert model.data(model.index(0, 0)) == 'x'
+    model.strings.find(model.base, 'x')
+    table.deleteCells([0], [0], answer=True)
+    assert model.data(model.index(0, 0)) != 'x'
+    assert model.strings.find(model.base, 'x')[:,0].tolist() == [False, False, True]
+
+def test_highlight_index():
+    from tablexplore.core import HighlightIndex
+    h = HighlightIndex()
+    mask = np.zeros((5, 2), dtype=bool)
+    mask[[1, 3], 0] = True
+    h.setMask('search', mask)
+    h.setLayer('rules', {0: [3], 1: [0]}, color='red')
+    assert h.count() == 4 and h.count('search') == 2
+    assert h.getColor(1, 0) == HighlightIndex.colors['search']
+    #later layers are drawn on top
+    assert h.getColor(3, 0) == 'red'
+    assert h.getColor(2, 0) is None
+    #rows 3 and 1 are kept, in that order
+    h.remap([3, 1])
+    assert h.getColor(0, 0) == 'red' and h.getColor(1, 0) == HighlightIndex.colors['search']
+    assert h.count('rules') == 1
+    h.removeLayer('rules')
+    assert h.getColor(0, 0) == HighlightIndex.colors['search']
+
+def test_highlight_sorted_view():
+    """Highlights stay on their cells when the view is sorted"""
+
+    model = DataFrameModel(pd.DataFrame({'a': [3, 1, 2]}))
+    model.highlights.setLayer('search', {0: [0]})
+    role = core.QtCore.Qt.BackgroundRole
+    model.sort(0)
+    colors = [model.data(model.index(i, 0), role).name() for i in range(3)]
+    assert [c != colors[0] for c in colors] == [False, False, True]
+    #reordering the frame itself moves the highlights with it
+    model.df
+    assert model.highlights.getColor(2, 0) is not None
+
+def test_header_heights(qapp, monkeypatch):
+    """Cached header heights follow resizes, renames and model changes"""
+
+    w = core.DataFrameWidget(dataframe=pd.DataFrame({'a': [1], 'b': [2]}))
+    w.filter()
+    table = w.table
+    hh = table.horizontalHeader()
+    short = hh.headerHeight()
+    name = ' '.join(['long']*20)
+    monkeypatch.setattr(core.QInputDialog, 'getText',
+                        staticmethod(lambda *args, **kwargs: (name, True)))
+    table.renameColumn('a')
+    assert hh.heights[0] > short
+    assert hh.headerHeight() == hh.heights[0]
+    assert w.filterdialog.column_w.item(0).text() == name
+    hh.resizeSection(0, 2000)
+    assert hh.headerHeight() == short
+    #signals of a replaced model no longer clear the cache
+    old = table.model
+    table.setDataModel(DataFrameModel(pd.DataFrame({'c': [1]})))
+    hh.headerHeight()
+    old.beginResetModel()
+    old.endResetModel()
+    assert hh.maxheight is not None
@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+from tablexplore import util, search
+from tablexplore.core import DataFrameModel
+
+def getModel():
+    df = pd.DataFrame({'a': ['x', 'y', 'x', 'y'], 'b': [1, 2, 3, 4]})
+    util.categorize(df, ['a'])
+    return DataFrameModel(df)
+
+def test_edit_category_new_value():
+    model = getModel()
+    assert model.setData(model.index(0, 0), 'z') == True
+    x = model.base['a']
+    assert isinstance(x.dtype, pd.CategoricalDtype)
+    assert x.tolist() == ['z', 'y', 'x', 'y']
+
+def test_edit_category_sorted_view():
+    model = getModel()
+    model.sort(1, ascending=False)
+    model.setData(model.index(0, 0), 'w')
+    assert model.base['a'].tolist() == ['x', 'y', 'x', 'w']
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+from tablexplore import util
+
+pytest.importorskip('pyarrow')
+
+@pytest.fixture
+def frame():
+    n = 1000
+    return pd.DataFrame({'year': np.arange(n) % 10 + 2015,
+                         'region': np.where(np.arange(n) % 3 == 0, 'Bosnia and Herzegovina', 'EU'),
+                         'x': np.arange(n, dtype=float)})
+
+def test_split_conditions():
+    assert util.splitConditions("region == 'Bosnia and Herzegovina' and x > 1") == \
+        ["region == 'Bosnia and Herzegovina'", 'x > 1']
+    assert util.splitConditions('a in ["x and y", "z"] and `b and c` < 2') == \
+        ['a in ["x and y", "z"]', '`b and c` < 2']
+    assert util.splitConditions('brand == Band') == ['brand == Band']
+
+@pytest.mark.parametrize('ext', ['.parquet', '.arrow'])
+def test_columnar_round_trip(frame, tmp_path, ext):
+    fn = str(tmp_path / ('data' + ext))
+    util.writeColumnar(frame, fn, row_group_size=100)
+    assert util.getColumnarSchema(fn) == ['year', 'region', 'x']
+    pd.testing.assert_frame_equal(util.readColumnar(fn), frame)
+    df = util.readColumnar(fn, columns=['x'])
+    assert list(df.columns) == ['x']
+
+def test_read_filtered(frame, tmp_path):
+    fn = str(tmp_path / 'data.parquet')
+    util.writeColumnar(frame, fn, row_group_size=100)
+    df = util.readColumnar(fn, filter="region == 'Bosnia and Herzegovina' and year >= 2020")
+    expected = frame[(frame.region == 'Bosnia and Herzegovina') & (frame.year >= 2020)]
+    assert list(df.x) == list(expected.x)
+    df = util.readColumnar(fn, filter='year in [2015, 2016]')
+    assert set(df.year) == {2015, 2016}
+    with pytest.raises(ValueError):
+        util.getArrowFilter('year')
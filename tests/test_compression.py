@@ -0,0 +1,58 @@
+import io
+import zipfile
+import numpy as np
+import pandas as pd
+import pytest
+from tablexplore import util
+
+pa = pytest.importorskip('pyarrow')
+
+@pytest.fixture
+def frame():
+    n = 5000
+    return pd.DataFrame({'a': np.arange(n), 'b': np.random.random(n),
+                         'c': ['t%s' %(i % 50) for i in range(n)]})
+
+@pytest.mark.parametrize('codec', ['zstd', 'lz4', 'gzip'])
+def test_compressed_writer(codec):
+    """Blocks compressed on several threads read back as one stream"""
+
+    data = b''.join(b'line %d\n' %i for i in range(100000))
+    f = io.BytesIO()
+    sizes = []
+    with util.CompressedWriter(f, codec, blocksize=1<<16, threads=4,
+                               callback=lambda i, o: sizes.append(i)) as w:
+        w.write(data)
+    assert sum(sizes) == len(data) and len(sizes) > 1
+    stream = pa.input_stream(pa.py_buffer(f.getvalue()), compression=codec)
+    assert stream.read() == data
+
+def test_codec_missing(monkeypatch):
+    """A codec left out of the pyarrow build gives a clear error"""
+
+    class Codec(object):
+        is_available = staticmethod(lambda codec: False)
+    monkeypatch.setattr(pa, 'Codec', Codec)
+    with pytest.raises(ValueError, match='not available'):
+        util.CompressedWriter(io.BytesIO(), 'zstd')
+
+@pytest.mark.parametrize('ext', ['.csv', '.csv.zst', '.csv.lz4', '.csv.gz'])
+def test_write_csv(frame, tmp_path, ext):
+    fn = str(tmp_path / ('data' + ext))
+    util.writeCSV(frame, fn, level=3)
+    codec = util.CODEC_EXTENSIONS.get(ext[4:])
+    with pa.input_stream(fn, compression=codec) as f:
+        df = pd.read_csv(io.BytesIO(f.read()), index_col=0)
+    pd.testing.assert_frame_equal(df, frame)
+
+@pytest.mark.parametrize('codec', util.CODECS)
+def test_sheet_round_trip(frame, tmp_path, codec):
+    fn = str(tmp_path / 'p.zip')
+    #mixed types and non string names are pickled
+    mixed = pd.DataFrame({0: [1, 'a', 2.5], 1: [None, 'b', 'c']})
+    with zipfile.ZipFile(fn, 'w', zipfile.ZIP_STORED) as zf:
+        a = util.writeSheet(frame, zf, 'sheets/0', codec, 3)
+        b = util.writeSheet(mixed, zf, 'sheets/1', codec, 3)
+    assert a[1] == 'arrow' and b[1] == 'pickle'
+    pd.testing.assert_frame_equal(util.readSheet(fn, *a), frame)
+    pd.testing.assert_frame_equal(util.readSheet(fn, *b), mixed)
@@ -0,0 +1,64 @@
+import threading
+import numpy as np
+import pandas as pd
+from tablexplore import core
+from conftest import wait
+
+def makeWidget():
+    w = core.DataFrameWidget(dataframe=pd.DataFrame({'a': np.arange(10)}))
+    w.filter()
+    return w, w.filterdialog
+
+def test_live_filter_waits(qapp):
+    """Typing filters once the keys have paused"""
+
+    w, dlg = makeWidget()
+    dlg.query_w.setText('a > 6')
+    assert dlg.timer.isActive()
+    assert w.table.filtered == False
+    assert wait(qapp, lambda: w.table.filtered)
+    assert w.table.model.rowCount() == 3
+    dlg.query_w.setText('')
+    assert wait(qapp, lambda: not w.table.filtered)
+    assert w.table.model.rowCount() == 10
+
+def test_live_filter_empty(qapp):
+    """An empty query does not filter the table"""
+
+    w, dlg = makeWidget()
+    dlg.liveApply()
+    assert w.table.filtered == False
+
+def test_close_pending(qapp):
+    """Closing the filter stops a filter that is about to be applied"""
+
+    w, dlg = makeWidget()
+    dlg.query_w.setText('a > 6')
+    w.filterdock.close()
+    assert not dlg.timer.isActive()
+    wait(qapp, lambda: False, timeout=.6)
+    assert w.table.filtered == False
+    assert w.table.model.rowCount() == 10
+
+def test_stale_filter(qapp, monkeypatch):
+    """A filter result is dropped if the table changed while it ran"""
+
+    w, dlg = makeWidget()
+    model = w.table.model
+    monkeypatch.setattr(core, 'THREADED_ROWS', 0)
+    started = threading.Event()
+    release = threading.Event()
+    apply = model.filters.apply
+    def func(*args, **kwargs):
+        started.set()
+        release.wait(10)
+        return apply(*args, **kwargs)
+    monkeypatch.setattr(model.filters, 'apply', func)
+    dlg.query_w.setText('a > 6')
+    dlg.apply()
+    assert started.wait(10)
+    model.setData(model.index(0, 0), 5)
+    release.set()
+    assert wait(qapp, lambda: not w.table.jobs.isRunning())
+    assert w.table.filtered == False
+    assert model.rowCount() == 10
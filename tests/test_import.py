@@ -0,0 +1,111 @@
+import threading
+import numpy as np
+import pandas as pd
+from tablexplore import util
+
+def makeFiles(path, n=3, rows=500):
+    files = []
+    for i in range(n):
+        df = pd.DataFrame({'a': np.arange(rows) + i*rows, 'b': np.random.random(rows),
+                           'c': ['f%s' %i] * rows})
+        fn = str(path / ('%s.csv' %i))
+        df.to_csv(fn, index=False)
+        files.append(fn)
+    return files
+
+def test_read_files(tmp_path):
+    files = makeFiles(tmp_path)
+    frames = util.readFiles(files, processes=2)
+    for f, df in zip(files, frames):
+        pd.testing.assert_frame_equal(df, pd.read_csv(f))
+
+def test_read_files_concat(tmp_path):
+    files = makeFiles(tmp_path)
+    df = util.readFiles(files, processes=2, concat=True)
+    assert list(df.a) == list(range(1500))
+    assert list(df.c.unique()) == ['f0', 'f1', 'f2']
+
+def test_read_files_from_thread(tmp_path):
+    """The app imports from a pool thread, workers are spawned not forked"""
+
+    files = makeFiles(tmp_path)
+    result = []
+    t = threading.Thread(target=lambda: result.append(util.readFiles(files, processes=2)))
+    t.start()
+    t.join(120)
+    assert len(result) == 1 and len(result[0]) == 3
+
+def importCSV(qapp, fn, **kwargs):
+    from tablexplore import core
+    from conftest import wait
+    w = core.DataFrameWidget()
+    importer = core.CSVImporter(w, fn, chunksize=100, **kwargs)
+    importer.start()
+    assert wait(qapp, lambda: not importer.isRunning())
+    return w.table.model.df
+
+def test_import_chunks_same_types(qapp, tmp_path):
+    """Text that looks like numbers after the first chunk stays text"""
+
+    fn = str(tmp_path / 'a.csv')
+    codes = ['a%s' %i for i in range(100)] + ['%03d' %i for i in range(150)]
+    pd.DataFrame({'code': codes, 'x': np.arange(250)}).to_csv(fn, index=False)
+    df = importCSV(qapp, fn, engine='c')
+    assert len(df) == 250
+    assert list(df.index) == list(range(250))
+    assert list(df.code.astype(object)) == codes
+    assert df.x.dtype == 'int64'
+
+def test_import_index_col(qapp, tmp_path):
+    fn = str(tmp_path / 'a.csv')
+    names = ['r%s' %i for i in range(250)]
+    pd.DataFrame({'x': np.arange(250.)}, index=names).to_csv(fn)
+    df = importCSV(qapp, fn, index_col=0)
+    assert list(df.index) == names
+    assert list(df.x) == list(range(250))
+
+def test_frame_builder_widens():
+    schema = util.getSchema([])
+    builder = util.FrameBuilder(schema, 2)
+    builder.append(pd.DataFrame({'a': [1, 2], 'd': pd.to_datetime(['2020-01-01', '2020-01-02'])}))
+    builder.append(pd.DataFrame({'a': [2.5], 'b': ['x']}))
+    builder.append(pd.DataFrame({'a': [3], 'd': ['soon']}))
+    df = builder.getFrame()
+    assert list(df.a) == [1, 2, 2.5, 3] and df.a.dtype == float
+    assert df.b.isnull().tolist() == [True, True, False, True]
+    assert df.d.dtype == object and df.d.iloc[3] == 'soon'
+    assert df.d.iloc[0] == pd.Timestamp('2020-01-01')
+
+def test_read_files_schemas(tmp_path):
+    """Files with different columns and types join as pd.concat would"""
+
+    parts = [pd.DataFrame({'a': [1, 2], 'b': ['x', 'y'], 'e': [True, False]}),
+             pd.DataFrame({'a': [1.5], 'c': [7]}),
+             pd.DataFrame({'c': [8, 9], 'a': [3, 4], 'e': [True, True]})]
+    files = []
+    for i, df in enumerate(parts):
+        fn = str(tmp_path / ('%s.csv' %i))
+        df.to_csv(fn, index=False)
+        files.append(fn)
+    df = util.readFiles(files, processes=2, concat=True)
+    expected = pd.concat([pd.read_csv(f) for f in files], ignore_index=True)
+    pd.testing.assert_frame_equal(df, expected)
+
+def test_import_read_only(qapp, tmp_path):
+    """The table cannot be edited while the rows read so far are shown"""
+
+    from tablexplore import core
+    from tablexplore.qt import QAbstractItemView
+    from conftest import wait
+    fn = str(tmp_path / 'a.csv')
+    pd.DataFrame({'x': np.arange(250)}).to_csv(fn, index=False)
+    w = core.DataFrameWidget()
+    importer = core.CSVImporter(w, fn, chunksize=100)
+    importer.start()
+    assert w.table.readonly == True
+    assert w.table.editTriggers() == QAbstractItemView.NoEditTriggers
+    assert not w.toolbar.isEnabled()
+    assert wait(qapp, lambda: not importer.isRunning())
+    assert w.table.readonly == False
+    assert w.table.editTriggers() == QAbstractItemView.DoubleClicked
+    assert w.toolbar.isEnabled()
@@ -0,0 +1,103 @@
+import threading
+import pandas as pd
+from tablexplore import core
+from conftest import wait
+
+def runJob(qapp, table, change=None):
+    """Run a job in the background and return the results passed on"""
+
+    results = []
+    started = threading.Event()
+    release = threading.Event()
+    def func(progress_callback):
+        started.set()
+        release.wait(10)
+        return 'done'
+    table.jobs.run(func, results.append, threaded=True, showprogress=False)
+    assert started.wait(10)
+    if change is not None:
+        change()
+    release.set()
+    assert wait(qapp, lambda: not table.jobs.isRunning())
+    return results
+
+def test_job_result(qapp):
+    w = core.DataFrameWidget(dataframe=pd.DataFrame({'a': [1, 2]}))
+    assert runJob(qapp, w.table) == ['done']
+
+def test_job_stale_result(qapp):
+    """A result is dropped if the table changed while the job ran"""
+
+    w = core.DataFrameWidget(dataframe=pd.DataFrame({'a': [1, 2]}))
+    model = w.table.model
+    assert runJob(qapp, w.table, lambda: model.setData(model.index(0, 0), 5)) == []
+
+def test_job_cancelled(qapp):
+    w = core.DataFrameWidget(dataframe=pd.DataFrame({'a': [1, 2]}))
+    assert runJob(qapp, w.table, w.table.jobs.cancel) == []
+
+def test_job_stopped_on_change(qapp):
+    """A job stops at its next progress call once the table has changed and
+    what it read is released"""
+
+    w = core.DataFrameWidget(dataframe=pd.DataFrame({'a': [1, 2]}))
+    model = w.table.model
+    started = threading.Event()
+    proceed = threading.Event()
+    stopped = []
+    released = []
+    def func(progress_callback):
+        started.set()
+        proceed.wait(10)
+        try:
+            progress_callback(1, 2)
+        except Exception as e:
+            stopped.append(e)
+            raise
+        return 'done'
+    w.table.jobs.run(func, lambda r: None, threaded=True, showprogress=False,
+                     release=lambda: released.append(True))
+    assert started.wait(10)
+    model.setData(model.index(0, 0), 5)
+    proceed.set()
+    assert wait(qapp, lambda: not w.table.jobs.isRunning() and released)
+    assert len(stopped) == 1
+    assert released == [True]
+
+def test_sort_snapshot(qapp, monkeypatch):
+    """Sorting reads a snapshot, edits made meanwhile are not seen"""
+
+    from tablexplore import util
+    w = core.DataFrameWidget(dataframe=pd.DataFrame({'a': [3, 1, 2]}))
+    model = w.table.model
+    monkeypatch.setattr(core, 'THREADED_ROWS', 0)
+    started = threading.Event()
+    proceed = threading.Event()
+    seen = []
+    getSortOrder = util.getSortOrder
+    def func(df, *args, **kwargs):
+        started.set()
+        proceed.wait(10)
+        seen.append(df['a'].tolist())
+        return getSortOrder(df, *args, **kwargs)
+    monkeypatch.setattr(util, 'getSortOrder', func)
+    w.table.sort(0)
+    assert started.wait(10)
+    model.setData(model.index(0, 0), 0)
+    proceed.set()
+    assert wait(qapp, lambda: not w.table.jobs.isRunning())
+    assert seen == [[3, 1, 2]]
+    assert model.holds == 0
+    #the order of the old data is not applied
+    assert model.rows is None
+
+def test_find_keeps_sort(qapp):
+    """Counting matches runs beside a sort or filter"""
+
+    from tablexplore import dialogs
+    w = core.DataFrameWidget(dataframe=pd.DataFrame({'a': ['x', 'y']}))
+    dlg = dialogs.FindReplaceDialog(w, w.table)
+    dlg.query_w.setText('x')
+    results = runJob(qapp, w.table, lambda: dlg.find(showprogress=False))
+    assert results == ['done']
+    assert len(dlg.coords) == 1
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+from tablexplore import util
+
+pytest.importorskip('pyarrow')
+
+@pytest.fixture
+def model(tmp_path):
+    from tablexplore.core import ArrowTableModel
+    fn = str(tmp_path / 'data.arrow')
+    df = pd.DataFrame({'a': np.arange(100), 'b': ['x%s' %i for i in range(100)]})
+    util.writeColumnar(df, fn, compression='uncompressed')
+    return ArrowTableModel(fn)
+
+def test_find_mapped(model):
+    """Finding in a mapped table reads the arrow table, not the frame"""
+
+    found = model.strings.find(model.table, 'x5')
+    assert list(np.flatnonzero(found[:,1])) == [5] + list(range(50, 60))
+    model.sort(['a'], ascending=False)
+    cells = list(model.strings.iterFind(model.table, 'x5', start=(0, 0), rows=model.rows))
+    assert cells[0] == (40, 1)
+    assert len(cells) == 11
+    assert model.mapped == True
+    assert len(model.strings.columns) == 0
+
+def test_find_cells_mapped(model):
+    """Matching cells are kept by column, in view order once sorted"""
+
+    from tablexplore import search
+    cells = model.strings.findCells(model.table, 'x5')
+    assert list(cells) == [1]
+    assert list(cells[1]) == [5] + list(range(50, 60))
+    model.sort(['a'], ascending=False)
+    coords = search.getViewCells(cells, model.rows)
+    assert coords.tolist() == [[i, 1] for i in range(40, 50)] + [[94, 1]]
+
+def test_take_mapped(model):
+    model.sort(['a'], ascending=False)
+    df = model.take([0, 1], [1])
+    assert list(df.b) == ['x99', 'x98']
+    assert list(model.columns) == ['a', 'b']
+    assert model.mapped == True
+
+def test_load_guard(model, monkeypatch):
+    monkeypatch.setattr(util, 'getAvailableMemory', lambda: 10)
+    with pytest.raises(MemoryError):
+        model.df
+    assert model.mapped == True
+    monkeypatch.setattr(util, 'getAvailableMemory', lambda: None)
+    assert len(model.df) == 100
+    assert model.mapped == False
+
+def test_menu_load_guard(qapp, model, monkeypatch):
+    """Menu actions show a message if the table is too large to read"""
+
+    from tablexplore import dialogs
+    messages = []
+    monkeypatch.setattr(dialogs, 'showMessage', lambda parent, msg: messages.append(msg))
+    monkeypatch.setattr(util, 'getAvailableMemory', lambda: 10)
+    action = dialogs.memoryGuard(None, lambda: model.df)
+    assert action() is None
+    assert len(messages) == 1 and 'too large' in messages[0]
+
+def test_dialogs_mapped(qapp, model):
+    """Find and filter bar dialogs leave the table mapped"""
+
+    from tablexplore import core, dialogs
+    w = core.DataFrameWidget()
+    w.importMapped(model.filename)
+    model = w.table.model
+    dlg = dialogs.FindReplaceDialog(w, w.table)
+    dlg.query_w.setText('x5')
+    dlg.find(showprogress=False)
+    assert len(dlg.coords) == 11
+    dlg.findNext()
+    assert dlg.lastfound == (5, 1)
+    dialogs.FilterDialog(w, w.table).addFilter()
+    assert model.mapped == True
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+from tablexplore.core import DataFrameModel, MemoryTracker
+
+def frame(n=1000):
+    return pd.DataFrame({'a': ['x%s' %i for i in range(n)], 'b': np.arange(n)})
+
+def test_memory_cached():
+    tracker = MemoryTracker()
+    df = frame()
+    b, exact = tracker.getMemory(df)
+    assert exact == True
+    assert b == df.memory_usage(deep=True).sum()
+    assert 0 in tracker.sizes
+    assert tracker.getMemory(df) == (b, True)
+
+def test_memory_edit_in_place():
+    model = DataFrameModel(frame())
+    before = model.getMemory()[0]
+    model.setData(model.index(0, 0), 'y' * 100000)
+    assert model.getMemory()[0] > before + 90000
+
+def test_stale_count_ignored():
+    """A count of the old values finishing after an edit is not used"""
+
+    tracker = MemoryTracker(sample=10, threshold=100)
+    df = frame()
+    values = df['a'].values
+    tracker.getMemory(df)
+    old = tracker.sizes[0][0]
+    tracker.threadpool.waitForDone()
+    tracker.clear(0)
+    values[0] = 'y' * 100000
+    tracker.getMemory(df)
+    tracker.counted((0, old, 10))
+    assert tracker.sizes[0][1] != 10
+
+def test_store_current(qapp):
+    from tablexplore import core
+    w = core.DataFrameWidget(dataframe=frame())
+    model = w.table.model
+    before = model.getMemory()[0]
+    w.table.storeCurrent(['a'])
+    model.base.iloc[1, 0] = 'y' * 100000
+    assert model.getMemory()[0] > before + 90000
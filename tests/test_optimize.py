@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+from tablexplore import util, search
+from tablexplore.core import DataFrameModel
+
+def getFrame():
+    n = 100
+    return pd.DataFrame({'c': ['ab', 'cd'] * (n//2),
+                         's': ['v%s' %i for i in range(n)],
+                         'i': np.arange(n)})
+
+def test_optimized_dtypes():
+    df = getFrame()
+    new, report = util.getOptimizedColumns(df)
+    assert isinstance(new['c'].dtype, pd.CategoricalDtype)
+    assert new['i'].dtype.itemsize < 8
+
+def test_edit_optimized():
+    pytest.importorskip('pyarrow')
+    df = getFrame()
+    df['c'] = df['c'].astype('category')
+    df['s'] = df['s'].astype('string[pyarrow]')
+    model = DataFrameModel(df)
+    model.setData(model.index(0, 0), 'new')
+    model.setData(model.index(0, 1), 5)
+    assert model.base.iloc[0, 0] == 'new'
+    assert model.base.iloc[0, 1] == 5
+
+def test_replace_category():
+    df = getFrame()
+    df['c'] = df['c'].astype('category')
+    new = util.replaceFrame(df, 'a', 'c')
+    assert isinstance(new['c'].dtype, pd.CategoricalDtype)
+    assert new['c'].tolist()[:2] == ['cb', 'cd']
+    #values made equal share one category
+    new = util.replaceFrame(df, '^.*$', 'q')
+    assert list(new['c'].cat.categories) == ['q']
+    assert df['c'].tolist()[:2] == ['ab', 'cd']
+
+def test_filter_category_compare():
+    df = getFrame()
+    x = df['c'].astype('category')
+    mask = search.filterColumn(x, '>', 'b')
+    assert list(mask[:2]) == [False, True]
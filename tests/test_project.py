@@ -0,0 +1,156 @@
+import os
+import zipfile
+import numpy as np
+import pandas as pd
+import pytest
+from tablexplore import util
+from conftest import wait
+
+def getFrame(n=1000, seed=1):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'a': rng.random(n), 'b': rng.choice(['x', 'y'], n)})
+
+def makeProject(newapp):
+    a = newapp()
+    #a large sheet that is kept and a small one that is edited
+    a.sheets['dataset1'].table.model.df = getFrame(20000)
+    a.sheets['dataset1'].refresh()
+    a.addSheet('s2', getFrame(100, seed=2))
+    return a
+
+def test_save_edit_save_reopen(newapp, tmp_path):
+    a = makeProject(newapp)
+    fn = str(tmp_path / 'p.txpl')
+    a.do_saveProject(fn)
+    model = a.sheets['s2'].table.model
+    model.setData(model.index(0, 0), 42.0)
+    size = os.path.getsize(fn)
+    a.do_saveProject(fn)
+    #only the changed sheet was appended
+    assert os.path.getsize(fn) > size
+    assert not os.path.exists(fn + '.journal')
+    assert zipfile.ZipFile(fn).testzip() is None
+    b = newapp()
+    b.openProject(fn)
+    assert list(b.sheets) == ['dataset1', 's2']
+    assert b.getSheetData('s2').iloc[0, 0] == 42.0
+    assert b.getSheetData('s2').equals(model.df)
+    assert b.getSheetData('dataset1').equals(a.sheets['dataset1'].table.model.df)
+
+def test_save_moved_column(newapp, tmp_path):
+    a = makeProject(newapp)
+    fn = str(tmp_path / 'p.txpl')
+    a.do_saveProject(fn)
+    a.sheets['s2'].table.horizontalHeader().moveSection(0, 1)
+    a.do_saveProject(fn)
+    b = newapp()
+    b.openProject(fn)
+    assert list(b.getSheetData('s2').columns) == ['b', 'a']
+
+def test_interrupted_save(newapp, tmp_path, monkeypatch):
+    a = makeProject(newapp)
+    fn = str(tmp_path / 'p.txpl')
+    a.do_saveProject(fn)
+    with open(fn, 'rb') as f:
+        saved = f.read()
+    model = a.sheets['s2'].table.model
+    model.setData(model.index(0, 0), 42.0)
+    def fail(*args, **kwargs):
+        raise OSError('No space left on device')
+    monkeypatch.setattr(util, 'writeSheet', fail)
+    with pytest.raises(OSError):
+        a.do_saveProject(fn)
+    with open(fn, 'rb') as f:
+        assert f.read() == saved
+    assert not os.path.exists(fn + '.journal')
+
+def test_crash_during_append(newapp, tmp_path):
+    a = makeProject(newapp)
+    fn = str(tmp_path / 'p.txpl')
+    a.do_saveProject(fn)
+    #a process stopped part way through appending
+    util.beginAppend(fn)
+    with open(fn, 'ab') as f:
+        f.write(os.urandom(100000))
+    assert not zipfile.is_zipfile(fn)
+    b = newapp()
+    b.openProject(fn)
+    assert zipfile.ZipFile(fn).testzip() is None
+    assert b.getSheetData('s2').equals(a.sheets['s2'].table.model.df)
+
+def test_autosave_recovery(qapp, newapp, tmp_path, monkeypatch):
+    """Changed sheets are autosaved, unchanged ones link to the project"""
+
+    from tablexplore.qt import QMessageBox
+    a = makeProject(newapp)
+    fn = str(tmp_path / 'p.txpl')
+    a.saveProject(fn)
+    assert wait(qapp, lambda: a.running == False)
+    #a session that will not close properly
+    a.session = 'crashed'
+    model = a.sheets['s2'].table.model
+    model.setData(model.index(0, 0), 42.0)
+    expected = model.df.copy()
+    a.autosave()
+    assert wait(qapp, lambda: a.autosaving == False)
+    files = a.getRecoveryFiles()
+    assert len(files) == 1
+    #only the changed sheet is written
+    assert os.path.getsize(files[0]) < os.path.getsize(fn)
+    #nothing changed since, so the next autosave does nothing
+    a.autosave()
+    assert a.autosaving == False
+
+    monkeypatch.setattr(QMessageBox, 'question',
+                        staticmethod(lambda *args: QMessageBox.Yes))
+    b = newapp()
+    assert wait(qapp, lambda: len(b.recovered) > 0)
+    assert b.filename == fn
+    assert b.getSheetData('s2').equals(expected)
+    assert b.getSheetData('dataset1').equals(a.sheets['dataset1'].table.model.df)
+
+def test_open_lazy(qapp, newapp, tmp_path):
+    """Only the current sheet is read when a project is opened, the others
+    when their tab is selected"""
+
+    a = makeProject(newapp)
+    #kept as a pickle
+    a.addSheet('s3', pd.DataFrame({1: [1, 'a'], 2: [None, 2.5]}))
+    a.sheets['s2'].table.model.sort(0)
+    fn = str(tmp_path / 'p.txpl')
+    a.do_saveProject(fn)
+    b = newapp()
+    b.openProject(fn)
+    assert wait(qapp, lambda: not any(w.table.jobs.isRunning() for w in b.sheets.values()))
+    current = b.tabs.tabText(b.tabs.currentIndex())
+    for name, w in b.sheets.items():
+        assert (w.archive is None) == (name == current)
+    for name in ['dataset1', 's2', 's3']:
+        b.tabs.setCurrentIndex(list(b.sheets).index(name))
+        w = b.sheets[name]
+        assert wait(qapp, lambda: w.archive is None)
+        #sheets are saved in view order
+        expected = a.sheets[name].table.model.df
+        assert w.table.model.df.equals(expected)
+
+def test_plot_spec(qapp, newapp, tmp_path):
+    """Plot options and ranges are saved as a small spec, not a figure"""
+
+    import pickle
+    a = makeProject(newapp)
+    pf = a.sheets['s2'].pf
+    pf.opts['general'].kwds['kind'] = 'scatter'
+    pf.ranges = [(0, 9, 0, 0)]
+    spec = pf.getSpec()
+    assert spec['kind'] == 'scatter'
+    assert len(pickle.dumps(a.saveMeta(a.sheets['s2']))) < 50000
+    fn = str(tmp_path / 'p.txpl')
+    a.do_saveProject(fn)
+    b = newapp()
+    b.openProject(fn)
+    b.tabs.setCurrentIndex(1)
+    w = b.sheets['s2']
+    assert wait(qapp, lambda: w.archive is None)
+    #plotted when the plotter is shown
+    assert w.pf.spec['ranges'] == [(0, 9, 0, 0)]
+    assert w.pf.opts['general'].kwds['kind'] == 'scatter'
@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+from tablexplore import search
+from tablexplore.core import DataFrameModel
+
+def test_find_filtered_view():
+    """Find over a view holding fewer rows than the frame"""
+
+    df = pd.DataFrame({'a': ['x', 'y', 'x', 'z', 'x']})
+    model = DataFrameModel(df)
+    model.setRows(np.array([4, 2, 1]))
+    found = list(model.strings.iterFind(model.base, 'x', start=(0, 0), rows=model.rows))
+    assert found == [(0, 0), (1, 0)]
+    found = list(model.strings.iterFind(model.base, 'x', start=(2, 0), rows=model.rows))
+    assert found == [(0, 0), (1, 0)]
+
+def test_refine_case_sensitive():
+    """A narrower case sensitive value gives the same mask as a new cache"""
+
+    df = pd.DataFrame({'a': ['Abc', 'abc', 'xbc', 'aBc']})
+    cache = search.FilterCache()
+    cache.apply(df, filters=[('a', 'a', 'contains', 'AND')], ignorecase=False)
+    mask = cache.apply(df, filters=[('a', 'Ab', 'contains', 'AND')], ignorecase=False)
+    fresh = search.FilterCache().apply(df, filters=[('a', 'Ab', 'contains', 'AND')],
+                                      ignorecase=False)
+    assert list(fresh) == [True, False, False, False]
+    assert list(mask) == list(fresh)
+
+def test_refine_ignorecase():
+    df = pd.DataFrame({'a': ['Abc', 'abc', 'xbc', 'aBd']})
+    cache = search.FilterCache()
+    cache.apply(df, filters=[('a', 'b', 'contains', 'AND')])
+    mask = cache.apply(df, filters=[('a', 'BC', 'contains', 'AND')])
+    assert list(mask) == [True, True, True, False]
+
+def test_find_cached():
+    df = pd.DataFrame({'a': ['x', 'y', 'x'], 'b': [1, 21, 3]})
+    strings = search.StringSearch()
+    found = strings.find(df, '1')
+    assert found.tolist() == [[False, True], [False, True], [False, False]]
+    assert set(strings.columns) == {0, 1}
+    assert strings.find(df, 'X', case=False)[:,0].tolist() == [True, False, True]
+
+def test_find_overlapping_edit():
+    """A search of the old data finishing after an edit is not cached"""
+
+    model = DataFrameModel(pd.DataFrame({'a': ['x', 'y', 'z']}))
+    df = model.base.copy()
+    version = model.strings.version
+    model.setData(model.index(1, 0), 'x')
+    found = model.strings.find(df, 'x', version=version)
+    assert found[:,0].tolist() == [True, False, False]
+    assert 0 not in model.strings.columns
+    found = model.strings.find(model.base, 'x')
+    assert found[:,0].tolist() == [True, True, False]
+
+def test_text_index():
+    """Text index answers match plain pandas string methods, also once the
+    trigram index is built"""
+
+    rng = np.random.default_rng(0)
+    words = ['Apple', 'apricot', 'banana', 'Grape', 'grapefruit', 'pear', 'ap.e']
+    s = pd.Series(rng.choice(words, 500), dtype=object)
+    s[::7] = None
+    index = search.TextIndex(s, repeats=1)
+    text = s.fillna('')
+    for q in ['ap', 'AP', 'rape', 'e', 'p.e', 'zz']:
+        for case in [True, False]:
+            ref = text if case else text.str.lower()
+            v = q if case else q.lower()
+            #contains takes regular expressions, as filterColumn does
+            expected = {'contains': ref.str.contains(v),
+                        'starts with': ref.str.startswith(v),
+                        'ends with': ref.str.endswith(v)}
+            for op in expected:
+                mask = index.match(op, q, case) & s.notnull().values
+                assert mask.tolist() == (expected[op] & s.notnull()).tolist(), (op, q, case)
+    assert index.grams is not None
+
+def test_selected_ranges(qapp):
+    """Selections are read from their ranges, as slices when contiguous"""
+
+    from tablexplore.core import DataFrameTable
+    df = pd.DataFrame({'a': np.arange(10), 'b': list('abcdefghij'), 'c': np.arange(10.)})
+    table = DataFrameTable(None, df)
+    rows, cols = table.getSelectedIndexes([(2, 4, 0, 1)])
+    assert rows == slice(2, 5) and cols == slice(0, 2)
+    rows, cols = table.getSelectedIndexes([(0, 9, 0, 2)])
+    assert rows == slice(None) and cols == slice(None)
+    #separate blocks in selection order, overlaps only once
+    rows, cols = table.getSelectedIndexes([(6, 7, 2, 2), (1, 2, 0, 0), (7, 8, 2, 2)])
+    assert rows.tolist() == [6, 7, 1, 2, 8]
+    assert cols.tolist() == [2, 0]
+    rows, cols = table.getSelectedIndexes([])
+    assert len(rows) == 0 and len(cols) == 0
+    sub = table.getSelectedDataFrame([(2, 4, 0, 1)])
+    assert sub.equals(df.iloc[2:5, 0:2])
+    #reads the view order of a sorted table
+    table.model.sort(0, ascending=False)
+    sub = table.getSelectedDataFrame([(0, 1, 1, 1)])
+    assert sub['b'].tolist() == ['j', 'i']
+
+def test_find_next(qapp):
+    """Find Next moves through matches in row order from the current cell and
+    wraps around, while all matches are counted"""
+
+    from tablexplore import core, dialogs
+    df = pd.DataFrame({'a': ['x', 'y', 'x', 'y'], 'b': ['y', 'x', 'y', 'y']})
+    w = core.DataFrameWidget(dataframe=df)
+    table = w.table
+    dlg = dialogs.FindReplaceDialog(w, table)
+    dlg.query_w.setText('x')
+    found = []
+    for i in range(4):
+        dlg.findNext()
+        found.append(dlg.lastfound)
+    assert found == [(0, 0), (1, 1), (2, 0), (0, 0)]
+    assert dlg.count_w.text() == '3 found'
+    assert (table.currentIndex().row(), table.currentIndex().column()) == (0, 0)
+    #the cursor is not rebuilt while moving on from the last match
+    cursor = dlg.cursor
+    dlg.findNext()
+    assert dlg.cursor is cursor
+    #an edit starts a new search from the current cell
+    model = table.model
+    model.setData(model.index(3, 1), 'x')
+    dlg.findNext()
+    assert dlg.cursor is not cursor
+    assert dlg.lastfound == (2, 0)
+    dlg.findNext()
+    assert dlg.lastfound == (3, 1)
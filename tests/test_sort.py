@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+from tablexplore.core import DataFrameModel, DataFrameTable
+
+def getFrame(n=1000):
+    rng = np.random.default_rng(1)
+    return pd.DataFrame({'a': rng.integers(0, 10, n), 'b': rng.random(n),
+                         'c': rng.choice(['x', 'y', 'z'], n)})
+
+def test_sort_is_lazy():
+    df = getFrame()
+    model = DataFrameModel(df.copy())
+    model.sort([0, 1])
+    assert model.rows is not None
+    expected = df.sort_values(['a', 'b'], kind='mergesort')
+    assert model.take().equals(expected)
+    assert model.base.equals(df)
+    #reading df reorders the stored frame
+    assert model.df.equals(expected)
+    assert model.rows is None
+
+def test_sort_descending_strings():
+    df = getFrame()
+    model = DataFrameModel(df.copy())
+    model.sort(2, ascending=False)
+    assert model.take()['c'].tolist() == sorted(df['c'], reverse=True)
+
+def test_header_press_keeps_sort(qapp):
+    table = DataFrameTable(None, getFrame())
+    table.model.sort(1)
+    rows = table.model.rows
+    table.horizontalHeader().sectionPressed.emit(0)
+    assert table.model.rows is rows
+
+def test_sort_large_integers():
+    """Integers are not sorted as floats, which are not exact above 2**53"""
+
+    df = pd.DataFrame({'a': np.array([2**62+1, 2**62, -2**63, 2**63-1], dtype=np.int64),
+                       'b': np.array([2**64-1, 2**63, 0, 2**63+1], dtype=np.uint64),
+                       'c': [True, False, True, False]})
+    for j in range(3):
+        for ascending in [True, False]:
+            model = DataFrameModel(df.copy())
+            model.sort(j, ascending=ascending)
+            col = df.columns[j]
+            assert model.take()[col].tolist() == sorted(df[col], reverse=not ascending)
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+from tablexplore.qt import QtCore
+from tablexplore.core import UndoStack
+
+def getFrame():
+    return pd.DataFrame({'a': np.arange(5.0), 'b': list('vwxyz')})
+
+def test_undo_frame_changed_in_place():
+    df = getFrame()
+    stack = UndoStack()
+    stack.push(df)
+    df.iloc[0, 0] = -5
+    old = stack.undo(df)
+    assert old.iloc[0, 0] == 0
+    assert stack.canRedo()
+
+def test_undo_columns():
+    df = getFrame()
+    stack = UndoStack()
+    stack.push(df, ['a', 'c'])
+    df['a'] = df['a'] * 2
+    df['c'] = 1
+    old = stack.undo(df)
+    assert list(old.columns) == ['a', 'b']
+    assert old['a'].tolist() == [0, 1, 2, 3, 4]
+    new = stack.redo(old)
+    assert new['a'].tolist() == [0, 2, 4, 6, 8]
+
+def test_entry_size_owned():
+    df = getFrame()
+    stack = UndoStack()
+    stack.push(df)
+    entry = stack.undostack[-1]
+    assert entry['size'] == df.memory_usage(index=True, deep=False).sum()
+    assert not np.shares_memory(entry['data']['a'].values, df['a'].values)
+
+def test_spill(qapp):
+    df = getFrame()
+    stack = UndoStack(budget=0)
+    stack.push(df)
+    df.iloc[0, 0] = -5
+    stack.push(df, ['b'])
+    QtCore.QThreadPool.globalInstance().waitForDone()
+    qapp.processEvents()
+    assert stack.undostack[0]['file'] is not None
+    assert stack.undostack[0]['data'] is None
+    df = stack.undo(df)
+    df = stack.undo(df)
+    assert df.iloc[0, 0] == 0
+    stack.clear()
+
+def test_replace_stores_changed_columns(qapp):
+    """Replacing keeps only the columns it changes for undo"""
+
+    from tablexplore import core, dialogs
+    w = core.DataFrameWidget(dataframe=pd.DataFrame({'a': np.arange(5.0), 'b': list('vwxyz'),
+                                                     'c': list('vvvvv')}))
+    table = w.table
+    dlg = dialogs.FindReplaceDialog(w, table)
+    dlg.query_w.setText('x')
+    dlg.replace_w.setText('q')
+    dlg.replace()
+    entry = table.undostack.undostack[-1]
+    assert entry['columns'] == ['b']
+    assert table.model.df['b'].tolist() == list('vwqyz')
+    table.undo()
+    assert table.model.df['b'].tolist() == list('vwxyz')
+    #nothing to replace adds no undo step
+    dlg.query_w.setText('nothing')
+    dlg.replace()
+    assert len(table.undostack.undostack) == 0